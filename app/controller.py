@@ -2,6 +2,9 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 import uvicorn
 from fastapi import FastAPI
 
@@ -11,18 +14,39 @@ from app.core.resources.app_config import (
     SERVICE_NAME,
     SERVICE_PORT,
 )
-from app.core.routers import document, health, image, pdf
+from app.core.routers import document, health, image, metrics, pdf
+from app.core.services import http_clients, task_executor
+from app.core.services.metrics import MetricsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """
+    Handles the resources that live as long as the worker:
+    the http clients of the upstreams are opened when the worker starts,
+    they are closed and the CPU bound work pool is shut down when it stops.
+    \f
+    :param _app: the application being served
+    """
+    http_clients.open_clients()
+    yield
+    await http_clients.close_clients()
+    task_executor.shutdown_executor()
+
 
 app = FastAPI(
     title=SERVICE_NAME,
     version="0.3.10-SNAPSHOT",
     description=SERVICE_DESCRIPTION,
+    lifespan=lifespan,
 )
 
 app.include_router(image.router)
 app.include_router(pdf.router)
 app.include_router(document.router)
 app.include_router(health.router)
+app.include_router(metrics.router)
+app.add_middleware(MetricsMiddleware)
 
 if __name__ == "__main__":
     uvicorn.run(app, host=SERVICE_IP, port=SERVICE_PORT)
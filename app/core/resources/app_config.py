@@ -15,6 +15,7 @@ from pydantic import (
 from pydantic.main import BaseModel
 
 from app.core.resources.config_loader import config_dict
+from app.core.resources.schemas.enums.executor_mode_enum import ExecutorModeEnum
 
 PORT_MAX_NUMBER: Final[int] = 65535
 PORT_MIN_NUMBER: Final[int] = 0
@@ -31,6 +32,7 @@ class AppConfig(BaseModel):
 
     service_image_name: str
     service_health_name: str
+    service_metrics_name: str = "metrics"
     service_pdf_name: str
     service_document_name: str
 
@@ -42,9 +44,50 @@ class AppConfig(BaseModel):
         default=False,
         alias="service_enable_document_thumbnail",
     )
+    document_thumbnail_from_pdf: bool = Field(
+        default=False,
+        alias="service_document_thumbnail_from_pdf",
+    )
+    enable_server_timing: bool = Field(
+        default=False,
+        alias="service_enable_server_timing",
+    )
+    negotiate_output_format: bool = Field(
+        default=False,
+        alias="service_negotiate_output_format",
+    )
 
     docs_timeout: PositiveInt = Field(default=5, alias="service_docs-timeout")
 
+    # executor
+    executor_mode: ExecutorModeEnum = ExecutorModeEnum.THREAD
+    executor_pool_size: PositiveInt = 2
+    executor_process_pool_size: PositiveInt = 2
+
+    # rendition cache
+    rendition_cache_max_size_in_mb: NonNegativeInt = 64
+    rendition_cache_ttl_in_seconds: PositiveInt = 3600
+
+    # cache control
+    cache_control_image_thumbnail: str = "private, max-age=86400"
+    cache_control_image_preview: str = "private, max-age=86400"
+    cache_control_pdf_thumbnail: str = "private, max-age=86400"
+    cache_control_pdf_preview: str = "private, max-age=86400"
+    cache_control_document_thumbnail: str = "private, max-age=86400"
+    cache_control_document_preview: str = "private, max-age=86400"
+
+    # conversion cache
+    conversion_cache_path: str = "/var/cache/carbonio/preview/conversions/"
+    conversion_cache_max_size_in_mb: NonNegativeInt = 1024
+
+    # batch
+    batch_max_items: PositiveInt = 100
+    batch_max_concurrency: PositiveInt = 8
+
+    # page thumbnails
+    page_thumbnails_max_pages: PositiveInt = 50
+    page_thumbnails_max_file_size_in_mb: PositiveInt = 64
+
     # log
     log_path: str
     log_format: str
@@ -52,6 +95,9 @@ class AppConfig(BaseModel):
 
     # image
     image_constants_minimum_resolution: NonNegativeInt
+    image_limits_max_source_megapixels: PositiveInt = 90
+    image_limits_max_animation_megapixels: PositiveInt = 400
+    image_limits_max_output_megapixels: PositiveInt = 90
 
     # storage
     storage_name: str
@@ -61,6 +107,12 @@ class AppConfig(BaseModel):
     storage_protocol: str
     storage_ip: str
     storage_port: NonNegativeInt = Field(ge=PORT_MIN_NUMBER, le=PORT_MAX_NUMBER)
+    storage_max_connections: PositiveInt = 100
+    storage_max_keepalive_connections: NonNegativeInt = 20
+    storage_keepalive_expiry_in_seconds: NonNegativeInt = 30
+    storage_timeout_in_seconds: PositiveInt = 5
+    storage_spool_size_in_mb: NonNegativeInt = 8
+    storage_max_file_size_in_mb: PositiveInt = 512
 
     # document conv
     document_conversion_protocol: str
@@ -72,6 +124,12 @@ class AppConfig(BaseModel):
 
     document_conversion_service_endpoint: str
     document_conversion_convert_api: str
+    document_conversion_max_connections: PositiveInt = 20
+    document_conversion_max_keepalive_connections: NonNegativeInt = 10
+    document_conversion_keepalive_expiry_in_seconds: NonNegativeInt = 30
+    document_conversion_max_concurrency: PositiveInt = 4
+    document_conversion_max_queue_size: NonNegativeInt = 16
+    document_conversion_retry_after_in_seconds: PositiveInt = 5
 
     @field_validator("service_ip", "storage_ip", "document_conversion_ip")
     def ip_must_be_valid(cls: Type["AppConfig"], value: str) -> str:
@@ -114,9 +172,13 @@ SERVICE_NUMBER_OF_WORKERS: Final[int] = app_config.number_of_workers
 ENABLE_DOCUMENT_PREVIEW: Final[bool] = app_config.enable_document_preview
 ENABLE_DOCUMENT_THUMBNAIL: Final[bool] = app_config.enable_document_thumbnail
 ARE_DOCS_ENABLED: Final[bool] = ENABLE_DOCUMENT_PREVIEW or ENABLE_DOCUMENT_THUMBNAIL
+DOCUMENT_THUMBNAIL_FROM_PDF: Final[bool] = app_config.document_thumbnail_from_pdf
+ENABLE_SERVER_TIMING: Final[bool] = app_config.enable_server_timing
+NEGOTIATE_OUTPUT_FORMAT: Final[bool] = app_config.negotiate_output_format
 
 IMAGE_NAME: Final[str] = app_config.service_image_name
 HEALTH_NAME: Final[str] = app_config.service_health_name
+METRICS_NAME: Final[str] = app_config.service_metrics_name
 PDF_NAME: Final[str] = app_config.service_pdf_name
 DOC_NAME: Final[str] = app_config.service_document_name
 
@@ -144,9 +206,46 @@ Preview should always output the file in its original format,
  while thumbnail will convert it to an image.
 There is no difference in quality between the two,
  the difference in quality can be achieved only
-by asking for a jpeg format and changing the quality parameter.
+by asking for a jpeg or webp format and changing the quality parameter.
 """
 
+# EXECUTOR
+EXECUTOR_MODE: Final[ExecutorModeEnum] = app_config.executor_mode
+EXECUTOR_POOL_SIZE: Final[int] = app_config.executor_pool_size
+EXECUTOR_PROCESS_POOL_SIZE: Final[int] = app_config.executor_process_pool_size
+
+# RENDITION CACHE
+RENDITION_CACHE_MAX_SIZE: Final[int] = (
+    app_config.rendition_cache_max_size_in_mb * 1024 * 1024
+)
+RENDITION_CACHE_TTL: Final[int] = app_config.rendition_cache_ttl_in_seconds
+
+# CACHE CONTROL
+IMAGE_THUMBNAIL_CACHE_CONTROL: Final[str] = app_config.cache_control_image_thumbnail
+IMAGE_PREVIEW_CACHE_CONTROL: Final[str] = app_config.cache_control_image_preview
+PDF_THUMBNAIL_CACHE_CONTROL: Final[str] = app_config.cache_control_pdf_thumbnail
+PDF_PREVIEW_CACHE_CONTROL: Final[str] = app_config.cache_control_pdf_preview
+DOCUMENT_THUMBNAIL_CACHE_CONTROL: Final[str] = (
+    app_config.cache_control_document_thumbnail
+)
+DOCUMENT_PREVIEW_CACHE_CONTROL: Final[str] = app_config.cache_control_document_preview
+
+# CONVERSION CACHE
+CONVERSION_CACHE_PATH: Final[str] = app_config.conversion_cache_path
+CONVERSION_CACHE_MAX_SIZE: Final[int] = (
+    app_config.conversion_cache_max_size_in_mb * 1024 * 1024
+)
+
+# BATCH
+BATCH_MAX_ITEMS: Final[int] = app_config.batch_max_items
+BATCH_MAX_CONCURRENCY: Final[int] = app_config.batch_max_concurrency
+
+# PAGE THUMBNAILS
+PAGE_THUMBNAILS_MAX_PAGES: Final[int] = app_config.page_thumbnails_max_pages
+PAGE_THUMBNAILS_MAX_FILE_SIZE: Final[int] = (
+    app_config.page_thumbnails_max_file_size_in_mb * 1024 * 1024
+)
+
 # LOGS
 
 LOG_FORMAT: Final[str] = app_config.log_format
@@ -161,6 +260,16 @@ STORAGE_PROTOCOL: Final[str] = app_config.storage_protocol
 STORAGE_IP: Final[str] = app_config.storage_ip
 STORAGE_PORT: Final[int] = app_config.storage_port
 STORAGE_FULL_ADDRESS: Final[str] = f"{STORAGE_PROTOCOL}://{STORAGE_IP}:{STORAGE_PORT}"
+STORAGE_MAX_CONNECTIONS: Final[int] = app_config.storage_max_connections
+STORAGE_MAX_KEEPALIVE_CONNECTIONS: Final[
+    int
+] = app_config.storage_max_keepalive_connections
+STORAGE_KEEPALIVE_EXPIRY: Final[int] = app_config.storage_keepalive_expiry_in_seconds
+STORAGE_TIMEOUT: Final[int] = app_config.storage_timeout_in_seconds
+STORAGE_SPOOL_SIZE: Final[int] = app_config.storage_spool_size_in_mb * 1024 * 1024
+STORAGE_MAX_FILE_SIZE: Final[int] = (
+    app_config.storage_max_file_size_in_mb * 1024 * 1024
+)
 
 # DOCUMENT CONVERSION
 DOCUMENT_CONVERSION_PROTOCOL: Final[str] = app_config.document_conversion_protocol
@@ -179,5 +288,32 @@ DOCUMENT_CONVERSION_FULL_SERVICE_ADDRESS: Final[
 DOCUMENT_CONVERSION_FULL_CONVERT_ADDRESS: Final[
     str
 ] = f"{DOCUMENT_CONVERSION_FULL_SERVICE_ADDRESS}{DOCUMENT_CONVERSION_CONVERT_API}"
+DOCUMENT_CONVERSION_MAX_CONNECTIONS: Final[
+    int
+] = app_config.document_conversion_max_connections
+DOCUMENT_CONVERSION_MAX_KEEPALIVE_CONNECTIONS: Final[
+    int
+] = app_config.document_conversion_max_keepalive_connections
+DOCUMENT_CONVERSION_KEEPALIVE_EXPIRY: Final[
+    int
+] = app_config.document_conversion_keepalive_expiry_in_seconds
+DOCUMENT_CONVERSION_MAX_CONCURRENCY: Final[
+    int
+] = app_config.document_conversion_max_concurrency
+DOCUMENT_CONVERSION_MAX_QUEUE_SIZE: Final[
+    int
+] = app_config.document_conversion_max_queue_size
+DOCUMENT_CONVERSION_RETRY_AFTER: Final[
+    int
+] = app_config.document_conversion_retry_after_in_seconds
 
 IMAGE_MIN_RES: Final[int] = app_config.image_constants_minimum_resolution
+IMAGE_MAX_SOURCE_PIXELS: Final[int] = (
+    app_config.image_limits_max_source_megapixels * 1000 * 1000
+)
+IMAGE_MAX_ANIMATION_PIXELS: Final[int] = (
+    app_config.image_limits_max_animation_megapixels * 1000 * 1000
+)
+IMAGE_MAX_OUTPUT_PIXELS: Final[int] = (
+    app_config.image_limits_max_output_megapixels * 1000 * 1000
+)
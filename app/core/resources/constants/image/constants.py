@@ -0,0 +1,33 @@
+# SPDX-FileCopyrightText: 2022 Zextras <https://www.zextras.com
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from typing import Tuple
+
+# DECODING
+
+# JPEG images are decoded at a reduced scale (DCT scaling) only down to
+# this many times the requested size, so that the final resize
+# still has more pixels than it outputs and the quality is preserved.
+JPEG_DRAFT_REDUCING_GAP: int = 2
+
+# RESIZING
+
+# when multiple renditions are created from the same image, each one is
+# resized from an intermediate reduced by an integer factor (box filter) only
+# down to this many times its size, for the same reason of the JPEG draft.
+INTERMEDIATE_REDUCING_GAP: int = 2
+# modes supported by the reduction of the intermediates
+INTERMEDIATE_REDUCIBLE_MODES: Tuple[str, ...] = ("L", "LA", "RGB", "RGBA", "CMYK")
+# every resize of these modes first reduces the image by an integer factor
+# (box filter) down to this many times the output size, so the resample filter
+# only runs on the last step: much faster for a large image and a tiny output,
+# with the same quality of a single resample
+RESIZE_REDUCING_GAP: float = 2.0
+
+# RENDERING
+
+# PDF pages rendered for a thumbnail are rendered at the smallest scale that
+# keeps them this many times bigger than the requested size, never bigger than
+# the page size (scale 1), for the same reason of the JPEG draft.
+PDF_RENDER_REDUCING_GAP: int = 2
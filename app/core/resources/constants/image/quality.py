@@ -2,6 +2,10 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
+from typing import NamedTuple
+
+from PIL import Image
+
 # IMAGE QUALITY VALUES
 
 JPEG_LOWEST_INT: int = 0
@@ -9,3 +13,82 @@ JPEG_LOW_INT: int = 15
 JPEG_MEDIUM_INT: int = 50
 JPEG_HIGH_INT: int = 80
 JPEG_HIGHEST_INT: int = 95
+
+
+class JpegEncoderProfile(NamedTuple):
+    """
+    Settings of the JPEG encoder used for a quality tier
+    """
+
+    quality: int
+    # chroma subsampling: 4:2:0 halves the color resolution on both axes,
+    # 4:4:4 keeps it, which matters for text and sharp colored edges
+    subsampling: str
+    # progressive files are smaller above a few KB and are displayed
+    # while they are downloaded, but they are slower to encode
+    progressive: bool
+    # optimal Huffman tables, smaller files for a little more CPU
+    optimize: bool
+    # the ICC profile keeps the colors of wide gamut images, at the cost of
+    # some KB that would double the size of a small thumbnail
+    keep_icc_profile: bool
+
+
+# the lower tiers are tuned for the encode speed, the higher ones for size and fidelity
+JPEG_LOWEST_PROFILE = JpegEncoderProfile(
+    quality=JPEG_LOWEST_INT,
+    subsampling="4:2:0",
+    progressive=False,
+    optimize=False,
+    keep_icc_profile=False,
+)
+JPEG_LOW_PROFILE = JpegEncoderProfile(
+    quality=JPEG_LOW_INT,
+    subsampling="4:2:0",
+    progressive=False,
+    optimize=False,
+    keep_icc_profile=False,
+)
+JPEG_MEDIUM_PROFILE = JpegEncoderProfile(
+    quality=JPEG_MEDIUM_INT,
+    subsampling="4:2:0",
+    progressive=False,
+    optimize=True,
+    keep_icc_profile=False,
+)
+JPEG_HIGH_PROFILE = JpegEncoderProfile(
+    quality=JPEG_HIGH_INT,
+    subsampling="4:2:0",
+    progressive=True,
+    optimize=True,
+    keep_icc_profile=False,
+)
+JPEG_HIGHEST_PROFILE = JpegEncoderProfile(
+    quality=JPEG_HIGHEST_INT,
+    subsampling="4:4:4",
+    progressive=True,
+    optimize=True,
+    keep_icc_profile=True,
+)
+
+# WebP has a better quality than JPEG at the same value,
+# so the lowest values are not as low
+WEBP_LOWEST_INT: int = 20
+WEBP_LOW_INT: int = 40
+WEBP_MEDIUM_INT: int = 65
+WEBP_HIGH_INT: int = 80
+WEBP_HIGHEST_INT: int = 90
+# encoder effort from 0 (fastest) to 6 (smallest), 4 is the Pillow default
+WEBP_METHOD: int = 4
+
+# RESAMPLING FILTERS
+
+# filter of the final resize: box is the cheapest and blurs the small renditions
+# a little, Lanczos keeps the most details but costs the most per output pixel
+RESAMPLE_LOWEST: Image.Resampling = Image.Resampling.BOX
+RESAMPLE_LOW: Image.Resampling = Image.Resampling.BILINEAR
+RESAMPLE_MEDIUM: Image.Resampling = Image.Resampling.BICUBIC
+RESAMPLE_HIGH: Image.Resampling = Image.Resampling.BICUBIC
+RESAMPLE_HIGHEST: Image.Resampling = Image.Resampling.LANCZOS
+# the Pillow default, used when the rendition has no quality (PNG)
+RESAMPLE_DEFAULT: Image.Resampling = Image.Resampling.BICUBIC
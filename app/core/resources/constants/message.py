@@ -29,6 +29,26 @@ DOCS_EDITOR_UNAVAILABLE_STRING: str = read_message_config(
     value="carbonio_docs_editor_not_running",
 )
 
+DOCS_EDITOR_BUSY: str = read_message_config(
+    section=_hard_errors_section_name,
+    value="carbonio_docs_editor_busy",
+)
+
+FILE_TOO_LARGE: str = read_message_config(
+    section=_hard_errors_section_name,
+    value="file_too_large",
+)
+
+RENDITION_FAILED: str = read_message_config(
+    section=_hard_errors_section_name,
+    value="rendition_failed",
+)
+
+IMAGE_TOO_LARGE: str = read_message_config(
+    section=_hard_errors_section_name,
+    value="image_too_large",
+)
+
 # Validation
 _validation_section_name: str = "validation"
 
@@ -38,6 +58,16 @@ NUMBER_OF_PAGES_NOT_VALID: str = read_message_config(
     value="number_of_pages_not_valid_error",
 )
 
+TOO_MANY_PAGES: str = read_message_config(
+    section=_validation_section_name,
+    value="too_many_pages_error",
+)
+
+FIRST_PAGE_OUT_OF_RANGE: str = read_message_config(
+    section=_validation_section_name,
+    value="first_page_out_of_range_error",
+)
+
 # image
 HEIGHT_WIDTH_NOT_VALID_ERROR: str = read_message_config(
     section=_validation_section_name,
@@ -49,6 +79,11 @@ HEIGHT_OR_WIDTH_NOT_INSERTED_ERROR: str = read_message_config(
     value="height_or_width_not_inserted_error",
 )
 
+AREA_TOO_LARGE_ERROR: str = read_message_config(
+    section=_validation_section_name,
+    value="area_too_large_error",
+)
+
 ID_NOT_VALID_ERROR: str = read_message_config(
     section=_validation_section_name,
     value="id_not_valid_error",
@@ -0,0 +1,9 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# STREAMING
+
+# files returned unchanged are sent in chunks of this size, without reading
+# them in memory when they were written on disk
+STREAMING_CHUNK_SIZE: int = 1024 * 1024
@@ -2,18 +2,19 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
-from typing import Dict, Final, Optional, Type
+from typing import Dict, Final, Optional, Tuple, Type
 
 import pydantic
 from fastapi import HTTPException, status
 from fastapi.responses import Response as FastApiResp
-from httpx import Response as RequestResp
 from pydantic import BaseModel, NonNegativeInt
 from returns.maybe import Maybe, Nothing
 
 from app.core.resources.app_config import (
     ENABLE_DOCUMENT_PREVIEW,
     ENABLE_DOCUMENT_THUMBNAIL,
+    IMAGE_MAX_OUTPUT_PIXELS,
+    NEGOTIATE_OUTPUT_FORMAT,
 )
 from app.core.resources.constants import message
 from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
@@ -22,6 +23,7 @@ from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
 from app.core.resources.schemas.enums.vertical_crop_position_enum import (
     VerticalCropPositionEnum,
 )
+from app.core.resources.schemas.storage_file import StorageFile
 
 PREVIEW_NOT_ENABLED_RESPONSE: Final[FastApiResp] = FastApiResp(
     content=message.DOCUMENT_PREVIEW_NOT_ENABLED_ERROR,
@@ -53,8 +55,10 @@ def create_image_metadata_dict(
     :param area: string that follows the format (numberXnumber)
     :param shape: optional dict parameter for "shape" key in dict
     :param crop: optional dict parameter for "crop" key in dict
+    :raises: HTTPException 400 if the area has too many pixels
     """
     width, height = map(int, area.lower().split("x"))
+    check_output_area(width=width, height=height)
     metadata_dict = {
         "quality": quality,
         "format": output_format,
@@ -69,8 +73,65 @@ def create_image_metadata_dict(
     return metadata_dict
 
 
+def check_output_area(width: int, height: int) -> None:
+    """
+    Checks that a rendition of the given size can be created, so that
+    an absurd area is rejected before allocating the image for it
+    \f
+    :param width: width of the rendition, 0 to keep the original one
+    :param height: height of the rendition, 0 to keep the original one
+    :raises: HTTPException 400 if the rendition has more than
+     IMAGE_MAX_OUTPUT_PIXELS pixels
+    """
+    if width * height > IMAGE_MAX_OUTPUT_PIXELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=message.AREA_TOO_LARGE_ERROR,
+        )
+
+
+def negotiate_output_format(
+    output_format: Optional[ImageTypeEnum],
+    accept: Optional[str],
+) -> Tuple[ImageTypeEnum, str]:
+    """
+    Chooses the output format when the client did not ask for one:
+    WEBP if NEGOTIATE_OUTPUT_FORMAT is enabled and the Accept header
+    explicitly contains image/webp, otherwise JPEG
+    \f
+    :param output_format: format requested by the client, if any
+    :param accept: value of the Accept header, if any
+    :return: the output format and the Vary header of the response,
+     empty if the format does not depend on the Accept header
+    """
+    if output_format is not None:
+        return output_format, ""
+    if not NEGOTIATE_OUTPUT_FORMAT:
+        return ImageTypeEnum.JPEG, ""
+    for media_range in (accept or "").split(","):
+        media_type, _, parameters = media_range.partition(";")
+        if (
+            media_type.strip().lower() == "image/webp"
+            and _get_accept_quality(parameters) > 0
+        ):
+            return ImageTypeEnum.WEBP, "Accept"
+    return ImageTypeEnum.JPEG, "Accept"
+
+
+def _get_accept_quality(parameters: str) -> float:
+    # the q parameter of a media range, 1 when missing or invalid
+    for parameter in parameters.split(";"):
+        name, _, value = parameter.strip().partition("=")
+        if name.lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 1
+    return 1
+
+
 def check_for_storage_response_error(
-    response_data: Maybe[RequestResp],
+    response_data: Maybe[StorageFile],
 ) -> Maybe[FastApiResp]:
     """
     Checks if the storage response contains error and return them accordingly
@@ -87,6 +148,11 @@ def check_for_storage_response_error(
     if status.HTTP_200_OK <= status_code < status.HTTP_400_BAD_REQUEST:
         return Nothing
 
+    if status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE:
+        return Maybe.from_value(
+            FastApiResp(content=message.FILE_TOO_LARGE, status_code=status_code),
+        )
+
     return Maybe.from_value(
         FastApiResp(
             content=message.STORAGE_UNAVAILABLE_STRING
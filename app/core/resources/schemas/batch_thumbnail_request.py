@@ -0,0 +1,36 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from typing import List
+from uuid import UUID
+
+from pydantic import BaseModel, Field, NonNegativeInt
+
+from app.core.resources.app_config import BATCH_MAX_ITEMS
+from app.core.resources.data_validator import AREA_REGEX
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+
+
+class BatchThumbnailItem(BaseModel):
+    """
+    Class representing the parameters of a single thumbnail of a batch,
+    they have the same meaning and defaults of the thumbnail API ones
+    """
+
+    id: UUID
+    version: NonNegativeInt
+    area: str = Field(pattern=AREA_REGEX)
+    shape: ImageBorderShapeEnum = ImageBorderShapeEnum.RECTANGULAR
+    quality: ImageQualityEnum = ImageQualityEnum.MEDIUM
+    output_format: ImageTypeEnum = ImageTypeEnum.JPEG
+
+
+class BatchThumbnailRequest(BaseModel):
+    """
+    Class representing a batch of thumbnails requested at once
+    """
+
+    items: List[BatchThumbnailItem] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
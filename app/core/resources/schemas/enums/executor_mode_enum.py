@@ -0,0 +1,17 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from enum import Enum
+
+
+class ExecutorModeEnum(str, Enum):
+    """
+    Class representing where the CPU bound work of the service is executed
+    """
+
+    INLINE = "inline"
+
+    THREAD = "thread"
+
+    PROCESS = "process"
@@ -5,6 +5,8 @@
 
 from enum import Enum
 
+from PIL import Image
+
 from app.core.resources.constants.image import quality
 
 
@@ -39,3 +41,57 @@ class ImageQualityEnum(str, Enum):
             return quality.JPEG_HIGH_INT
 
         return quality.JPEG_HIGHEST_INT
+
+    def get_jpeg_encoder_profile(
+        self: "ImageQualityEnum",
+    ) -> quality.JpegEncoderProfile:
+        """
+        Returns the JPEG encoder settings correlated to the enum value
+        :param self: the enum to estimate as encoder settings
+        :return: encoder profile corresponding to the quality
+        """
+        if self.value == ImageQualityEnum.LOWEST:
+            return quality.JPEG_LOWEST_PROFILE
+        if self.value == ImageQualityEnum.LOW:
+            return quality.JPEG_LOW_PROFILE
+        if self.value == ImageQualityEnum.MEDIUM:
+            return quality.JPEG_MEDIUM_PROFILE
+        if self.value == ImageQualityEnum.HIGH:
+            return quality.JPEG_HIGH_PROFILE
+
+        return quality.JPEG_HIGHEST_PROFILE
+
+    def get_webp_int_quality(self: "ImageQualityEnum") -> int:
+        """
+        Returns the numerical value (from 0 to 100) of the WebP encoder
+        correlated to the enum value
+        :param self: the enum to estimate as int
+        :return: integer corresponding to the quality
+        """
+        if self.value == ImageQualityEnum.LOWEST:
+            return quality.WEBP_LOWEST_INT
+        if self.value == ImageQualityEnum.LOW:
+            return quality.WEBP_LOW_INT
+        if self.value == ImageQualityEnum.MEDIUM:
+            return quality.WEBP_MEDIUM_INT
+        if self.value == ImageQualityEnum.HIGH:
+            return quality.WEBP_HIGH_INT
+
+        return quality.WEBP_HIGHEST_INT
+
+    def get_resample_filter(self: "ImageQualityEnum") -> Image.Resampling:
+        """
+        Returns the resample filter of the resize correlated to the enum value
+        :param self: the enum to estimate as resample filter
+        :return: Pillow filter corresponding to the quality
+        """
+        if self.value == ImageQualityEnum.LOWEST:
+            return quality.RESAMPLE_LOWEST
+        if self.value == ImageQualityEnum.LOW:
+            return quality.RESAMPLE_LOW
+        if self.value == ImageQualityEnum.MEDIUM:
+            return quality.RESAMPLE_MEDIUM
+        if self.value == ImageQualityEnum.HIGH:
+            return quality.RESAMPLE_HIGH
+
+        return quality.RESAMPLE_HIGHEST
@@ -15,3 +15,5 @@ class ImageTypeEnum(str, Enum):
     PNG = "png"
 
     GIF = "gif"
+
+    WEBP = "webp"
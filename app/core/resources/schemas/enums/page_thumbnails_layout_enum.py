@@ -0,0 +1,15 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from enum import Enum
+
+
+class PageThumbnailsLayoutEnum(str, Enum):
+    """
+    Class representing how the thumbnails of a range of pages are returned
+    """
+
+    SEPARATE = "separate"
+
+    CONTACT_SHEET = "contact_sheet"
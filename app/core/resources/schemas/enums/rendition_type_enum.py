@@ -0,0 +1,15 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from enum import Enum
+
+
+class RenditionTypeEnum(str, Enum):
+    """
+    Class representing all the rendition type accepted values
+    """
+
+    THUMBNAIL = "thumbnail"
+
+    PREVIEW = "preview"
@@ -0,0 +1,37 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from app.core.resources.app_config import BATCH_MAX_ITEMS
+from app.core.resources.data_validator import AREA_REGEX
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.rendition_type_enum import RenditionTypeEnum
+
+
+class ImageRendition(BaseModel):
+    """
+    Class representing the parameters of a single rendition of an image,
+    they have the same meaning and defaults of the thumbnail and preview
+    API ones: shape only applies to thumbnails and crop only to previews
+    """
+
+    type: RenditionTypeEnum
+    area: str = Field(pattern=AREA_REGEX)
+    quality: ImageQualityEnum = ImageQualityEnum.MEDIUM
+    output_format: ImageTypeEnum = ImageTypeEnum.JPEG
+    shape: ImageBorderShapeEnum = ImageBorderShapeEnum.RECTANGULAR
+    crop: bool = False
+
+
+class ImageRenditionsRequest(BaseModel):
+    """
+    Class representing multiple renditions of the same image requested at once
+    """
+
+    renditions: List[ImageRendition] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
+from app.core.resources.schemas.enums.vertical_crop_position_enum import (
+    VerticalCropPositionEnum,
+)
+
+
+class RenditionKey(BaseModel):
+    """
+    Class representing all the request parameters that identify
+    a rendition of a stored file, the fields that do not apply
+    to the route that generated the rendition are left to None
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    route: str
+    service_type: ServiceTypeEnum
+    id: str
+    version: int
+    area: Optional[str] = None
+    quality: Optional[ImageQualityEnum] = None
+    format: Optional[ImageTypeEnum] = None
+    shape: Optional[ImageBorderShapeEnum] = None
+    crop: Optional[bool] = None
+    crop_position: Optional[VerticalCropPositionEnum] = None
+    first_page: Optional[int] = None
+    last_page: Optional[int] = None
@@ -0,0 +1,16 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from typing import IO, NamedTuple
+
+
+class StorageFile(NamedTuple):
+    """
+    Class representing a file downloaded from the storage:
+    content is a file handle positioned at the start of the file,
+    it's kept in memory when small and written on disk otherwise.
+    """
+
+    status_code: int
+    content: IO[bytes]
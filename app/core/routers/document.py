@@ -1,15 +1,20 @@
 # SPDX-FileCopyrightText: 2022 Zextras <https://www.zextras.com
 #
 # SPDX-License-Identifier: AGPL-3.0-only
-import io
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Path, UploadFile, status
+from fastapi import APIRouter, Depends, Header, Path, UploadFile, status
 from fastapi.responses import Response
 from pydantic import NonNegativeInt
 from typing_extensions import Annotated
 
-from app.core.resources.app_config import DOC_NAME, SERVICE_NAME
+from app.core.resources.app_config import (
+    DOC_NAME,
+    DOCUMENT_PREVIEW_CACHE_CONTROL,
+    DOCUMENT_THUMBNAIL_CACHE_CONTROL,
+    SERVICE_NAME,
+)
 from app.core.resources.constants import message
 from app.core.resources.data_validator import (
     AREA_REGEX,
@@ -18,16 +23,21 @@ from app.core.resources.data_validator import (
     check_if_document_thumbnail_is_enabled,
     create_image_metadata_dict,
     get_document_preview_enabled_response_error,
+    negotiate_output_format,
 )
 from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
 from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
 from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.page_thumbnails_layout_enum import (
+    PageThumbnailsLayoutEnum,
+)
 from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
 from app.core.resources.schemas.enums.vertical_crop_position_enum import (
     VerticalCropPositionEnum,
 )
+from app.core.resources.schemas.rendition_key import RenditionKey
 from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
-from app.core.services import document_service, image_service
+from app.core.services import document_service, rendition_cache
 
 router = APIRouter(
     prefix=f"/{SERVICE_NAME}/{DOC_NAME}",
@@ -49,6 +59,7 @@ async def get_preview(
     version: NonNegativeInt,
     service_type: ServiceTypeEnum,
     pages: DocumentPagesMetadataModel = Depends(),
+    if_none_match: Annotated[Optional[str], Header()] = None,
 ) -> Response:
     """
     Create and returns a pdf preview of the given file,
@@ -65,17 +76,30 @@ async def get_preview(
     :param pages: first and last page to convert
     :param version: version of the file
     :param service_type: service that owns the resource
+    :param if_none_match: ETags of the renditions already cached by the client
     :return: 400 if there were invalid parameters, otherwise
     the requested file converted accordingly to pdf.
     """
 
     return get_document_preview_enabled_response_error().value_or(
-        await document_service.retrieve_doc_and_create_preview(
-            file_id=str(id),
-            version=version,
-            first_page_number=pages.first_page,
-            last_page_number=pages.last_page,
-            service_type=service_type,
+        await rendition_cache.get_or_render(
+            key=RenditionKey(
+                route=f"{DOC_NAME}/preview",
+                service_type=service_type,
+                id=str(id),
+                version=version,
+                first_page=pages.first_page,
+                last_page=pages.last_page,
+            ),
+            render=lambda: document_service.retrieve_doc_and_create_preview(
+                file_id=str(id),
+                version=version,
+                first_page_number=pages.first_page,
+                last_page_number=pages.last_page,
+                service_type=service_type,
+            ),
+            if_none_match=if_none_match,
+            cache_control=DOCUMENT_PREVIEW_CACHE_CONTROL,
         ),
     )
 
@@ -155,14 +179,10 @@ async def post_thumbnail(
         area=area,
     )
 
-    content: io.BytesIO = await document_service.create_thumbnail_from_raw(
-        file=file,
-        output_format=output_format.value,
-    )
     return Response(
         content=(
-            image_service.process_raw_thumbnail(
-                raw_content=content,
+            await document_service.create_thumbnail_from_raw(
+                file=file,
                 img_metadata=ThumbnailImageMetadata(**metadata_dict),
             )
         ).read(),
@@ -185,7 +205,9 @@ async def get_thumbnail(
     service_type: ServiceTypeEnum,
     shape: ImageBorderShapeEnum = ImageBorderShapeEnum.RECTANGULAR,
     quality: ImageQualityEnum = ImageQualityEnum.MEDIUM,
-    output_format: ImageTypeEnum = ImageTypeEnum.JPEG,
+    output_format: Optional[ImageTypeEnum] = None,
+    accept: Annotated[Optional[str], Header()] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
 ) -> Response:
     """
     Create and returns a thumbnail of the file fetched by id and version
@@ -195,6 +217,8 @@ async def get_thumbnail(
     - **quality**: quality of the output image
     (the higher you go the slower the process)
     - **output_format**: format of the output image
+    (jpeg when missing, or webp if the client accepts it
+    and negotiate_output_format is enabled)
     - **area**: width of the output image (>=0) x
     height of the output image (>=0), width x height => 100x200.
     The first is width, the latter height, the order is important!
@@ -211,11 +235,15 @@ async def get_thumbnail(
     :param area: height of the output image (>=0)
      and width of the output image (>=0)
     :param service_type: service that owns the resource
+    :param accept: media types accepted by the client, used when output_format
+     is missing
+    :param if_none_match: ETags of the renditions already cached by the client
     :return: 400 if there were invalid parameters, otherwise
     the requested pdf modified accordingly.
     """
     if check_if_document_thumbnail_is_enabled():
         return THUMBNAIL_NOT_ENABLED_RESPONSE
+    output_format, vary = negotiate_output_format(output_format, accept)
 
     metadata_dict = create_image_metadata_dict(
         quality=quality,
@@ -224,22 +252,179 @@ async def get_thumbnail(
         crop_position=VerticalCropPositionEnum.TOP,
         area=area,
     )
-    image_response: Response = await document_service.retrieve_doc_and_create_thumbnail(
-        file_id=str(id),
-        version=version,
-        output_format=output_format.value,
-        service_type=service_type,
+
+    return await rendition_cache.get_or_render(
+        key=RenditionKey(
+            route=f"{DOC_NAME}/thumbnail",
+            service_type=service_type,
+            id=str(id),
+            version=version,
+            area=area.lower(),
+            quality=quality,
+            format=output_format,
+            shape=shape,
+            crop_position=VerticalCropPositionEnum.TOP,
+        ),
+        render=lambda: document_service.retrieve_doc_and_create_thumbnail(
+            file_id=str(id),
+            version=version,
+            img_metadata=ThumbnailImageMetadata(**metadata_dict),
+            service_type=service_type,
+        ),
+        if_none_match=if_none_match,
+        cache_control=DOCUMENT_THUMBNAIL_CACHE_CONTROL,
+        vary=vary,
     )
-    if image_response.status_code == status.HTTP_200_OK:
-        image_raw: io.BytesIO = io.BytesIO(image_response.body)
-        return Response(
-            content=(
-                image_service.process_raw_thumbnail(
-                    raw_content=image_raw,
-                    img_metadata=ThumbnailImageMetadata(**metadata_dict),
-                )
-            ).read(),
-            media_type=f"image/{output_format}",
-        )
 
-    return image_response
+
+@router.post(
+    "/{area}/thumbnail/pages/",
+    responses={status.HTTP_400_BAD_REQUEST: {"description": message.INPUT_ERROR}},
+)
+async def post_page_thumbnails(
+    area: Annotated[str, Path(regex=AREA_REGEX)],
+    file: UploadFile,
+    pages: DocumentPagesMetadataModel = Depends(),
+    layout: PageThumbnailsLayoutEnum = PageThumbnailsLayoutEnum.SEPARATE,
+    shape: ImageBorderShapeEnum = ImageBorderShapeEnum.RECTANGULAR,
+    quality: ImageQualityEnum = ImageQualityEnum.MEDIUM,
+    output_format: ImageTypeEnum = ImageTypeEnum.JPEG,
+) -> Response:
+    """
+    Create and returns the thumbnails of a range of pages of the given file.
+    - **first_page**: integer value of first page to render (n>=1)
+    - **last_page**: integer value of last page to render  (0 = last of the file),
+    a limited number of pages can be rendered in a single request
+    - **layout**: separate returns a multipart/mixed response with a part
+    for each page (its Content-ID is the page number), contact_sheet returns
+    a single image with the thumbnails of all the pages in a grid.
+    - **quality**: quality of the output image
+    (the higher you go the slower the process)
+    - **output_format**: format of the output image
+    - **area**: width of the thumbnail of each page (>=0) x
+    height of the thumbnail of each page (>=0), width x height => 100x200.
+    The first is width, the latter height, the order is important!
+    - **shape**: Rounded and Rectangular are currently supported.
+    - **file**: file uploaded with FormData.
+    \f
+    :param area: height and width of the thumbnail of each page
+    :param file: file to upload using a FormData
+    :param pages: first and last page to render
+    :param layout: whether to return a thumbnail for each page or a contact sheet
+    :param shape: Rounded and Rectangular are currently supported
+    :param quality: quality of the output image
+    :param output_format: format of the output image
+    :return: 400 if there were invalid parameters, otherwise
+    the thumbnails of the requested pages.
+    """
+    if check_if_document_thumbnail_is_enabled():
+        return THUMBNAIL_NOT_ENABLED_RESPONSE
+
+    metadata_dict = create_image_metadata_dict(
+        quality=quality,
+        output_format=output_format,
+        shape=shape,
+        crop_position=VerticalCropPositionEnum.TOP,
+        area=area,
+    )
+
+    return await document_service.create_page_thumbnails_from_raw(
+        file=file,
+        first_page_number=pages.first_page,
+        last_page_number=pages.last_page,
+        img_metadata=ThumbnailImageMetadata(**metadata_dict),
+        layout=layout,
+    )
+
+
+@router.get(
+    "/{id}/{version}/{area}/thumbnail/pages/",
+    responses={
+        status.HTTP_502_BAD_GATEWAY: {
+            "description": message.STORAGE_UNAVAILABLE_STRING,
+        },
+    },
+)
+async def get_page_thumbnails(
+    id: UUID,
+    version: NonNegativeInt,
+    area: Annotated[str, Path(regex=AREA_REGEX)],
+    service_type: ServiceTypeEnum,
+    pages: DocumentPagesMetadataModel = Depends(),
+    layout: PageThumbnailsLayoutEnum = PageThumbnailsLayoutEnum.SEPARATE,
+    shape: ImageBorderShapeEnum = ImageBorderShapeEnum.RECTANGULAR,
+    quality: ImageQualityEnum = ImageQualityEnum.MEDIUM,
+    output_format: ImageTypeEnum = ImageTypeEnum.JPEG,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+) -> Response:
+    """
+    Create and returns the thumbnails of a range of pages
+    of the file fetched by id and version.
+    - **id**: UUID of the file.
+    - **version**: version of the file.
+    - **first_page**: integer value of first page to render (n>=1)
+    - **last_page**: integer value of last page to render  (0 = last of the file),
+    a limited number of pages can be rendered in a single request
+    - **layout**: separate returns a multipart/mixed response with a part
+    for each page (its Content-ID is the page number), contact_sheet returns
+    a single image with the thumbnails of all the pages in a grid.
+    - **quality**: quality of the output image
+    (the higher you go the slower the process)
+    - **output_format**: format of the output image
+    - **area**: width of the thumbnail of each page (>=0) x
+    height of the thumbnail of each page (>=0), width x height => 100x200.
+    The first is width, the latter height, the order is important!
+    - **shape**: Rounded and Rectangular are currently supported.
+    - **service_type**: Service that owns the resource
+     (service that first uploaded the data to storage)
+    \f
+    :param id: UUID of the file
+    :param version: version of the file
+    :param area: height and width of the thumbnail of each page
+    :param service_type: service that owns the resource
+    :param pages: first and last page to render
+    :param layout: whether to return a thumbnail for each page or a contact sheet
+    :param shape: Rounded and Rectangular are currently supported
+    :param quality: quality of the output image
+    :param output_format: format of the output image
+    :param if_none_match: ETags of the renditions already cached by the client
+    :return: 400 if there were invalid parameters, otherwise
+    the thumbnails of the requested pages.
+    """
+    if check_if_document_thumbnail_is_enabled():
+        return THUMBNAIL_NOT_ENABLED_RESPONSE
+
+    metadata_dict = create_image_metadata_dict(
+        quality=quality,
+        output_format=output_format,
+        shape=shape,
+        crop_position=VerticalCropPositionEnum.TOP,
+        area=area,
+    )
+
+    return await rendition_cache.get_or_render(
+        key=RenditionKey(
+            route=f"{DOC_NAME}/thumbnail/pages/{layout.value}",
+            service_type=service_type,
+            id=str(id),
+            version=version,
+            area=area.lower(),
+            quality=quality,
+            format=output_format,
+            shape=shape,
+            crop_position=VerticalCropPositionEnum.TOP,
+            first_page=pages.first_page,
+            last_page=pages.last_page,
+        ),
+        render=lambda: document_service.retrieve_doc_and_create_page_thumbnails(
+            file_id=str(id),
+            version=version,
+            first_page_number=pages.first_page,
+            last_page_number=pages.last_page,
+            img_metadata=ThumbnailImageMetadata(**metadata_dict),
+            layout=layout,
+            service_type=service_type,
+        ),
+        if_none_match=if_none_match,
+        cache_control=DOCUMENT_THUMBNAIL_CACHE_CONTROL,
+    )
@@ -16,6 +16,13 @@ from app.core.resources.app_config import (
     STORAGE_HEALTH_CHECK_API,
 )
 from app.core.resources.constants import message
+from app.core.services import (
+    conversion_cache,
+    conversion_limiter,
+    http_clients,
+    rendition_cache,
+    storage_communication,
+)
 
 router = APIRouter(
     prefix=f"/{HEALTH_NAME}",
@@ -41,9 +48,11 @@ async def health() -> dict:
     :return: json with status of service and optional dependencies
     """
     is_storage_up: bool = await _is_dependency_up(
+        http_clients.get_storage_client(),
         f"{STORAGE_FULL_ADDRESS}/{STORAGE_HEALTH_CHECK_API}",
     )
     is_libre_up: bool = await _is_dependency_up(
+        http_clients.get_docs_editor_client(),
         DOCUMENT_CONVERSION_FULL_SERVICE_ADDRESS,
     )
 
@@ -75,7 +84,8 @@ async def health_ready() -> Response:
     \f
     :return: returns 200 if service and carbonio-docs-editor are running
     """
-    if not ARE_DOCS_ENABLED or _is_dependency_up(
+    if not ARE_DOCS_ENABLED or await _is_dependency_up(
+        http_clients.get_docs_editor_client(),
         DOCUMENT_CONVERSION_FULL_SERVICE_ADDRESS,
     ):
         logger.debug("Health ready with status code 200")
@@ -99,10 +109,34 @@ async def health_live() -> Response:
     return Response(status_code=status.HTTP_200_OK)
 
 
-async def _is_dependency_up(dependency_url: str, timeout: int = 5) -> bool:
+@router.get("/stats/")
+async def health_stats() -> dict:
+    """
+    Returns the counters of the worker that served the request
+    \f
+    :return: json with the rendition and conversion caches hits, misses,
+     evictions and size, the docs-editor conversions running, queued and rejected
+     with their wait time, the renditions shared by identical requests
+     and the work skipped because the storage returned an error
+    """
+    return {
+        "rendition_cache": rendition_cache.rendition_cache.stats(),
+        "single_flight": dict(rendition_cache.single_flight_stats),
+        "conversion_cache": conversion_cache.conversion_cache.stats(),
+        "conversion_limiter": conversion_limiter.conversion_limiter.stats(),
+        "storage_errors": dict(storage_communication.error_path_stats),
+    }
+
+
+async def _is_dependency_up(
+    client: httpx.AsyncClient,
+    dependency_url: str,
+    timeout: int = 5,
+) -> bool:
     """
     Checks if the requested dependency is up
     \f
+    :param client: client connected to the dependency
     :param dependency_url: address to ping,
      it should be the health API of the dependency
     :param timeout: if the service does not respond in the given timeout frame,
@@ -110,9 +144,8 @@ async def _is_dependency_up(dependency_url: str, timeout: int = 5) -> bool:
     :return: True if the dependency is up
     """
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(dependency_url, timeout=timeout)
-            resp.raise_for_status()
-            return True
+        resp = await client.get(dependency_url, timeout=timeout)
+        resp.raise_for_status()
     except httpx.HTTPError:
         return False
+    return True
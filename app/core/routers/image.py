@@ -1,30 +1,43 @@
 # SPDX-FileCopyrightText: 2022 Zextras <https://www.zextras.com
 #
 # SPDX-License-Identifier: AGPL-3.0-only
+import functools
 import io
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Path, UploadFile, status
+from fastapi import APIRouter, Header, Path, UploadFile, status
 from fastapi.responses import Response
 from pydantic import NonNegativeInt
 from typing_extensions import Annotated
 
-from app.core.resources.app_config import IMAGE_NAME, SERVICE_NAME
+from app.core.resources.app_config import (
+    BATCH_MAX_CONCURRENCY,
+    IMAGE_NAME,
+    IMAGE_PREVIEW_CACHE_CONTROL,
+    IMAGE_THUMBNAIL_CACHE_CONTROL,
+    SERVICE_NAME,
+)
 from app.core.resources.constants import message
 from app.core.resources.data_validator import (
     AREA_REGEX,
     create_image_metadata_dict,
+    negotiate_output_format,
 )
+from app.core.resources.schemas.batch_thumbnail_request import BatchThumbnailRequest
 from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
 from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
 from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.rendition_type_enum import RenditionTypeEnum
 from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
 from app.core.resources.schemas.enums.vertical_crop_position_enum import (
     VerticalCropPositionEnum,
 )
+from app.core.resources.schemas.image_renditions_request import ImageRenditionsRequest
 from app.core.resources.schemas.preview_image_metadata import PreviewImageMetadata
+from app.core.resources.schemas.rendition_key import RenditionKey
 from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
-from app.core.services import image_service
+from app.core.services import batch_service, image_service, rendition_cache
 
 router = APIRouter(
     prefix=f"/{SERVICE_NAME}/{IMAGE_NAME}",
@@ -49,7 +62,9 @@ async def get_thumbnail(
     service_type: ServiceTypeEnum,
     shape: ImageBorderShapeEnum = ImageBorderShapeEnum.RECTANGULAR,
     quality: ImageQualityEnum = ImageQualityEnum.MEDIUM,
-    output_format: ImageTypeEnum = ImageTypeEnum.JPEG,
+    output_format: Optional[ImageTypeEnum] = None,
+    accept: Annotated[Optional[str], Header()] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
 ) -> Response:
     """
     Creates and returns a thumbnail of the image fetched by id and version
@@ -60,6 +75,8 @@ async def get_thumbnail(
     - **quality**: quality of the output image
     (the higher you go the slower the process)
     - **output_format**: format of the output image
+    (jpeg when missing, or webp if the client accepts it
+    and negotiate_output_format is enabled)
     - **area**: width of the output image (>=0) x
     height of the output image (>=0), width x height => 100x200.
     The first is width, the latter height, the order is important!
@@ -74,21 +91,79 @@ async def get_thumbnail(
     :param service_type: service that owns the resource
     :param area: height x width of the output image (both>=0)
     :param shape: Rounded and Rectangular are currently supported
+    :param accept: media types accepted by the client, used when output_format
+     is missing
+    :param if_none_match: ETags of the renditions already cached by the client
     :return: 400 ok if there were invalid parameters, otherwise
     the requested image modified accordingly.
     """
-    metadata_dict = create_image_metadata_dict(
+    output_format, vary = negotiate_output_format(output_format, accept)
+    return await _get_thumbnail(
+        id=id,
+        version=version,
+        area=area,
+        service_type=service_type,
+        shape=shape,
         quality=quality,
         output_format=output_format,
-        shape=shape,
-        crop_position=VerticalCropPositionEnum.CENTER,
-        area=area,
+        if_none_match=if_none_match,
+        vary=vary,
     )
-    return await image_service.retrieve_image_and_create_thumbnail(
-        image_id=str(id),
-        version=version,
-        img_metadata=ThumbnailImageMetadata(**metadata_dict),
-        service_type=service_type,
+
+
+@router.post(
+    "/thumbnail/batch/",
+    response_class=Response,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {batch_service.MULTIPART_MEDIA_TYPE: {}},
+            "description": "One part for each requested thumbnail",
+        },
+    },
+)
+async def post_thumbnail_batch(
+    batch: BatchThumbnailRequest,
+    service_type: ServiceTypeEnum,
+) -> Response:
+    """
+    Creates and returns the thumbnails of multiple images fetched by id
+    and version, each with its own size, quality, format and shape.
+    The images are fetched and processed concurrently, the thumbnails
+    are returned in a multipart/mixed response with one part for each item,
+    in the same order of the request. Each part has a Content-ID header
+    with the index of its item and an X-Status-Code header with the status
+    code the thumbnail API would have returned: a part containing an error
+    does not fail the other ones.
+    - **items**: list of thumbnails, each one with the id, version, area,
+    shape, quality and output_format parameters of the thumbnail API
+    - **service_type**: Service that owns the resources
+    (service that first uploaded the data to storage)
+    \f
+    :param batch: thumbnails to create
+    :param service_type: service that owns the resources
+    :return: the multipart response containing the thumbnails
+    """
+    responses = await batch_service.render_all(
+        renders=[
+            functools.partial(
+                _get_thumbnail,
+                id=item.id,
+                version=item.version,
+                area=item.area,
+                service_type=service_type,
+                shape=item.shape,
+                quality=item.quality,
+                output_format=item.output_format,
+            )
+            for item in batch.items
+        ],
+        max_concurrency=BATCH_MAX_CONCURRENCY,
+    )
+    return batch_service.create_multipart_response(
+        [
+            ({"Content-ID": str(index)}, response)
+            for index, response in enumerate(responses)
+        ],
     )
 
 
@@ -132,7 +207,7 @@ async def post_thumbnail(
     )
     return Response(
         content=(
-            image_service.process_raw_thumbnail(
+            await image_service.process_raw_thumbnail(
                 raw_content=io.BytesIO(file.file.read()),
                 img_metadata=ThumbnailImageMetadata(**metadata_dict),
             )
@@ -182,7 +257,7 @@ async def post_preview(
 
     return Response(
         content=(
-            image_service.process_raw_preview(
+            await image_service.process_raw_preview(
                 raw_content=io.BytesIO(file.file.read()),
                 img_metadata=PreviewImageMetadata(**metadata_dict),
             )
@@ -207,7 +282,9 @@ async def get_preview(
     service_type: ServiceTypeEnum,
     crop: bool = False,
     quality: ImageQualityEnum = ImageQualityEnum.MEDIUM,
-    output_format: ImageTypeEnum = ImageTypeEnum.JPEG,
+    output_format: Optional[ImageTypeEnum] = None,
+    accept: Annotated[Optional[str], Header()] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
 ) -> Response:
     """
     Creates and returns a preview of the image fetched by id and version
@@ -217,6 +294,8 @@ async def get_preview(
     - **quality**: quality of the output image
     (the higher you go the slower the process)
     - **output_format**: format of the output image
+    (jpeg when missing, or webp if the client accepts it
+    and negotiate_output_format is enabled)
     - **area**: width of the output image (>=0) x
     height of the output image (>=0), width x height => 100x200.
     The first is width, the latter height, the order is important!
@@ -234,9 +313,13 @@ async def get_preview(
     :param area: height of the output image (>=0)
      and width of the output image (>=0)
     :param service_type: service that owns the resource
+    :param accept: media types accepted by the client, used when output_format
+     is missing
+    :param if_none_match: ETags of the renditions already cached by the client
     :return: 400 if there were invalid parameters, otherwise
     the requested image modified accordingly.
     """
+    output_format, vary = negotiate_output_format(output_format, accept)
     metadata_dict = create_image_metadata_dict(
         quality=quality,
         output_format=output_format,
@@ -244,9 +327,153 @@ async def get_preview(
         crop_position=VerticalCropPositionEnum.CENTER,
         area=area,
     )
-    return await image_service.retrieve_image_and_create_preview(
+    return await rendition_cache.get_or_render(
+        key=RenditionKey(
+            route=f"{IMAGE_NAME}/preview",
+            service_type=service_type,
+            id=str(id),
+            version=version,
+            area=area.lower(),
+            quality=quality,
+            format=output_format,
+            crop=crop,
+            crop_position=VerticalCropPositionEnum.CENTER,
+        ),
+        render=lambda: image_service.retrieve_image_and_create_preview(
+            image_id=str(id),
+            version=version,
+            img_metadata=PreviewImageMetadata(**metadata_dict),
+            service_type=service_type,
+        ),
+        if_none_match=if_none_match,
+        cache_control=IMAGE_PREVIEW_CACHE_CONTROL,
+        vary=vary,
+    )
+
+
+@router.post(
+    "/{id}/{version}/renditions/",
+    response_class=Response,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {batch_service.MULTIPART_MEDIA_TYPE: {}},
+            "description": "One part for each requested rendition",
+        },
+        status.HTTP_502_BAD_GATEWAY: {
+            "description": message.STORAGE_UNAVAILABLE_STRING,
+        },
+        status.HTTP_404_NOT_FOUND: {"description": message.ITEM_NOT_FOUND},
+    },
+)
+async def post_renditions(
+    id: UUID,
+    version: NonNegativeInt,
+    request: ImageRenditionsRequest,
+    service_type: ServiceTypeEnum,
+) -> Response:
+    """
+    Creates and returns multiple thumbnails and previews of the image
+    fetched by id and version, fetching and decoding the image only once.
+    The renditions are returned in a multipart/mixed response with one part
+    for each of them, in the same order of the request. Each part has
+    a Content-ID header with the index of its rendition.
+    - **id**: UUID of the image
+    - **version**: version of the image
+    - **renditions**: list of renditions, each one with its type
+    (thumbnail or preview) and the area, quality and output_format
+    parameters of the thumbnail and preview APIs, along with
+    the shape of the thumbnails and the crop of the previews
+    - **service_type**: Service that owns the resource
+    (service that first uploaded the data to storage)
+    \f
+    :param id: UUID of the image
+    :param version: version of the image
+    :param request: renditions to create
+    :param service_type: service that owns the resource
+    :return: 400 if there were invalid parameters, otherwise
+    the multipart response containing the renditions.
+    """
+    renditions: List[image_service.ImageRenditionMetadata] = []
+    for rendition in request.renditions:
+        if rendition.type == RenditionTypeEnum.THUMBNAIL:
+            metadata_dict = create_image_metadata_dict(
+                quality=rendition.quality,
+                output_format=rendition.output_format,
+                shape=rendition.shape,
+                crop_position=VerticalCropPositionEnum.CENTER,
+                area=rendition.area,
+            )
+            renditions.append(ThumbnailImageMetadata(**metadata_dict))
+        else:
+            metadata_dict = create_image_metadata_dict(
+                quality=rendition.quality,
+                output_format=rendition.output_format,
+                crop=rendition.crop,
+                crop_position=VerticalCropPositionEnum.CENTER,
+                area=rendition.area,
+            )
+            renditions.append(PreviewImageMetadata(**metadata_dict))
+    return await image_service.retrieve_image_and_create_renditions(
         image_id=str(id),
         version=version,
-        img_metadata=PreviewImageMetadata(**metadata_dict),
+        renditions=renditions,
         service_type=service_type,
     )
+
+
+async def _get_thumbnail(
+    id: UUID,
+    version: int,
+    area: str,
+    service_type: ServiceTypeEnum,
+    shape: ImageBorderShapeEnum,
+    quality: ImageQualityEnum,
+    output_format: ImageTypeEnum,
+    if_none_match: Optional[str] = None,
+    vary: str = "",
+) -> Response:
+    """
+    Returns the cached thumbnail with the given parameters,
+    creating it if it is missing
+    \f
+    :param id: UUID of the image
+    :param version: version of the image
+    :param area: width x height of the output image
+    :param service_type: service that owns the resource
+    :param shape: Rounded and Rectangular are currently supported
+    :param quality: quality of the output image
+    :param output_format: format of the output image
+    :param if_none_match: ETags of the renditions already cached by the client,
+     None when the thumbnail is part of a batch
+    :param vary: Vary header of the thumbnail, empty to omit it
+    :return: the thumbnail or the error response
+    """
+    metadata_dict = create_image_metadata_dict(
+        quality=quality,
+        output_format=output_format,
+        shape=shape,
+        crop_position=VerticalCropPositionEnum.CENTER,
+        area=area,
+    )
+    return await rendition_cache.get_or_render(
+        key=RenditionKey(
+            route=f"{IMAGE_NAME}/thumbnail",
+            service_type=service_type,
+            id=str(id),
+            version=version,
+            area=area.lower(),
+            quality=quality,
+            format=output_format,
+            shape=shape,
+            crop_position=VerticalCropPositionEnum.CENTER,
+        ),
+        render=lambda: image_service.retrieve_image_and_create_thumbnail(
+            image_id=str(id),
+            version=version,
+            img_metadata=ThumbnailImageMetadata(**metadata_dict),
+            service_type=service_type,
+        ),
+        if_none_match=if_none_match,
+        cache_control=IMAGE_THUMBNAIL_CACHE_CONTROL,
+        vary=vary,
+    )
@@ -0,0 +1,28 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.resources.app_config import METRICS_NAME
+from app.core.services import metrics
+
+router = APIRouter(
+    prefix=f"/{METRICS_NAME}",
+    tags=[METRICS_NAME],
+)
+
+
+@router.get("/")
+async def get_metrics() -> Response:
+    """
+    Returns the metrics of the service in the Prometheus text format:
+    requests and their latency by route, output format, service type
+    and status code, and the latency of each stage of the renditions.
+    They are aggregated across all the workers.
+    \f
+    :return: the metrics in the Prometheus text format
+    """
+    content, media_type = metrics.export_metrics()
+    return Response(content=content, media_type=media_type)
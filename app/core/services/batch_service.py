@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response as FastApiResp
+
+from app.core.resources.constants import message
+
+logger = logging.getLogger(__name__)
+
+MULTIPART_MEDIA_TYPE: str = "multipart/mixed"
+
+
+async def _render_item(
+    render: Callable[[], Awaitable[FastApiResp]],
+    semaphore: asyncio.Semaphore,
+) -> FastApiResp:
+    """
+    Renders a single item of the batch, converting its errors to a response
+    so that they do not fail the whole batch
+    \f
+    :param render: coroutine function that creates the item response
+    :param semaphore: semaphore bounding the items rendered at the same time
+    :return: the item response or its error response
+    """
+    async with semaphore:
+        try:
+            return await render()
+        except HTTPException as http_error:
+            return FastApiResp(
+                content=str(http_error.detail),
+                status_code=http_error.status_code,
+            )
+        except Exception:
+            logger.exception("Unexpected error rendering a batch item")
+            return FastApiResp(
+                content=message.RENDITION_FAILED,
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+async def render_all(
+    renders: List[Callable[[], Awaitable[FastApiResp]]],
+    max_concurrency: int,
+) -> List[FastApiResp]:
+    """
+    Renders every item concurrently, with at most max_concurrency of them
+    fetching or rendering at the same time. A failing item does not
+    stop the others, its error is returned as its response.
+    \f
+    :param renders: coroutine functions that create the response of each item
+    :param max_concurrency: max number of items rendered at the same time
+    :return: the responses in the same order of the renders
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return list(
+        await asyncio.gather(*(_render_item(render, semaphore) for render in renders)),
+    )
+
+
+def create_multipart_response(
+    parts: List[Tuple[Dict[str, str], FastApiResp]],
+) -> FastApiResp:
+    """
+    Creates a multipart/mixed response containing the given responses,
+    each part has the content type of its response, an X-Status-Code header
+    with its status code and the given additional headers.
+    \f
+    :param parts: additional headers and response of each part
+    :return: the multipart response
+    """
+    boundary = uuid.uuid4().hex
+    body: List[bytes] = []
+    for headers, response in parts:
+        part_headers = {
+            "Content-Type": response.media_type or "text/plain",
+            "X-Status-Code": str(response.status_code),
+            **headers,
+        }
+        body.append(f"--{boundary}\r\n".encode())
+        body.extend(
+            f"{name}: {value}\r\n".encode() for name, value in part_headers.items()
+        )
+        body.append(b"\r\n")
+        body.append(bytes(response.body))
+        body.append(b"\r\n")
+    body.append(f"--{boundary}--\r\n".encode())
+    return FastApiResp(
+        content=b"".join(body),
+        media_type=f"{MULTIPART_MEDIA_TYPE}; boundary={boundary}",
+    )
@@ -0,0 +1,246 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import IO, Awaitable, Callable, Dict, List, Optional
+
+from app.core.resources.app_config import (
+    CONVERSION_CACHE_MAX_SIZE,
+    CONVERSION_CACHE_PATH,
+)
+from app.core.resources.constants.service import STREAMING_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+_TEMPORARY_SUFFIX: str = ".tmp"
+
+
+def compute_digest(content: IO[bytes]) -> str:
+    """
+    Computes the sha256 of the file reading it in chunks,
+    so that files on disk are never read in memory at once
+    \f
+    :param content: file to hash, it is positioned at its start afterwards
+    :return: the hex digest of the file
+    """
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in iter(functools.partial(content.read, STREAMING_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    Cache on disk of the files converted by the docs-editor, keyed by
+    the sha256 of the converted file and the output extension, so that
+    the same file is converted once whatever item, version or route it
+    comes from. It is shared by every worker: files are written atomically
+    and the least recently used ones (by modification time, updated on
+    every hit) are evicted when the cache exceeds max_size.
+    """
+
+    def __init__(self: "ConversionCache", path: str, max_size: int) -> None:
+        """
+        \f
+        :param path: directory containing the cached conversions,
+         it is created on the first write
+        :param max_size: max total size in bytes of the cached conversions,
+         0 disables the cache
+        """
+        self.path: Path = Path(path)
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(
+        self: "ConversionCache",
+        digest: str,
+        output_extension: str,
+    ) -> Optional[bytes]:
+        """
+        Returns the cached conversion marking it as the most recently used one
+        \f
+        :param digest: sha256 of the converted file
+        :param output_extension: extension the file was converted to
+        :return: the converted file or None if it's missing or unreadable
+        """
+        entry = self._get_entry_path(digest, output_extension)
+        try:
+            converted = entry.read_bytes()
+            os.utime(entry)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return converted
+
+    def put(
+        self: "ConversionCache",
+        digest: str,
+        output_extension: str,
+        converted: bytes,
+    ) -> None:
+        """
+        Caches the given conversion, evicting the least recently used ones
+        until the cache fits in max_size. Conversions bigger than max_size
+        are never cached. Errors writing on disk are only logged.
+        \f
+        :param digest: sha256 of the converted file
+        :param output_extension: extension the file was converted to
+        :param converted: the converted file
+        """
+        if len(converted) > self.max_size:
+            return
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            # written in a temporary file and renamed, so that other workers
+            # never read a conversion that is still being written
+            with tempfile.NamedTemporaryFile(
+                dir=self.path,
+                suffix=_TEMPORARY_SUFFIX,
+                delete=False,
+            ) as temporary_file:
+                temporary_file.write(converted)
+            Path(temporary_file.name).replace(
+                self._get_entry_path(digest, output_extension),
+            )
+            self._evict()
+        except OSError as e:
+            logger.warning(f"Unable to cache the conversion on disk. Error: {e}")
+
+    def clear(self: "ConversionCache") -> None:
+        """
+        Removes every conversion and resets the counters
+        """
+        for entry in self._list_entries():
+            entry.unlink(missing_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self: "ConversionCache") -> Dict[str, int]:
+        """
+        \f
+        :return: hit, miss and eviction counters of the current worker,
+         number of entries and size in bytes of the cache shared by the workers
+        """
+        entries = self._list_entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size": sum(
+                entry_stat.st_size
+                for entry in entries
+                if (entry_stat := _get_stat(entry)) is not None
+            ),
+            "max_size": self.max_size,
+        }
+
+    def _get_entry_path(
+        self: "ConversionCache",
+        digest: str,
+        output_extension: str,
+    ) -> Path:
+        return self.path / f"{digest}.{output_extension}"
+
+    def _list_entries(self: "ConversionCache") -> List[Path]:
+        if not self.path.is_dir():
+            return []
+        return [
+            entry
+            for entry in self.path.iterdir()
+            if entry.is_file() and entry.suffix != _TEMPORARY_SUFFIX
+        ]
+
+    def _evict(self: "ConversionCache") -> None:
+        """
+        Removes the least recently used conversions until the cache fits
+        in max_size. Other workers may remove the same files at the same time.
+        """
+        entries = [
+            (entry_stat, entry)
+            for entry in self._list_entries()
+            if (entry_stat := _get_stat(entry)) is not None
+        ]
+        size = sum(entry_stat.st_size for entry_stat, _ in entries)
+        entries.sort(key=lambda stat_and_entry: stat_and_entry[0].st_mtime)
+        for entry_stat, entry in entries:
+            if size <= self.max_size:
+                break
+            entry.unlink(missing_ok=True)
+            size -= entry_stat.st_size
+            self.evictions += 1
+
+
+def _get_stat(entry: Path) -> Optional[os.stat_result]:
+    """
+    \f
+    :param entry: cached conversion
+    :return: the stat of the file, None if another worker removed it
+    """
+    try:
+        return entry.stat()
+    except FileNotFoundError:
+        return None
+
+
+conversion_cache = ConversionCache(
+    path=CONVERSION_CACHE_PATH,
+    max_size=CONVERSION_CACHE_MAX_SIZE,
+)
+
+
+async def get_or_convert(
+    content: IO[bytes],
+    output_extension: str,
+    convert: Callable[[], Awaitable[io.BytesIO]],
+) -> io.BytesIO:
+    """
+    Returns the cached conversion of the file to the given extension,
+    if missing it calls convert and caches its result when not empty
+    (failed conversions raise an HTTPException). Hashing the file and the
+    disk accesses run in the default thread pool of the event loop.
+    \f
+    :param content: file to convert, it is positioned at its start afterwards
+    :param output_extension: extension the file is converted to
+    :param convert: coroutine function that converts the file
+    :return: the converted file
+    """
+    if conversion_cache.max_size == 0:
+        return await convert()
+
+    loop = asyncio.get_running_loop()
+    digest = await loop.run_in_executor(None, compute_digest, content)
+    cached = await loop.run_in_executor(
+        None,
+        conversion_cache.get,
+        digest,
+        output_extension,
+    )
+    if cached is not None:
+        logger.debug(f"Conversion cache hit for {digest}.{output_extension}")
+        return io.BytesIO(cached)
+
+    converted = await convert()
+    if converted.getbuffer().nbytes > 0:
+        await loop.run_in_executor(
+            None,
+            conversion_cache.put,
+            digest,
+            output_extension,
+            converted.getvalue(),
+        )
+    return converted
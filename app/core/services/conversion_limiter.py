@@ -0,0 +1,140 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.resources.app_config import (
+    DOCUMENT_CONVERSION_MAX_CONCURRENCY,
+    DOCUMENT_CONVERSION_MAX_QUEUE_SIZE,
+    DOCUMENT_CONVERSION_RETRY_AFTER,
+)
+from app.core.resources.constants import message
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionLimiter:
+    """
+    Bounds the conversions a worker sends to the docs-editor at the same time.
+    Up to max_queue_size more conversions wait for a free slot, the others
+    are rejected at once so that the docs-editor is not flooded with requests
+    that would only time out.
+    It is not thread safe: it must only be used from the event loop.
+    """
+
+    def __init__(
+        self: "ConversionLimiter",
+        max_concurrency: int,
+        max_queue_size: int,
+        retry_after: int,
+    ) -> None:
+        """
+        \f
+        :param max_concurrency: max number of conversions running at the same time
+        :param max_queue_size: max number of conversions waiting for a free slot
+        :param retry_after: seconds suggested to the rejected clients before retrying
+        """
+        self.max_concurrency: int = max_concurrency
+        self.max_queue_size: int = max_queue_size
+        self.retry_after: int = retry_after
+        self.in_flight: int = 0
+        self.queued: int = 0
+        self.max_queued: int = 0
+        self.accepted: int = 0
+        self.rejected: int = 0
+        self.total_wait_time: float = 0
+        self.max_wait_time: float = 0
+        # semaphores are bound to the event loop that first uses them,
+        # so the semaphore is stored along with its loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def limit(self: "ConversionLimiter") -> AsyncIterator[None]:
+        """
+        Waits for a free slot, holding it until the block exits
+        \f
+        :raises: HTTPException 503 with Retry-After if all the slots
+         are taken and the queue is full
+        """
+        semaphore = self._get_semaphore()
+        if self.in_flight + self.queued >= self.max_concurrency + self.max_queue_size:
+            self.rejected += 1
+            logger.warning(
+                f"Conversion rejected, {self.in_flight} running"
+                f" and {self.queued} queued",
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=message.DOCS_EDITOR_BUSY,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        start = time.monotonic()
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+        wait_time = time.monotonic() - start
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.accepted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    def clear(self: "ConversionLimiter") -> None:
+        """
+        Resets the counters, the running and queued conversions are kept
+        """
+        self.max_queued = self.queued
+        self.accepted = 0
+        self.rejected = 0
+        self.total_wait_time = 0
+        self.max_wait_time = 0
+
+    def stats(self: "ConversionLimiter") -> Dict[str, float]:
+        """
+        \f
+        :return: running and queued conversions, accepted and rejected counters
+         and the time in milliseconds spent waiting for a free slot
+        """
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "average_wait_ms": (
+                self.total_wait_time * 1000 / self.accepted if self.accepted else 0
+            ),
+            "max_wait_ms": self.max_wait_time * 1000,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_size": self.max_queue_size,
+        }
+
+    def _get_semaphore(self: "ConversionLimiter") -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+
+conversion_limiter = ConversionLimiter(
+    max_concurrency=DOCUMENT_CONVERSION_MAX_CONCURRENCY,
+    max_queue_size=DOCUMENT_CONVERSION_MAX_QUEUE_SIZE,
+    retry_after=DOCUMENT_CONVERSION_RETRY_AFTER,
+)
@@ -1,29 +1,57 @@
 # SPDX-FileCopyrightText: 2022 Zextras <https://www.zextras.com
 #
 # SPDX-License-Identifier: AGPL-3.0-only
+import ctypes
 import io
 import logging
+import mmap
+import os
+import tempfile
+import threading
+from typing import IO, Optional, Tuple
 
 import httpx
 import pypdfium2
 from fastapi import status
 from fastapi.exceptions import HTTPException
+from PIL import Image
 from pypdfium2 import PdfDocument, PdfiumError
 from returns.result import Failure, Result, Success
 
 from app.core.resources.app_config import (
     DOCS_TIMEOUT,
     DOCUMENT_CONVERSION_FULL_CONVERT_ADDRESS,
+    IMAGE_MIN_RES,
 )
+from app.core.resources.constants import message
+from app.core.resources.constants.image.constants import PDF_RENDER_REDUCING_GAP
 from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
 from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.services import (
+    conversion_cache,
+    conversion_limiter,
+    http_clients,
+    task_executor,
+)
 from app.core.services.image_manipulation import image_manipulation
+from app.core.services.metrics import (
+    STAGE_DOCS_EDITOR_CONVERSION,
+    STAGE_PDF_RENDER,
+    observe_stage,
+)
 
 logger = logging.getLogger(__name__)
 
+PDF_HEADER: bytes = b"%PDF-"
+PDF_HEADER_SEARCH_SIZE: int = 1024
+
+# PDFium is not thread safe: when the executor runs in thread mode
+# every call to the library must be serialized.
+_pdfium_lock = threading.Lock()
+
 
 def split_pdf(
-    content: io.BytesIO,
+    content: IO[bytes],
     first_page_number: int,
     last_page_number: int,
 ) -> io.BytesIO:
@@ -35,13 +63,34 @@ def split_pdf(
     :param last_page_number: last page to convert
     :return: pdf with the first n pages
     """
-    pdf: PdfDocument = _parse_if_valid_pdf(content).value_or(PdfDocument.new())
-    start_page: int = first_page_number - 1
-    end_page: int = last_page_number if 0 < last_page_number < len(pdf) else len(pdf)
-    return _write_pdf_to_buffer(pdf, start_page, end_page)
+    with _pdfium_lock:
+        pdf: PdfDocument = _parse_if_valid_pdf(content).value_or(PdfDocument.new())
+        start_page: int = first_page_number - 1
+        end_page: int = (
+            last_page_number if 0 < last_page_number < len(pdf) else len(pdf)
+        )
+        out_buffer: io.BytesIO = _write_pdf_to_buffer(pdf, start_page, end_page)
+        # release the document while still holding the lock
+        del pdf
+    return out_buffer
+
+
+def has_pdf_header(content: IO[bytes]) -> bool:
+    """
+    Checks if the file starts with the pdf header, which the pdf specification
+    allows anywhere in the first PDF_HEADER_SEARCH_SIZE bytes,
+    without opening it with PDFium
+    \f
+    :param content: file to check, it is positioned at its start afterwards
+    :return: True if the pdf header is found
+    """
+    content.seek(0)
+    head = content.read(PDF_HEADER_SEARCH_SIZE)
+    content.seek(0)
+    return PDF_HEADER in head
 
 
-def _parse_if_valid_pdf(content: io.BytesIO) -> Result[PdfDocument, PdfiumError]:
+def _parse_if_valid_pdf(content: IO[bytes]) -> Result[PdfDocument, PdfiumError]:
     """
     Parses the given buffer of bytes into PdfReader,
      if the file is not valid returns None
@@ -50,7 +99,7 @@ def _parse_if_valid_pdf(content: io.BytesIO) -> Result[PdfDocument, PdfiumError]
     :return: PdfReader object containing the pdf or Empty if not valid
     """
     try:
-        return Success(PdfDocument(content))
+        return Success(_open_pdf(content))
     except PdfiumError as e:  # not a valid pdf
         logger.warning(
             f"Not a valid pdf file, replacing it with an empty one. Error: {e}",
@@ -58,6 +107,46 @@ def _parse_if_valid_pdf(content: io.BytesIO) -> Result[PdfDocument, PdfiumError]
         return Failure(e)
 
 
+def _open_pdf(content: IO[bytes]) -> PdfDocument:
+    """
+    Opens the pdf with PDFium. When the pdf is a file on disk (a download
+    or an upload bigger than the spool size, or a regular file) it is memory
+    mapped, so PDFium reads it in place and only the parts it accesses
+    are paged in, instead of reading it through a copy kept in memory.
+    \f
+    :param content: pdf to open
+    :return: the opened PdfDocument
+    :raises: PdfiumError if the pdf is not valid
+    """
+    if isinstance(content, tempfile.SpooledTemporaryFile):
+        # the spooled file is kept in a BytesIO until it exceeds its max size,
+        # then in a temporary file. Its fileno() would write it to disk and
+        # it implements readinto, needed by PDFium, only from python 3.11
+        content = content._file  # noqa: SLF001
+    file_descriptor = _get_file_descriptor(content)
+    if file_descriptor is None or os.fstat(file_descriptor).st_size == 0:
+        return PdfDocument(content)
+    # a private mapping can be exposed as a ctypes array without copying it,
+    # PDFium never writes to it so its pages stay shared with the page cache
+    mapped_file = mmap.mmap(file_descriptor, 0, access=mmap.ACCESS_COPY)
+    return PdfDocument((ctypes.c_char * len(mapped_file)).from_buffer(mapped_file))
+
+
+def _get_file_descriptor(content: IO[bytes]) -> Optional[int]:
+    """
+    \f
+    :param content: file to inspect
+    :return: the descriptor of the file on disk containing content,
+     None if content is kept in memory
+    """
+    if isinstance(content, io.BytesIO):
+        return None
+    try:
+        return content.fileno()
+    except (AttributeError, OSError):
+        return None
+
+
 def _write_pdf_to_buffer(
     pdf: PdfDocument,
     start_page: int = 0,
@@ -86,7 +175,7 @@ def _write_pdf_to_buffer(
 
 
 async def convert_to_pdf(
-    content: io.BytesIO,
+    content: IO[bytes],
     first_page_number: int,
     last_page_number: int,
     log: logging.Logger = logger,
@@ -100,7 +189,8 @@ async def convert_to_pdf(
     :param log: logger to use
     """
 
-    return split_pdf(
+    return await task_executor.run_cpu_bound(
+        split_pdf,
         content=await convert_file_to(
             content=content,
             output_extension="pdf",
@@ -112,7 +202,7 @@ async def convert_to_pdf(
 
 
 async def convert_file_to(
-    content: io.BytesIO,
+    content: IO[bytes],
     output_extension: str,
     log: logging.Logger = logger,
 ) -> io.BytesIO:
@@ -121,21 +211,27 @@ async def convert_file_to(
      supported format using _convert_with_libre.
      SHOULD ALWAYS be used instead of _convert_with_libre
      as it isolates the connection with libre
+     and reuses the conversions of the same file kept in the conversion cache
     \f
     :param content: file to convert
     :param output_extension: output file,
      should be a format supported by Carbonio-docs-editor
     :param log: logger to use
     """
-    return await _convert_with_libre(
+    output_extension = _sanitize_output_extension(output_extension)
+    return await conversion_cache.get_or_convert(
         content=content,
         output_extension=output_extension,
-        log=log,
+        convert=lambda: _convert_with_libre(
+            content=content,
+            output_extension=output_extension,
+            log=log,
+        ),
     )
 
 
 def convert_pdf_to_image(
-    content: io.BytesIO,
+    content: IO[bytes],
     output_extension: str,
     page_number: int,
     log: logging.Logger = logger,
@@ -148,31 +244,108 @@ def convert_pdf_to_image(
     :param page_number: first page to convert
     :param log: logger to use
     """
+    pil_image = render_pdf_page(content=content, page_number=page_number, log=log)
+    return image_manipulation.save_image_to_buffer(
+        img=pil_image,
+        _format=output_extension,
+        _optimize=False,
+        _quality_value=ImageQualityEnum.HIGHEST.get_jpeg_int_quality(),
+        # the render is automatically done at the highest quality.
+        # The desired quality will be set while processing the image
+        # at the end of the api call because
+        # doing it here will just increase method parameters and complexity,
+        # without major performance improvements
+    )
+
+
+def render_pdf_page(
+    content: IO[bytes],
+    page_number: int,
+    requested_x: int = 0,
+    requested_y: int = 0,
+    log: logging.Logger = logger,
+) -> Image.Image:
+    """
+    Renders the page of the pdf using PDFium. If the requested size is given
+    the page is rendered at the smallest scale that keeps it at least
+    PDF_RENDER_REDUCING_GAP times bigger than it, so that the following resize
+    outputs the same image it would output from the full size page,
+    otherwise it is rendered at its own size.
+    \f
+    :param content: pdf to render
+    :param page_number: page to render, starting from 0
+    :param requested_x: width the page will be resized to, 0 if unknown
+    :param requested_y: height the page will be resized to, 0 if unknown
+    :param log: logger to use
+    :return: the rendered page
+    :raises: HTTPException 400 if the pdf is not valid
+    """
     try:
-        pdf = pypdfium2.PdfDocument(content)
-        page = pdf.get_page(page_number)
-        pil_image = page.render().to_pil()
-        return image_manipulation.save_image_to_buffer(
-            img=pil_image,
-            _format=output_extension,
-            _optimize=False,
-            _quality_value=ImageQualityEnum.HIGHEST.get_jpeg_int_quality(),
-            # the render is automatically done at the highest quality.
-            # The desired quality will be set while processing the image
-            # at the end of the api call because
-            # doing it here will just increase method parameters and complexity,
-            # without major performance improvements
-        )
+        with observe_stage(STAGE_PDF_RENDER), _pdfium_lock:
+            pdf = _open_pdf(content)
+            page = pdf.get_page(page_number)
+            scale = _get_render_scale(page.get_size(), requested_x, requested_y)
+            pil_image = page.render(scale=scale).to_pil()
+            page.close()
+            pdf.close()
+    except pypdfium2.PdfiumError as e:
+        log.info(f"Wrong pdf file passed, error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pdf file",
+        ) from e
+    log.debug(f"Pdf page rendered at scale {scale} with size {pil_image.size}")
+    return pil_image
+
+
+def count_pdf_pages(content: IO[bytes], log: logging.Logger = logger) -> int:
+    """
+    Counts the pages of the pdf using PDFium
+    \f
+    :param content: pdf to read
+    :param log: logger to use
+    :return: the number of pages of the pdf
+    :raises: HTTPException 400 if the pdf is not valid
+    """
+    try:
+        with _pdfium_lock:
+            pdf = _open_pdf(content)
+            number_of_pages = len(pdf)
+            pdf.close()
     except pypdfium2.PdfiumError as e:
         log.info(f"Wrong pdf file passed, error: {e}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid pdf file",
         ) from e
+    return number_of_pages
+
+
+def _get_render_scale(
+    page_size: Tuple[float, float],
+    requested_x: int,
+    requested_y: int,
+) -> float:
+    """
+    \f
+    :param page_size: width and height of the page in points (pixels at scale 1)
+    :param requested_x: width the page will be resized to, 0 if unknown
+    :param requested_y: height the page will be resized to, 0 if unknown
+    :return: the scale covering PDF_RENDER_REDUCING_GAP times
+     the requested size, at most 1
+    """
+    if requested_x == 0 or requested_y == 0:
+        return 1
+    width, height = page_size
+    cover_scale = max(
+        max(requested_x, IMAGE_MIN_RES) / width,
+        max(requested_y, IMAGE_MIN_RES) / height,
+    )
+    return min(1, cover_scale * PDF_RENDER_REDUCING_GAP)
 
 
 async def convert_pdf_to(
-    content: io.BytesIO,
+    content: IO[bytes],
     output_extension: str,
     first_page_number: int,
     last_page_number: int,
@@ -187,7 +360,8 @@ async def convert_pdf_to(
     :param last_page_number: last page to convert
     :param log: logger to use
     """
-    out_content: io.BytesIO = split_pdf(
+    out_content: io.BytesIO = await task_executor.run_cpu_bound(
+        split_pdf,
         content=content,
         first_page_number=first_page_number,
         last_page_number=last_page_number,
@@ -200,35 +374,65 @@ async def convert_pdf_to(
 
 
 async def _convert_with_libre(
-    content: io.BytesIO,
+    content: IO[bytes],
     output_extension: str,
     log: logging.Logger,
 ) -> io.BytesIO:
+    """
+    Sends the file to the docs-editor, waiting for a free slot of the
+    conversion limiter first. Conversion errors are raised, so that
+    a failed conversion is never returned, nor cached, as a rendition.
+    \f
+    :param content: file to convert
+    :param output_extension: extension to convert the file to
+    :param log: logger to use
+    :return: the converted file
+    :raises: HTTPException 503 if the docs-editor is too busy to wait for it,
+     502 if the docs-editor could not be reached or failed the conversion
+    """
     output_extension = _sanitize_output_extension(output_extension)
 
     url = f"{DOCUMENT_CONVERSION_FULL_CONVERT_ADDRESS}/{output_extension}"
 
     files = {"files": ("docs-editor-file", content)}
-    out_data = io.BytesIO()
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, timeout=DOCS_TIMEOUT, files=files)
-            response.raise_for_status()
-            out_data = io.BytesIO(response.content)
-    except httpx.HTTPStatusError as http_error:
-        log.debug(f"Http Error: {http_error}")
-    # from this onward are not related to the raise_for_status,
-    # these are all critical errors.
-    except httpx.ConnectTimeout as timeout_error:
-        log.error(f"Timeout Error: {timeout_error}")
-    except httpx.RequestError as request_error:
-        log.critical(f"Unexpected Error: {request_error}")
-    except Exception as crit_err:
-        log.critical(f"Critical Error: {crit_err}")
-
-    out_data.seek(0)
-    return out_data
+    async with conversion_limiter.conversion_limiter.limit():
+        with observe_stage(STAGE_DOCS_EDITOR_CONVERSION):
+            try:
+                response = await http_clients.get_docs_editor_client().post(
+                    url,
+                    timeout=DOCS_TIMEOUT,
+                    files=files,
+                )
+                response.raise_for_status()
+            except httpx.HTTPStatusError as http_error:
+                log.debug(f"Http Error: {http_error}")
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=message.RENDITION_FAILED,
+                ) from http_error
+            # from this onward are not related to the raise_for_status,
+            # these are all critical errors.
+            except httpx.ConnectTimeout as timeout_error:
+                log.error(f"Timeout Error: {timeout_error}")
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=message.DOCS_EDITOR_UNAVAILABLE_STRING,
+                ) from timeout_error
+            except httpx.RequestError as request_error:
+                log.critical(f"Unexpected Error: {request_error}")
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=message.DOCS_EDITOR_UNAVAILABLE_STRING,
+                ) from request_error
+
+    if not response.content:
+        log.error("The docs-editor returned an empty conversion")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=message.RENDITION_FAILED,
+        )
+    return io.BytesIO(response.content)
 
 
 def _sanitize_output_extension(output_extension: str) -> str:
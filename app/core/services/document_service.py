@@ -1,20 +1,23 @@
 # SPDX-FileCopyrightText: 2022 Zextras <https://www.zextras.com
 #
 # SPDX-License-Identifier: AGPL-3.0-only
+import functools
 import io
-from typing import TYPE_CHECKING
+from typing import IO
 
-from fastapi import UploadFile, status
+from fastapi import UploadFile
 from fastapi.responses import Response as FastApiResp
-from httpx import Response as RequestResp
 
-from app.core.resources.data_validator import check_for_storage_response_error
+from app.core.resources.app_config import DOCUMENT_THUMBNAIL_FROM_PDF
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.page_thumbnails_layout_enum import (
+    PageThumbnailsLayoutEnum,
+)
 from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
+from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
+from app.core.services import image_service, pdf_service
 from app.core.services.document_manipulation import document_manipulation
-from app.core.services.storage_communication import retrieve_data
-
-if TYPE_CHECKING:
-    from returns.maybe import Maybe
+from app.core.services.storage_communication import retrieve_and_process
 
 
 async def retrieve_doc_and_create_preview(
@@ -36,30 +39,24 @@ async def retrieve_doc_and_create_preview(
     :param service_type: service that owns the resource
     :return response: a Response with metadata or error message.
     """
-    response_data: Maybe[RequestResp] = await retrieve_data(
+
+    async def _convert(content: IO[bytes]) -> FastApiResp:
+        pdf_content: io.BytesIO = await document_manipulation.convert_to_pdf(
+            first_page_number=first_page_number,
+            last_page_number=last_page_number,
+            content=content,
+        )
+        return FastApiResp(
+            content=pdf_content.read(),
+            media_type="application/pdf",
+        )
+
+    return await retrieve_and_process(
         file_id=file_id,
         version=version,
         service_type=service_type,
-    )
-
-    response_error: Maybe[FastApiResp] = check_for_storage_response_error(
-        response_data=response_data,
-    )
-    return response_error.map(FastApiResp).value_or(
-        FastApiResp(
-            content=(
-                await document_manipulation.convert_to_pdf(
-                    first_page_number=first_page_number,
-                    last_page_number=last_page_number,
-                    content=io.BytesIO(
-                        response_data.value_or(
-                            RequestResp(status_code=status.HTTP_200_OK),
-                        ).content,
-                    ),
-                )
-            ).read(),
-            media_type="application/pdf",
-        ),
+        process=_convert,
+        calls_docs_editor=True,
     )
 
 
@@ -82,57 +79,187 @@ async def create_preview_from_raw(
     )
 
 
-async def create_thumbnail_from_raw(file: UploadFile, output_format: str) -> io.BytesIO:
+async def create_thumbnail_from_raw(
+    file: UploadFile,
+    img_metadata: ThumbnailImageMetadata,
+) -> io.BytesIO:
     """
     Create image thumbnail of a given file
     \f
     :param file: uploaded file to convert
-    :param output_format: the image type that the thumbnail will have
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :return: Raw bytes of the thumbnail
     """
-    return await document_manipulation.convert_file_to(
+    return await _convert_and_create_thumbnail(
         content=io.BytesIO(file.file.read()),
-        output_extension=output_format,
+        img_metadata=img_metadata,
     )
 
 
 async def retrieve_doc_and_create_thumbnail(
     file_id: str,
     version: int,
-    output_format: str,
+    img_metadata: ThumbnailImageMetadata,
     service_type: ServiceTypeEnum,
 ) -> FastApiResp:
     """
     Contact storage and retrieves the document
-     with the nodeid requested and converts it to image.
+     with the nodeid requested and converts its first page to a thumbnail.
     If the nodeid is not found returns Generic error specifying the error code
     \f
     :param file_id: UUID of the file
     :param version: version of the file
-    :param output_format: format
+    :param img_metadata: Instance of ThumbnailImageMetadata class
     :param service_type: service that owns the resource
     :return response: a Response with metadata or error message.
     """
-    response_data: Maybe[RequestResp] = await retrieve_data(
+
+    async def _convert(content: IO[bytes]) -> FastApiResp:
+        image_content: io.BytesIO = await _convert_and_create_thumbnail(
+            content=content,
+            img_metadata=img_metadata,
+        )
+        return FastApiResp(
+            content=image_content.read(),
+            media_type=f"image/{img_metadata.format.value}",
+        )
+
+    return await retrieve_and_process(
         file_id=file_id,
         version=version,
         service_type=service_type,
+        process=_convert,
+        calls_docs_editor=True,
     )
 
-    response_error: Maybe[FastApiResp] = check_for_storage_response_error(
-        response_data=response_data,
+
+async def create_page_thumbnails_from_raw(
+    file: UploadFile,
+    first_page_number: int,
+    last_page_number: int,
+    img_metadata: ThumbnailImageMetadata,
+    layout: PageThumbnailsLayoutEnum,
+) -> FastApiResp:
+    """
+    Create the thumbnails of a range of pages of a given file,
+    converting it to pdf first
+    \f
+    :param file: uploaded file to convert
+    :param first_page_number: first page to convert
+    :param last_page_number: last page to convert, 0 for the last of the file
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param layout: whether to return a thumbnail for each page or a contact sheet
+    :return: multipart response with a thumbnail for each page or the contact sheet
+    """
+    return await _convert_and_create_page_thumbnails(
+        content=io.BytesIO(file.file.read()),
+        first_page_number=first_page_number,
+        last_page_number=last_page_number,
+        img_metadata=img_metadata,
+        layout=layout,
     )
-    return response_error.map(FastApiResp).value_or(
-        FastApiResp(
-            content=(
-                await document_manipulation.convert_file_to(
-                    content=io.BytesIO(
-                        response_data.value_or(
-                            RequestResp(status_code=status.HTTP_200_OK),
-                        ).content,
-                    ),
-                    output_extension=output_format,
-                )
-            ).read(),
-            media_type=f"image/{output_format}",
+
+
+async def retrieve_doc_and_create_page_thumbnails(
+    file_id: str,
+    version: int,
+    first_page_number: int,
+    last_page_number: int,
+    img_metadata: ThumbnailImageMetadata,
+    layout: PageThumbnailsLayoutEnum,
+    service_type: ServiceTypeEnum,
+) -> FastApiResp:
+    """
+    Contact storage and retrieves the document with the nodeid requested,
+    converts it to pdf and a range of its pages to thumbnails.
+    If the nodeid is not found returns Generic error specifying the error code
+    \f
+    :param file_id: UUID of the file
+    :param version: version of the file
+    :param first_page_number: first page to convert
+    :param last_page_number: last page to convert, 0 for the last of the file
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param layout: whether to return a thumbnail for each page or a contact sheet
+    :param service_type: service that owns the resource
+    :return response: a Response with the thumbnails or error message.
+    """
+    return await retrieve_and_process(
+        file_id=file_id,
+        version=version,
+        service_type=service_type,
+        process=functools.partial(
+            _convert_and_create_page_thumbnails,
+            first_page_number=first_page_number,
+            last_page_number=last_page_number,
+            img_metadata=img_metadata,
+            layout=layout,
         ),
+        calls_docs_editor=True,
+    )
+
+
+async def _convert_and_create_thumbnail(
+    content: IO[bytes],
+    img_metadata: ThumbnailImageMetadata,
+) -> io.BytesIO:
+    """
+    Creates the thumbnail of the first page of the document.
+    When DOCUMENT_THUMBNAIL_FROM_PDF is enabled the document is converted
+    to pdf, reusing the conversion of the previews kept in the conversion
+    cache, and its first page is rendered with PDFium at the scale of the
+    thumbnail, otherwise the docs-editor converts it to a full size image
+    which is then resized. WebP thumbnails are resized from a PNG image,
+    as not every docs-editor version can export WebP.
+    \f
+    :param content: document to convert
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :return: Raw bytes of the thumbnail
+    """
+    if DOCUMENT_THUMBNAIL_FROM_PDF:
+        return await pdf_service.create_thumbnail(
+            content=await document_manipulation.convert_file_to(
+                content=content,
+                output_extension="pdf",
+            ),
+            img_metadata=img_metadata,
+        )
+    return await image_service.process_raw_thumbnail(
+        raw_content=await document_manipulation.convert_file_to(
+            content=content,
+            output_extension=(
+                ImageTypeEnum.PNG.value
+                if img_metadata.format == ImageTypeEnum.WEBP
+                else img_metadata.format.value
+            ),
+        ),
+        img_metadata=img_metadata,
+    )
+
+
+async def _convert_and_create_page_thumbnails(
+    content: IO[bytes],
+    first_page_number: int,
+    last_page_number: int,
+    img_metadata: ThumbnailImageMetadata,
+    layout: PageThumbnailsLayoutEnum,
+) -> FastApiResp:
+    """
+    Converts the document to pdf and renders the thumbnails of its pages
+    \f
+    :param content: document to convert
+    :param first_page_number: first page to convert
+    :param last_page_number: last page to convert, 0 for the last of the file
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param layout: whether to return a thumbnail for each page or a contact sheet
+    :return: multipart response with a thumbnail for each page or the contact sheet
+    """
+    return await pdf_service.create_page_thumbnails(
+        content=await document_manipulation.convert_file_to(
+            content=content,
+            output_extension="pdf",
+        ),
+        first_page_number=first_page_number,
+        last_page_number=last_page_number,
+        img_metadata=img_metadata,
+        layout=layout,
     )
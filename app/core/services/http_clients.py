@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import logging
+from typing import Callable, Dict, Tuple
+
+import httpx
+
+from app.core.resources.app_config import (
+    DOCS_TIMEOUT,
+    DOCUMENT_CONVERSION_KEEPALIVE_EXPIRY,
+    DOCUMENT_CONVERSION_MAX_CONNECTIONS,
+    DOCUMENT_CONVERSION_MAX_KEEPALIVE_CONNECTIONS,
+    STORAGE_KEEPALIVE_EXPIRY,
+    STORAGE_MAX_CONNECTIONS,
+    STORAGE_MAX_KEEPALIVE_CONNECTIONS,
+    STORAGE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+STORAGE_CLIENT: str = "storage"
+DOCS_EDITOR_CLIENT: str = "docs-editor"
+
+# clients are bound to the event loop that created them,
+# so each one is stored along with its loop
+_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+
+def _create_storage_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=STORAGE_MAX_CONNECTIONS,
+            max_keepalive_connections=STORAGE_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=STORAGE_KEEPALIVE_EXPIRY,
+        ),
+        timeout=STORAGE_TIMEOUT,
+    )
+
+
+def _create_docs_editor_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=DOCUMENT_CONVERSION_MAX_CONNECTIONS,
+            max_keepalive_connections=DOCUMENT_CONVERSION_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=DOCUMENT_CONVERSION_KEEPALIVE_EXPIRY,
+        ),
+        timeout=DOCS_TIMEOUT,
+    )
+
+
+_client_factories: Dict[str, Callable[[], httpx.AsyncClient]] = {
+    STORAGE_CLIENT: _create_storage_client,
+    DOCS_EDITOR_CLIENT: _create_docs_editor_client,
+}
+
+
+def _get_client(name: str) -> httpx.AsyncClient:
+    """
+    Returns the client of the given upstream, creating it if it is missing,
+    closed or created by another event loop
+    \f
+    :param name: name of the upstream
+    :return: the client with its connection pool
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(name)
+    if entry is None or entry[0] is not loop or entry[1].is_closed:
+        entry = (loop, _client_factories[name]())
+        _clients[name] = entry
+        logger.debug(f"Created http client for {name}")
+    return entry[1]
+
+
+def get_storage_client() -> httpx.AsyncClient:
+    """
+    \f
+    :return: the client used for every request to the storage
+    """
+    return _get_client(STORAGE_CLIENT)
+
+
+def get_docs_editor_client() -> httpx.AsyncClient:
+    """
+    \f
+    :return: the client used for every request to the docs-editor
+    """
+    return _get_client(DOCS_EDITOR_CLIENT)
+
+
+def open_clients() -> None:
+    """
+    Creates the clients of every upstream, must be called from the event loop
+    that will use them
+    """
+    for name in _client_factories:
+        _get_client(name)
+
+
+async def close_clients() -> None:
+    """
+    Closes the clients of every upstream along with their open connections
+    """
+    for name in list(_clients):
+        _, client = _clients.pop(name)
+        await client.aclose()
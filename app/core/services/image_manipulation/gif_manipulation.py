@@ -4,7 +4,7 @@
 
 import io
 import logging
-from typing import TYPE_CHECKING
+from typing import IO, TYPE_CHECKING
 
 from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
 from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
@@ -32,7 +32,7 @@ def gif_preview(
     _y: int,
     _quality: ImageQualityEnum,
     _crop: bool,
-    content: io.BytesIO,
+    content: IO[bytes],
     crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
 ) -> io.BytesIO:
     """
@@ -54,9 +54,15 @@ def gif_preview(
             requested_x=_x,
             requested_y=_y,
             crop_position=crop_position,
+            resample=_quality.get_resample_filter(),
         )
     else:
-        gif = resize_with_paddings(img=gif, requested_x=_x, requested_y=_y)
+        gif = resize_with_paddings(
+            img=gif,
+            requested_x=_x,
+            requested_y=_y,
+            resample=_quality.get_resample_filter(),
+        )
 
     output: io.BytesIO = save_image_to_buffer(
         img=gif,
@@ -72,7 +78,7 @@ def gif_thumbnail(
     _y: int,
     border: ImageBorderShapeEnum,
     _quality: ImageQualityEnum,
-    content: io.BytesIO,
+    content: IO[bytes],
     crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
 ) -> io.BytesIO:
     """
@@ -93,6 +99,7 @@ def gif_thumbnail(
         requested_x=_x,
         requested_y=_y,
         crop_position=crop_position,
+        resample=_quality.get_resample_filter(),
     )
     if border == ImageBorderShapeEnum.ROUNDED:
         gif = add_circle_margins_to_gif(gif)
@@ -4,10 +4,25 @@
 
 import io
 import logging
-from typing import Any, Generator, List, Tuple
+import time
+from typing import IO, Any, Callable, Dict, Generator, List, Optional, Tuple, Union
 
 from PIL import GifImagePlugin, Image, ImageDraw, ImageOps, ImageSequence
 
+from app.core.resources.constants.image.constants import RESIZE_REDUCING_GAP
+from app.core.resources.constants.image.quality import RESAMPLE_DEFAULT
+from app.core.services.image_manipulation.image_probe import (
+    check_image_limits,
+    probe_image,
+)
+from app.core.services.metrics import (
+    STAGE_DECODE,
+    STAGE_ENCODE,
+    STAGE_MASK,
+    STAGE_TRANSFORM,
+    observe_stage_duration,
+)
+
 GifImagePlugin.LOADING_STRATEGY = GifImagePlugin.LoadingStrategy.RGB_ALWAYS
 
 logger: logging.Logger = logging.getLogger(__name__)
@@ -29,7 +44,7 @@ def is_img_a_gif(img: Image.Image) -> bool:
 
 
 def parse_to_valid_gif(
-    content: io.BytesIO,
+    content: IO[bytes],
     log: logging.Logger = logger,
 ) -> GifImagePlugin.GifImageFile:
     """
@@ -43,10 +58,13 @@ def parse_to_valid_gif(
     :param log: logger to use
     :returns: an instance of GifImageFile containing the gif, if the image was not
     valid it will be replaced by an empty gif
+    :raises: HTTPException 413 if the gif has too many pixels in all its frames,
+     checked from the headers of the frames before decoding them
     """
     try:
         gif = GifImagePlugin.GifImageFile(content)
         if gif.is_animated:
+            check_image_limits(probe_image(gif, animated=True))
             return gif
         log.debug("File could be loaded as a GIF but it's not animated")
     except SyntaxError as e:
@@ -60,37 +78,133 @@ def parse_to_valid_gif(
     raise ValueError(msg)
 
 
-def _get_generator_from_gif(gif: Image.Image) -> Generator[Image.Image, Any, None]:
+class GifFramePipeline:
+    """
+    Lazy representation of an animated GIF being transformed.
+    It keeps the source GIF and the operations (resize, crop, paste, mask)
+    to apply to each frame, with the stage they belong to: nothing is decoded
+    or encoded when an operation is added, all of them are applied frame by
+    frame in a single pass when the frames are finally iterated
+    by save_gif_to_buffer.
+    It exposes size, info and is_animated like a Pillow GIF.
+    """
+
+    is_animated: bool = True
+
+    def __init__(
+        self: "GifFramePipeline",
+        source: Image.Image,
+        size: Optional[Tuple[int, int]] = None,
+        operations: Tuple[Tuple[str, Callable[[Image.Image], Image.Image]], ...] = (),
+    ) -> None:
+        """
+        \f
+        :param source: the GIF to read the frames from
+        :param size: size of the frames after all the operations
+        :param operations: stage and operation to apply in order to every frame
+        """
+        self.source: Image.Image = source
+        self.size: Tuple[int, int] = size if size is not None else source.size
+        self.info: dict = source.info
+        self.operations: Tuple[
+            Tuple[str, Callable[[Image.Image], Image.Image]],
+            ...,
+        ] = operations
+
+    def then(
+        self: "GifFramePipeline",
+        operation: Callable[[Image.Image], Image.Image],
+        size: Tuple[int, int],
+        stage: str = STAGE_TRANSFORM,
+    ) -> "GifFramePipeline":
+        """
+        Returns a new pipeline that applies the given operation
+        after the ones already in this pipeline
+        \f
+        :param operation: function that returns a new frame given a frame,
+         it must not modify the given frame
+        :param size: size of the frames returned by the operation
+        :param stage: stage the time spent in the operation is counted in
+        :returns: the new pipeline
+        """
+        return GifFramePipeline(
+            source=self.source,
+            size=size,
+            operations=(*self.operations, (stage, operation)),
+        )
+
+    def frames(
+        self: "GifFramePipeline",
+        timings: Optional[Dict[str, float]] = None,
+    ) -> Generator[Image.Image, Any, None]:
+        """
+        Decodes the source one frame at a time, applying every operation to it
+        \f
+        :param timings: if given, the seconds spent decoding the frames and
+         in each stage of the operations are added to it
+        :returns: Generator with each instance corresponding to a transformed frame
+        """
+        timings = timings if timings is not None else {}
+        for frame in ImageSequence.Iterator(self.source):
+            start = time.perf_counter()
+            frame.load()
+            _add_elapsed_time(timings, STAGE_DECODE, start)
+            # the iterator always returns the source seeked to the next frame,
+            # every operation returns a new frame so only the bare source is copied
+            transformed: Image.Image = frame if self.operations else frame.copy()
+            for stage, operation in self.operations:
+                start = time.perf_counter()
+                transformed = operation(transformed)
+                _add_elapsed_time(timings, stage, start)
+            yield transformed
+
+
+def _add_elapsed_time(timings: Dict[str, float], stage: str, start: float) -> None:
+    timings[stage] = timings.get(stage, 0) + time.perf_counter() - start
+
+
+def _as_pipeline(gif: Union[Image.Image, GifFramePipeline]) -> GifFramePipeline:
     """
-    Given an image it creates a generator, each iteration
-    returns an Image object representing each frame of the gif
+    Returns the given pipeline, or a new pipeline with no operations
+    reading the frames of the given gif
     \f
-    :param gif: gif to iterate over
-    :returns: Generator with each instance corresponding to a Image (current frame)
+    :param gif: gif or gif pipeline
+    :returns: the gif pipeline
     """
-    for frame in ImageSequence.Iterator(gif):
-        thumbnail: Image.Image = frame.copy()
-        yield thumbnail
+    return gif if isinstance(gif, GifFramePipeline) else GifFramePipeline(gif)
 
 
 def save_gif_to_buffer(
-    gif: Image.Image,
+    gif: Union[Image.Image, GifFramePipeline],
     out_buffer: io.BytesIO,
     quality: int,
 ) -> io.BytesIO:
     """
-    Save a gif to the given buffer and returns the given buffer as well
-    :param gif: gif to "render" in the buffer
+    Save a gif to the given buffer and returns the given buffer as well.
+    This is the only point in which the frames are decoded, transformed and encoded.
+    The frames are transformed while they are encoded: the time spent in
+    each stage is accumulated across the frames and observed once,
+    the remaining time is the encode.
+    :param gif: gif or gif pipeline to "render" in the buffer
     :param out_buffer: bytes buffer in which the gif will be saved in
     :param quality: quality value for the gif render
     :returns: bytes buffer containing the rendered gif
     """
-    return _save_gif_generator_to_buffer(
-        _get_generator_from_gif(gif),
-        out_buffer,
-        gif.info,
-        quality,
-    )
+    pipeline = _as_pipeline(gif)
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    try:
+        return _save_gif_generator_to_buffer(
+            pipeline.frames(timings),
+            out_buffer,
+            pipeline.info,
+            quality,
+        )
+    finally:
+        elapsed = time.perf_counter() - start
+        for stage, duration in timings.items():
+            observe_stage_duration(stage, duration)
+        observe_stage_duration(STAGE_ENCODE, elapsed - sum(timings.values()))
 
 
 def _save_gif_generator_to_buffer(
@@ -114,7 +228,7 @@ def _save_gif_generator_to_buffer(
         format="GIF",
         save_all=True,
         quality=quality,
-        append_images=list(frames),
+        append_images=frames,
     )
     return out_buffer
 
@@ -148,137 +262,86 @@ def __save_img_list_as_gif_to_buffer_deprecated(
     return out_buff
 
 
-def _resize_gif_frame_by_frame(
-    gif: Image.Image,
+def resize_gif(
+    gif: Union[Image.Image, GifFramePipeline],
     size: Tuple[int, int],
-) -> Generator[Image.Image, Any, None]:
-    """
-    Each frame of the gif will be resized frame by frame
-    :param gif: gif to resize
-    :param size: desired size of all the frames
-    :returns: each frame one at a time resized
-    """
-    # Get sequence iterator
-    for frame in ImageSequence.Iterator(gif):
-        # resize does not do side effect on thumbnail, returns a new image
-        yield frame.resize(size)
-
-
-def _crop_gif_frame_by_frame(
-    gif: Image.Image,
-    box: Tuple[int, int, int, int],
-) -> Generator[Image.Image, Any, None]:
-    """
-    Each frame of the gif will be cropped frame by frame
-    :param gif: gif to crop
-    :param box: desired crop of all the frames
-    :returns: each frame one at a time cropped
-    """
-    # Get sequence iterator
-    for frame in ImageSequence.Iterator(gif):
-        # crop does not do side effect on thumbnail, returns a new image
-        yield frame.crop(box)
-
-
-def _paste_gif_frame_by_frame(
-    static_background: Image.Image,
-    gif: Image.Image,
-    paste_coordinates_box: Tuple[int, int],
-) -> Generator[Image.Image, Any, None]:
-    """
-    Each frame of the gif will be pasted in the static background
-    :param static_background: it will be used as background for every frame
-    :param gif: gif to paste
-    :param paste_coordinates_box: desired paste coordinates of all the frames
-    :returns: a new gif, in which every frame contains the given background
-    with the old image pasted on top of it
-    """
-    # Get sequence iterator
-    for frame in ImageSequence.Iterator(gif):
-        thumbnail: Image.Image = frame.copy()
-        static_background.paste(thumbnail, paste_coordinates_box)
-        yield thumbnail
-
-
-def _mask_gif_frame_by_frame(
-    mask: Image.Image,
-    gif: Image.Image,
-) -> Generator[Image.Image, Any, None]:
+    resample: Image.Resampling = RESAMPLE_DEFAULT,
+) -> GifFramePipeline:
     """
-    Each frame of the gif will be masked with the given mask
-    :param mask: Image used to mask
-    :param gif: gif to resize
-    :returns: each frame one at a time masked
-    """
-    for frame in ImageSequence.Iterator(gif):
-        modified_frame: Image.Image = ImageOps.fit(
-            frame,
-            mask.size,
-            centering=(0.5, 0.5),
-        )
-        modified_frame.paste(0, mask=mask)
-        yield modified_frame
-
-
-def resize_gif(gif: Image.Image, size: Tuple[int, int]) -> Image.Image:
-    """
-    Resizes every frame of the GIF and then returns
-    a PIL.GifImagePlugin.GifImageFile object
+    Adds the resize of every frame of the GIF to the pipeline,
+    each frame is reduced like the static images before being resampled
     :param gif: gif to resize
     :param size: desired size of the gif
-    :returns: resized gif as a GifImageFile object (inherits from Image)
+    :param resample: filter of the final resample of every frame
+    :returns: the pipeline with the resize operation
     """
-    frames = _resize_gif_frame_by_frame(gif=gif, size=size)
-    return Image.open(_save_gif_generator_to_buffer(frames, io.BytesIO(), gif.info))
+    return _as_pipeline(gif).then(
+        lambda frame: frame.resize(
+            size,
+            resample=resample,
+            reducing_gap=RESIZE_REDUCING_GAP,
+        ),
+        size,
+    )
 
 
-def crop_gif(gif: Image.Image, box: Tuple[int, int, int, int]) -> Image.Image:
+def crop_gif(
+    gif: Union[Image.Image, GifFramePipeline],
+    box: Tuple[int, int, int, int],
+) -> GifFramePipeline:
     """
-    Crops every frame of the GIF and then returns a
-     PIL.GifImagePlugin.GifImageFile object
+    Adds the crop of every frame of the GIF to the pipeline
     :param gif: gif to crop
     :param box: desired box crop of the gif
-    :returns: cropped gif as a GifImageFile object (inherits from Image)
+    :returns: the pipeline with the crop operation
     """
-    frames = _crop_gif_frame_by_frame(gif=gif, box=box)
-    return Image.open(_save_gif_generator_to_buffer(frames, io.BytesIO(), gif.info))
+    left, upper, right, lower = box
+    return _as_pipeline(gif).then(
+        lambda frame: frame.crop(box),
+        (right - left, lower - upper),
+    )
 
 
 def paste_gif(
     static_background: Image.Image,
-    gif: Image.Image,
+    gif: Union[Image.Image, GifFramePipeline],
     paste_coordinates_box: Tuple[int, int],
-) -> Image.Image:
+) -> GifFramePipeline:
     """
-    Paste every frame of the GIF and then returns
-     a PIL.GifImagePlugin.GifImageFile object
+    Adds to the pipeline the paste of every frame of the GIF
+     on a copy of the given background
     :param static_background: the background that will be the base of every frame
     :param gif: gif to paste over the background
     :param paste_coordinates_box: desired paste coordinates
-    :returns: gif with new background as a GifImageFile object (inherits from Image)
+    :returns: the pipeline with the paste operation
     """
-    frames = _paste_gif_frame_by_frame(static_background, gif, paste_coordinates_box)
-    return Image.open(_save_gif_generator_to_buffer(frames, io.BytesIO(), gif.info))
 
+    def _paste_on_background(frame: Image.Image) -> Image.Image:
+        background: Image.Image = static_background.copy()
+        background.paste(frame, paste_coordinates_box)
+        background.info = frame.info
+        return background
 
-def add_circle_margins_to_gif(gif: Image.Image) -> Image.Image:
+    return _as_pipeline(gif).then(_paste_on_background, static_background.size)
+
+
+def add_circle_margins_to_gif(
+    gif: Union[Image.Image, GifFramePipeline],
+) -> GifFramePipeline:
     """
-    Adds circle margins to every frame of the gif and then
-     returns a PIL.GifImagePlugin.GifImageFile object
+    Adds to the pipeline the circle margins of every frame of the gif
     \f
     :param gif: gif to add circles to
-    :return: modified gif as a GifImageFile object (inherits from Image)
+    :return: the pipeline with the mask operation
     """
     size = gif.size
     mask = Image.new("L", size, 255)
     draw = ImageDraw.Draw(mask)
     draw.ellipse((0, 0, *size), fill=0)
 
-    return Image.open(
-        _save_gif_generator_to_buffer(
-            _mask_gif_frame_by_frame(mask, gif),
-            io.BytesIO(),
-            gif_info=gif.info,
-            quality=60,
-        ),
-    )
+    def _mask_frame(frame: Image.Image) -> Image.Image:
+        masked_frame: Image.Image = ImageOps.fit(frame, mask.size, centering=(0.5, 0.5))
+        masked_frame.paste(0, mask=mask)
+        return masked_frame
+
+    return _as_pipeline(gif).then(_mask_frame, size, stage=STAGE_MASK)
@@ -4,12 +4,27 @@
 
 import io
 import logging
-from typing import List, Tuple
+import math
+from typing import IO, List, Optional, Tuple, cast
 
 import PIL
+from fastapi import HTTPException, status
 from PIL import Image, ImageDraw, ImageFilter, ImageOps
 
-from app.core.resources.app_config import IMAGE_MIN_RES
+from app.core.resources.app_config import IMAGE_MAX_OUTPUT_PIXELS, IMAGE_MIN_RES
+from app.core.resources.constants import message
+from app.core.resources.constants.image.constants import (
+    INTERMEDIATE_REDUCIBLE_MODES,
+    INTERMEDIATE_REDUCING_GAP,
+    JPEG_DRAFT_REDUCING_GAP,
+    RESIZE_REDUCING_GAP,
+)
+from app.core.resources.constants.image.quality import (
+    RESAMPLE_DEFAULT,
+    WEBP_METHOD,
+    JpegEncoderProfile,
+)
+from app.core.resources.data_validator import check_output_area
 from app.core.resources.schemas.enums.vertical_crop_position_enum import (
     VerticalCropPositionEnum,
 )
@@ -20,15 +35,24 @@ from app.core.services.image_manipulation.gif_utility_functions import (
     resize_gif,
     save_gif_to_buffer,
 )
+from app.core.services.image_manipulation.image_probe import (
+    check_image_limits,
+    probe_image,
+)
+from app.core.services.metrics import STAGE_DECODE, STAGE_ENCODE, observe_stage
 
 logger = logging.getLogger(__name__)
 
+# ICC color space signatures of the modes an image can be saved in as JPEG
+_ICC_COLOR_SPACES = {"RGB": b"RGB ", "L": b"GRAY", "CMYK": b"CMYK"}
+
 
 def save_image_to_buffer(
     img: Image.Image,
     _format: str = "JPEG",
     _optimize: bool = False,
     _quality_value: int = 0,
+    _jpeg_profile: Optional[JpegEncoderProfile] = None,
     log: logging.Logger = logger,
 ) -> io.BytesIO:
     """
@@ -40,31 +64,98 @@ def save_image_to_buffer(
     :param _format: format to save to
     :param _optimize: optimize the image or not (does not change quality)
     :param _quality_value: 0-95 quality value with 0 lowest 95 highest
+     (0-100 for WEBP)
+    :param _jpeg_profile: settings of the JPEG encoder, when given
+     they replace _optimize and _quality_value
     :param log: log to use, if missing it will use default class logger
     :return: buffer pointing at the start of the file, containing raw image
     """
     buffer = io.BytesIO()
     if _format == "GIF":
+        # the frames are transformed while they are encoded,
+        # save_gif_to_buffer observes the time of each stage
         save_gif_to_buffer(gif=img, out_buffer=buffer, quality=_quality_value)
         log.debug("PIL GIF successfully saved to buffer.")
     else:
-        img = ImageOps.exif_transpose(img)
-        img.save(buffer, format=_format, optimize=_optimize, quality=_quality_value)
-        log.debug("PIL Image successfully saved to buffer.")
+        with observe_stage(STAGE_ENCODE):
+            if _format == "WEBP":
+                img = ImageOps.exif_transpose(img)
+                img.save(
+                    buffer,
+                    format=_format,
+                    quality=_quality_value,
+                    method=WEBP_METHOD,
+                )
+                log.debug("PIL WebP successfully saved to buffer.")
+            elif _format == "JPEG" and _jpeg_profile is not None:
+                img = ImageOps.exif_transpose(img)
+                img.save(
+                    buffer,
+                    format=_format,
+                    quality=_jpeg_profile.quality,
+                    subsampling=_jpeg_profile.subsampling,
+                    progressive=_jpeg_profile.progressive,
+                    optimize=_jpeg_profile.optimize,
+                    icc_profile=(
+                        _get_matching_icc_profile(img)
+                        if _jpeg_profile.keep_icc_profile
+                        else None
+                    ),
+                )
+                log.debug("PIL JPEG successfully saved to buffer.")
+            else:
+                img = ImageOps.exif_transpose(img)
+                img.save(
+                    buffer,
+                    format=_format,
+                    optimize=_optimize,
+                    quality=_quality_value,
+                )
+                log.debug("PIL Image successfully saved to buffer.")
     buffer.seek(0)
 
     return buffer
 
 
-def _resize_image_given_size(img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+def _get_matching_icc_profile(img: Image.Image) -> Optional[bytes]:
+    """
+    Returns the ICC profile of the image if it describes its mode. The profile
+    is copied when an image is converted, so a CMYK profile could be attached
+    to an image that is now RGB, and saving it would distort the colors.
+    \f
+    :param img: image to save
+    :return: the ICC profile or None if it is missing or of another color space
+    """
+    icc_profile = img.info.get("icc_profile")
+    if icc_profile and icc_profile[16:20] == _ICC_COLOR_SPACES.get(img.mode):
+        return icc_profile
+    return None
+
+
+def _resize_image_given_size(
+    img: Image.Image,
+    size: Tuple[int, int],
+    resample: Image.Resampling = RESAMPLE_DEFAULT,
+) -> Image.Image:
     """
     This function must be used instead of the basic Pillow function
-    It handles the gif images as well (pillow does not by default)
+    It handles the gif images as well (pillow does not by default):
+    gifs are not resized here, the resize is added to their frame pipeline.
+    Images are first reduced by an integer factor down to RESIZE_REDUCING_GAP
+    times the given size, then resampled with the given filter.
+    \f
+    :param img: image to resize
+    :param size: size of the resized image
+    :param resample: filter of the final resample
+    :return: the resized image
     """
     if is_img_a_gif(img):
-        return resize_gif(gif=img, size=size)
+        return cast(Image.Image, resize_gif(gif=img, size=size, resample=resample))
 
-    return img.resize(size)
+    if img.mode not in INTERMEDIATE_REDUCIBLE_MODES:
+        # Pillow default filter: palette and 16 bit images support only the nearest
+        return img.resize(size)
+    return img.resize(size, resample=resample, reducing_gap=RESIZE_REDUCING_GAP)
 
 
 def _crop_image_given_box(
@@ -79,7 +170,7 @@ def _crop_image_given_box(
     :returns: the cropped image/gif
     """
     if is_img_a_gif(img):
-        return crop_gif(gif=img, box=box)
+        return cast(Image.Image, crop_gif(gif=img, box=box))
 
     return img.crop(box)
 
@@ -98,10 +189,13 @@ def _paste_image_into_given_background_using_box(
     :returns: image/gif with changed background
     """
     if is_img_a_gif(img):
-        return paste_gif(
-            static_background=background_img,
-            gif=img,
-            paste_coordinates_box=paste_coordinates_box,
+        return cast(
+            Image.Image,
+            paste_gif(
+                static_background=background_img,
+                gif=img,
+                paste_coordinates_box=paste_coordinates_box,
+            ),
         )
 
     background_img.paste(img, paste_coordinates_box)
@@ -366,20 +460,151 @@ def _convert_requested_size_to_true_res_to_scale(
     return requested_x, requested_y
 
 
-def parse_to_valid_image(content: io.BytesIO) -> Image.Image:
+def _draft_to_requested_size(
+    img: Image.Image,
+    requested_x: int,
+    requested_y: int,
+    log: logging.Logger = logger,
+) -> None:
+    """
+    Configures the JPEG decoder to decode the image at a reduced scale
+    (1/2, 1/4 or 1/8) when the requested size is much smaller than the original,
+    skipping most of the decoding work. It must be called before the image is loaded.
+    The drafted image is kept at least JPEG_DRAFT_REDUCING_GAP times bigger
+    than the requested size on both axes, regardless of the EXIF orientation,
+    so the following resize outputs an image with the same size and quality.
+    Nothing is done if the image is not a JPEG or if the original size was requested.
+    \f
+    :param img: image opened but not yet loaded
+    :param requested_x: width the image will be resized to
+    :param requested_y: height the image will be resized to
+    :param log: log to use, if missing it will use default class logger
+    """
+    if img.format != "JPEG" or requested_x == 0 or requested_y == 0:
+        return
+
+    min_side = max(requested_x, requested_y, IMAGE_MIN_RES) * JPEG_DRAFT_REDUCING_GAP
+    original_size = img.size
+    img.draft(img.mode, (min_side, min_side))
+    log.debug(f"JPEG drafted from {original_size} to {img.size}")
+
+
+def parse_to_valid_image(
+    content: IO[bytes],
+    requested_x: int = 0,
+    requested_y: int = 0,
+) -> Image.Image:
     """
     Parses an image into a valid Pil Image rotating it according to EXIF metadata,
-    if the image is empty returns empty MinxMin RGB image
+    if the image is empty returns empty MinxMin RGB image.
+    If the requested size is given, JPEG images much bigger than it
+    are decoded directly at a reduced scale.
+    The size of the image is checked from its header before decoding it.
     \f
     :param content: Image to parse
+    :param requested_x: width the image will be resized to, 0 if unknown
+    :param requested_y: height the image will be resized to, 0 if unknown
     :return parsed image or new empty image
+    :raises: HTTPException 413 if the image has too many pixels
     """
     try:
-        img = Image.open(content)
-        return ImageOps.exif_transpose(img)
+        with observe_stage(STAGE_DECODE):
+            img = Image.open(content)
+            check_image_limits(probe_image(img))
+            _draft_to_requested_size(img, requested_x, requested_y)
+            # decoded here rather than by the first transformation,
+            # so that the decode stage is measured on its own
+            img.load()
+            return ImageOps.exif_transpose(img)
     except PIL.UnidentifiedImageError as e:
         logger.debug(f"Invalid or empty image caused error: {e}")
         return Image.new("RGB", (IMAGE_MIN_RES, IMAGE_MIN_RES))
+    except Image.DecompressionBombError as e:
+        # raised by Pillow while opening images much bigger than the limits
+        logger.info(f"Image rejected before decoding it: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=message.IMAGE_TOO_LARGE,
+        ) from None
+
+
+def reduce_to_requested_size(
+    img: Image.Image,
+    requested_x: int,
+    requested_y: int,
+    log: logging.Logger = logger,
+) -> Image.Image:
+    """
+    Reduces the image by the biggest integer factor that keeps it
+    at least INTERMEDIATE_REDUCING_GAP times bigger than the size it will be
+    resized to on both axes, so it can be used as an intermediate for
+    resize_with_crop_and_paddings and resize_with_paddings without changing
+    the size of their output and with no visible loss of quality.
+    Reducing with a box filter is much cheaper than resizing, and each
+    following resize works on fewer pixels.
+    The image is returned as is when it can't be reduced, when it is a gif
+    or when the original size was requested.
+    \f
+    :param img: image to reduce, it is not modified
+    :param requested_x: width the image will be resized to
+    :param requested_y: height the image will be resized to
+    :param log: log to use, if missing it will use default class logger
+    :return: the reduced image or the given image
+    """
+    if (
+        requested_x == 0
+        or requested_y == 0
+        or img.mode not in INTERMEDIATE_REDUCIBLE_MODES
+        or is_img_a_gif(img)
+    ):
+        return img
+
+    original_width, original_height = img.size
+    min_width, min_height = _get_min_intermediate_size(img, requested_x, requested_y)
+    factor = min(original_width // min_width, original_height // min_height)
+    if factor <= 1:
+        return img
+
+    reduced = img.reduce(factor)
+    log.debug(f"Image reduced from {img.size} to {reduced.size}")
+    return reduced
+
+
+def is_valid_intermediate(
+    img: Image.Image,
+    requested_x: int,
+    requested_y: int,
+) -> bool:
+    """
+    Checks that an image reduced by reduce_to_requested_size for another
+    size can also be the intermediate of the given size: it must still be
+    INTERMEDIATE_REDUCING_GAP times bigger than it on both axes
+    \f
+    :param img: intermediate image
+    :param requested_x: width the image will be resized to, not 0
+    :param requested_y: height the image will be resized to, not 0
+    :return: True if the image can be resized to the given size
+     with no visible loss of quality
+    """
+    min_width, min_height = _get_min_intermediate_size(img, requested_x, requested_y)
+    return img.width >= min_width and img.height >= min_height
+
+
+def _get_min_intermediate_size(
+    img: Image.Image,
+    requested_x: int,
+    requested_y: int,
+) -> Tuple[int, int]:
+    to_scale_x, to_scale_y = _convert_requested_size_to_true_res_to_scale(
+        requested_x=requested_x,
+        requested_y=requested_y,
+        original_width=img.width,
+        original_height=img.height,
+    )
+    return (
+        to_scale_x * INTERMEDIATE_REDUCING_GAP,
+        to_scale_y * INTERMEDIATE_REDUCING_GAP,
+    )
 
 
 def resize_with_crop_and_paddings(
@@ -387,6 +612,7 @@ def resize_with_crop_and_paddings(
     requested_x: int,
     requested_y: int,
     crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+    resample: Image.Resampling = RESAMPLE_DEFAULT,
 ) -> Image.Image:
     """
     Resize the image and crop it if necessary
@@ -395,7 +621,9 @@ def resize_with_crop_and_paddings(
     :param requested_x: width to resize to
     :param requested_y: height to resize to
     :param crop_position: where should the image zoom when cropped
+    :param resample: filter of the resize, see ImageQualityEnum.get_resample_filter
     :return: PIL Image containing resized image to fit requested x and y
+    :raises: HTTPException 400 if the resized image has too many pixels
     """
     original_width, original_height = img.size
     to_crop = False
@@ -405,6 +633,8 @@ def resize_with_crop_and_paddings(
         original_width=original_width,
         original_height=original_height,
     )
+    # a requested size of 0 becomes the original size only here
+    check_output_area(width=to_scale_x, height=to_scale_y)
     # minimum resolution is already checked on convert_req_size_to_true
     if original_width >= requested_x / 2 and original_height >= requested_y / 2:
         new_width, new_height = _find_greater_scaled_dimensions(
@@ -423,7 +653,7 @@ def resize_with_crop_and_paddings(
             requested_x=to_scale_x,
             requested_y=to_scale_y,
         )
-    img = _resize_image_given_size(img, (new_width, new_height))
+    img = _resize_image_given_size(img, (new_width, new_height), resample)
 
     if to_crop:
         img = _crop_image(
@@ -446,6 +676,7 @@ def resize_with_paddings(
     img: Image.Image,
     requested_x: int,
     requested_y: int,
+    resample: Image.Resampling = RESAMPLE_DEFAULT,
 ) -> Image.Image:
     """
     Resize the image and add borders it if necessary
@@ -453,7 +684,9 @@ def resize_with_paddings(
     :param img: content to resize
     :param requested_x: width to resize to
     :param requested_y: height to resize to
+    :param resample: filter of the resize, see ImageQualityEnum.get_resample_filter
     :return: PIL Image containing resized image to fit requested x and y
+    :raises: HTTPException 400 if the resized image has too many pixels
     """
 
     original_width, original_height = img.size
@@ -463,6 +696,8 @@ def resize_with_paddings(
         original_width=original_width,
         original_height=original_height,
     )
+    # a requested size of 0 becomes the original size only here
+    check_output_area(width=to_scale_x, height=to_scale_y)
     if (
         IMAGE_MIN_RES <= original_width <= to_scale_x / 2
         and IMAGE_MIN_RES <= original_height <= to_scale_y / 2
@@ -475,7 +710,7 @@ def resize_with_paddings(
             requested_x=to_scale_x,
             requested_y=to_scale_y,
         )
-    img = _resize_image_given_size(img, (new_width, new_height))
+    img = _resize_image_given_size(img, (new_width, new_height), resample)
     return _add_borders_to_image(
         img=img,
         requested_x=to_scale_x if to_scale_x >= IMAGE_MIN_RES else IMAGE_MIN_RES,
@@ -523,3 +758,47 @@ def add_circle_margins_with_transparency(
     result.putalpha(mask)
 
     return result
+
+
+def create_contact_sheet(images: List[Image.Image], transparent: bool) -> Image.Image:
+    """
+    Pastes the images in a grid with as many columns as rows (or one more),
+    in reading order. Every cell is as big as the biggest image
+    and the images are centered in their cell.
+    \f
+    :param images: images to paste, at least one
+    :param transparent: True for a transparent background, otherwise it is white
+    :return: the contact sheet
+    :raises: HTTPException 413 if the sheet would have more than
+     IMAGE_MAX_OUTPUT_PIXELS pixels, before allocating it
+    """
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    cell_x = max(img.size[0] for img in images)
+    cell_y = max(img.size[1] for img in images)
+    # the requested area is checked for each page, but not for all of them
+    if cell_x * columns * cell_y * rows > IMAGE_MAX_OUTPUT_PIXELS:
+        logger.info(
+            f"Contact sheet of {len(images)} pages of {cell_x}x{cell_y} rejected",
+        )
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=message.IMAGE_TOO_LARGE,
+        )
+    sheet = Image.new(
+        "RGBA" if transparent else "RGB",
+        (cell_x * columns, cell_y * rows),
+        (255, 255, 255, 0) if transparent else (255, 255, 255),
+    )
+    for index, img in enumerate(images):
+        row, column = divmod(index, columns)
+        cell_img = img.convert("RGBA")
+        sheet.paste(
+            cell_img,
+            (
+                column * cell_x + (cell_x - img.size[0]) // 2,
+                row * cell_y + (cell_y - img.size[1]) // 2,
+            ),
+            mask=cell_img,
+        )
+    return sheet
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import logging
+from typing import NamedTuple
+
+from fastapi import HTTPException, status
+from PIL import Image
+
+from app.core.resources.app_config import (
+    IMAGE_MAX_ANIMATION_PIXELS,
+    IMAGE_MAX_SOURCE_PIXELS,
+)
+from app.core.resources.constants import message
+
+logger = logging.getLogger(__name__)
+
+
+class ImageProbe(NamedTuple):
+    """
+    Size, mode and number of frames of an image, read from its header
+    """
+
+    width: int
+    height: int
+    mode: str
+    n_frames: int
+
+
+def probe_image(img: Image.Image, animated: bool = False) -> ImageProbe:
+    """
+    Reads the header information of an image opened but not yet loaded,
+    without decoding any pixel. Pillow opens the images lazily, so nothing
+    has been allocated for the pixels yet.
+    \f
+    :param img: image opened but not yet loaded
+    :param animated: True to count the frames, when all of them will be decoded.
+     Counting them only skips over the data of each frame.
+    :return: the header information of the image
+    """
+    return ImageProbe(
+        width=img.width,
+        height=img.height,
+        mode=img.mode,
+        n_frames=getattr(img, "n_frames", 1) if animated else 1,
+    )
+
+
+def check_image_limits(probe: ImageProbe, log: logging.Logger = logger) -> None:
+    """
+    Checks that the probed image can be decoded without allocating too much memory
+    \f
+    :param probe: header information of the image
+    :param log: log to use, if missing it will use default class logger
+    :raises: HTTPException 413 if the image has more than IMAGE_MAX_SOURCE_PIXELS
+     pixels, or if all its frames have more than IMAGE_MAX_ANIMATION_PIXELS
+    """
+    pixels = probe.width * probe.height
+    if pixels > IMAGE_MAX_SOURCE_PIXELS or (
+        pixels * probe.n_frames > IMAGE_MAX_ANIMATION_PIXELS
+    ):
+        log.info(f"Image rejected before decoding it: {probe}")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=message.IMAGE_TOO_LARGE,
+        )
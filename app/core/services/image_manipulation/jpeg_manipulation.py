@@ -3,7 +3,7 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import io
-from typing import TYPE_CHECKING
+from typing import IO, TYPE_CHECKING
 
 from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
 from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
@@ -11,11 +11,11 @@ from app.core.resources.schemas.enums.vertical_crop_position_enum import (
     VerticalCropPositionEnum,
 )
 from app.core.services.image_manipulation.image_manipulation import (
-    add_circle_margins_to_image,
     parse_to_valid_image,
-    resize_with_crop_and_paddings,
-    resize_with_paddings,
-    save_image_to_buffer,
+)
+from app.core.services.image_manipulation.lossy_manipulation import (
+    lossy_preview_from_image,
+    lossy_thumbnail_from_image,
 )
 
 if TYPE_CHECKING:
@@ -27,7 +27,7 @@ def jpeg_preview(
     _y: int,
     _quality: ImageQualityEnum,
     _crop: bool,
-    content: io.BytesIO,
+    content: IO[bytes],
     crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
 ) -> io.BytesIO:
     """
@@ -41,27 +41,51 @@ def jpeg_preview(
     :param crop_position: the position from which the image will be cropped
     :return: compressed image raw bytes
     """
-    _quality_value = _quality.get_jpeg_int_quality()
-    img: Image.Image = parse_to_valid_image(content)
-    if _crop:
-        img = resize_with_crop_and_paddings(
-            img=img,
-            requested_x=_x,
-            requested_y=_y,
-            crop_position=crop_position,
-        )
-    else:
-        img = resize_with_paddings(img=img, requested_x=_x, requested_y=_y)
-    # JPEG does not support RGBA or P
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGB")
-    output: io.BytesIO = save_image_to_buffer(
+    img: Image.Image = parse_to_valid_image(
+        content=content,
+        requested_x=_x,
+        requested_y=_y,
+    )
+    return jpeg_preview_from_image(
         img=img,
+        _x=_x,
+        _y=_y,
+        _quality=_quality,
+        _crop=_crop,
+        crop_position=crop_position,
+    )
+
+
+def jpeg_preview_from_image(
+    img: "Image.Image",
+    _x: int,
+    _y: int,
+    _quality: ImageQualityEnum,
+    _crop: bool,
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create JPEG preview with the given quality from an already parsed image
+    \f
+    :param img: parsed image, it is not modified
+    :param _crop: True will crop the image, losing data on the borders
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param _quality: quality to convert the image to
+    :param crop_position: the position from which the image will be cropped
+    :return: compressed image raw bytes
+    """
+    return lossy_preview_from_image(
+        img=img,
+        _x=_x,
+        _y=_y,
+        _quality=_quality,
+        _crop=_crop,
         _format="JPEG",
-        _optimize=False,
-        _quality_value=_quality_value,
+        transparency=False,
+        encoder_options={"_jpeg_profile": _quality.get_jpeg_encoder_profile()},
+        crop_position=crop_position,
     )
-    return output
 
 
 def jpeg_thumbnail(
@@ -69,7 +93,7 @@ def jpeg_thumbnail(
     _y: int,
     border: ImageBorderShapeEnum,
     _quality: ImageQualityEnum,
-    content: io.BytesIO,
+    content: IO[bytes],
     crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
 ) -> io.BytesIO:
     """
@@ -83,24 +107,48 @@ def jpeg_thumbnail(
     :param crop_position: the position from which the image will be cropped
     :return: compressed image raw bytes
     """
-    _quality_value = _quality.get_jpeg_int_quality()
-    img: Image.Image = parse_to_valid_image(content)
-    img = resize_with_crop_and_paddings(
-        img=img,
+    img: Image.Image = parse_to_valid_image(
+        content=content,
         requested_x=_x,
         requested_y=_y,
+    )
+    return jpeg_thumbnail_from_image(
+        img=img,
+        _x=_x,
+        _y=_y,
+        border=border,
+        _quality=_quality,
         crop_position=crop_position,
     )
-    if border == ImageBorderShapeEnum.ROUNDED:
-        img = add_circle_margins_to_image(img)
 
-    # JPEG does not support RGBA or P
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGB")
-    output: io.BytesIO = save_image_to_buffer(
+
+def jpeg_thumbnail_from_image(
+    img: "Image.Image",
+    _x: int,
+    _y: int,
+    border: ImageBorderShapeEnum,
+    _quality: ImageQualityEnum,
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create JPEG thumbnail with the given quality from an already parsed image
+    \f
+    :param img: parsed image, it is not modified
+    :param _quality: quality to convert the image to
+    :param border: which type of border to be used
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param crop_position: the position from which the image will be cropped
+    :return: compressed image raw bytes
+    """
+    return lossy_thumbnail_from_image(
         img=img,
+        _x=_x,
+        _y=_y,
+        border=border,
+        _quality=_quality,
         _format="JPEG",
-        _optimize=False,
-        _quality_value=_quality_value,
+        transparency=False,
+        encoder_options={"_jpeg_profile": _quality.get_jpeg_encoder_profile()},
+        crop_position=crop_position,
     )
-    return output
@@ -0,0 +1,132 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+from typing import TYPE_CHECKING, Any, Dict
+
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.resources.schemas.enums.vertical_crop_position_enum import (
+    VerticalCropPositionEnum,
+)
+from app.core.services.image_manipulation.image_manipulation import (
+    add_circle_margins_to_image,
+    add_circle_margins_with_transparency,
+    resize_with_crop_and_paddings,
+    resize_with_paddings,
+    save_image_to_buffer,
+)
+from app.core.services.metrics import STAGE_MASK, STAGE_TRANSFORM, observe_stage
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+def lossy_preview_from_image(
+    img: "Image.Image",
+    _x: int,
+    _y: int,
+    _quality: ImageQualityEnum,
+    _crop: bool,
+    _format: str,
+    transparency: bool,
+    encoder_options: Dict[str, Any],
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create the preview in a lossy format (JPEG or WebP)
+    with the given quality from an already parsed image
+    \f
+    :param img: parsed image, it is not modified
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param _quality: quality to convert the image to
+    :param _crop: True will crop the image, losing data on the borders
+    :param _format: format to save to
+    :param transparency: False if the format does not support RGBA or P images
+    :param encoder_options: settings of the encoder, passed to save_image_to_buffer
+    :param crop_position: the position from which the image will be cropped
+    :return: compressed image raw bytes
+    """
+    icc_profile = img.info.get("icc_profile")
+    with observe_stage(STAGE_TRANSFORM):
+        if _crop:
+            img = resize_with_crop_and_paddings(
+                img=img,
+                requested_x=_x,
+                requested_y=_y,
+                crop_position=crop_position,
+                resample=_quality.get_resample_filter(),
+            )
+        else:
+            img = resize_with_paddings(
+                img=img,
+                requested_x=_x,
+                requested_y=_y,
+                resample=_quality.get_resample_filter(),
+            )
+        if not transparency and img.mode in ("RGBA", "P"):
+            img = img.convert("RGB")
+    if icc_profile:
+        # the paddings are pasted on a new image, which has no ICC profile
+        img.info["icc_profile"] = icc_profile
+    output: io.BytesIO = save_image_to_buffer(
+        img=img,
+        _format=_format,
+        **encoder_options,
+    )
+    return output
+
+
+def lossy_thumbnail_from_image(
+    img: "Image.Image",
+    _x: int,
+    _y: int,
+    border: ImageBorderShapeEnum,
+    _quality: ImageQualityEnum,
+    _format: str,
+    transparency: bool,
+    encoder_options: Dict[str, Any],
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create the thumbnail in a lossy format (JPEG or WebP)
+    with the given quality from an already parsed image.
+    The corners of the rounded thumbnails are transparent
+    when the format supports it, white otherwise.
+    \f
+    :param img: parsed image, it is not modified
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param border: which type of border to be used
+    :param _quality: quality to convert the image to
+    :param _format: format to save to
+    :param transparency: False if the format does not support RGBA or P images
+    :param encoder_options: settings of the encoder, passed to save_image_to_buffer
+    :param crop_position: the position from which the image will be cropped
+    :return: compressed image raw bytes
+    """
+    with observe_stage(STAGE_TRANSFORM):
+        img = resize_with_crop_and_paddings(
+            img=img,
+            requested_x=_x,
+            requested_y=_y,
+            crop_position=crop_position,
+            resample=_quality.get_resample_filter(),
+        )
+    if border == ImageBorderShapeEnum.ROUNDED:
+        with observe_stage(STAGE_MASK):
+            if transparency:
+                img = add_circle_margins_with_transparency(img=img, blur_radius=2)
+            else:
+                img = add_circle_margins_to_image(img)
+
+    if not transparency and img.mode in ("RGBA", "P"):
+        img = img.convert("RGB")
+    output: io.BytesIO = save_image_to_buffer(
+        img=img,
+        _format=_format,
+        **encoder_options,
+    )
+    return output
@@ -3,7 +3,7 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import io
-from typing import TYPE_CHECKING
+from typing import IO, TYPE_CHECKING
 
 from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
 from app.core.resources.schemas.enums.vertical_crop_position_enum import (
@@ -16,6 +16,7 @@ from app.core.services.image_manipulation.image_manipulation import (
     resize_with_paddings,
     save_image_to_buffer,
 )
+from app.core.services.metrics import STAGE_MASK, STAGE_TRANSFORM, observe_stage
 
 if TYPE_CHECKING:
     from PIL import Image
@@ -25,7 +26,7 @@ def png_preview(
     _x: int,
     _y: int,
     _crop: bool,
-    content: io.BytesIO,
+    content: IO[bytes],
     crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
 ) -> io.BytesIO:
     """
@@ -38,16 +39,47 @@ def png_preview(
     :param crop_position: where should the image zoom when cropped
     :return: compressed image raw bytes
     """
-    img: Image.Image = parse_to_valid_image(content)
-    if _crop:
-        img = resize_with_crop_and_paddings(
-            img=img,
-            requested_x=_x,
-            requested_y=_y,
-            crop_position=crop_position,
-        )
-    else:
-        img = resize_with_paddings(img=img, requested_x=_x, requested_y=_y)
+    img: Image.Image = parse_to_valid_image(
+        content=content,
+        requested_x=_x,
+        requested_y=_y,
+    )
+    return png_preview_from_image(
+        img=img,
+        _x=_x,
+        _y=_y,
+        _crop=_crop,
+        crop_position=crop_position,
+    )
+
+
+def png_preview_from_image(
+    img: "Image.Image",
+    _x: int,
+    _y: int,
+    _crop: bool,
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create PNG preview from an already parsed image
+    \f
+    :param img: parsed image, it is not modified
+    :param _crop: True will crop the image, losing data on the borders
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param crop_position: where should the image zoom when cropped
+    :return: compressed image raw bytes
+    """
+    with observe_stage(STAGE_TRANSFORM):
+        if _crop:
+            img = resize_with_crop_and_paddings(
+                img=img,
+                requested_x=_x,
+                requested_y=_y,
+                crop_position=crop_position,
+            )
+        else:
+            img = resize_with_paddings(img=img, requested_x=_x, requested_y=_y)
     output: io.BytesIO = save_image_to_buffer(img=img, _format="PNG", _optimize=False)
     return output
 
@@ -56,7 +88,7 @@ def png_thumbnail(
     _x: int,
     _y: int,
     border: ImageBorderShapeEnum,
-    content: io.BytesIO,
+    content: IO[bytes],
     crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
 ) -> io.BytesIO:
     """
@@ -69,15 +101,47 @@ def png_thumbnail(
     :param crop_position: where should the image zoom when cropped
     :return: compressed image raw bytes
     """
-    img: Image.Image = parse_to_valid_image(content)
-    img = resize_with_crop_and_paddings(
-        img=img,
+    img: Image.Image = parse_to_valid_image(
+        content=content,
         requested_x=_x,
         requested_y=_y,
+    )
+    return png_thumbnail_from_image(
+        img=img,
+        _x=_x,
+        _y=_y,
+        border=border,
         crop_position=crop_position,
     )
+
+
+def png_thumbnail_from_image(
+    img: "Image.Image",
+    _x: int,
+    _y: int,
+    border: ImageBorderShapeEnum,
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create PNG thumbnail from an already parsed image
+    \f
+    :param img: parsed image, it is not modified
+    :param border: which type of border to be used
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param crop_position: where should the image zoom when cropped
+    :return: compressed image raw bytes
+    """
+    with observe_stage(STAGE_TRANSFORM):
+        img = resize_with_crop_and_paddings(
+            img=img,
+            requested_x=_x,
+            requested_y=_y,
+            crop_position=crop_position,
+        )
     if border == ImageBorderShapeEnum.ROUNDED:
-        img = add_circle_margins_with_transparency(img=img, blur_radius=2)
+        with observe_stage(STAGE_MASK):
+            img = add_circle_margins_with_transparency(img=img, blur_radius=2)
 
     output: io.BytesIO = save_image_to_buffer(img=img, _format="PNG", _optimize=False)
     return output
@@ -0,0 +1,155 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+from typing import IO, TYPE_CHECKING
+
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.resources.schemas.enums.vertical_crop_position_enum import (
+    VerticalCropPositionEnum,
+)
+from app.core.services.image_manipulation.image_manipulation import (
+    parse_to_valid_image,
+)
+from app.core.services.image_manipulation.lossy_manipulation import (
+    lossy_preview_from_image,
+    lossy_thumbnail_from_image,
+)
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+def webp_preview(
+    _x: int,
+    _y: int,
+    _quality: ImageQualityEnum,
+    _crop: bool,
+    content: IO[bytes],
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create WebP preview with the given quality
+    \f
+    :param _crop: True will crop the image, losing data on the borders
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param _quality: quality to convert the image to
+    :param content: image raw bytes
+    :param crop_position: where should the image zoom when cropped
+    :return: compressed image raw bytes
+    """
+    img: Image.Image = parse_to_valid_image(
+        content=content,
+        requested_x=_x,
+        requested_y=_y,
+    )
+    return webp_preview_from_image(
+        img=img,
+        _x=_x,
+        _y=_y,
+        _quality=_quality,
+        _crop=_crop,
+        crop_position=crop_position,
+    )
+
+
+def webp_preview_from_image(
+    img: "Image.Image",
+    _x: int,
+    _y: int,
+    _quality: ImageQualityEnum,
+    _crop: bool,
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create WebP preview with the given quality from an already parsed image
+    \f
+    :param img: parsed image, it is not modified
+    :param _crop: True will crop the image, losing data on the borders
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param _quality: quality to convert the image to
+    :param crop_position: where should the image zoom when cropped
+    :return: compressed image raw bytes
+    """
+    return lossy_preview_from_image(
+        img=img,
+        _x=_x,
+        _y=_y,
+        _quality=_quality,
+        _crop=_crop,
+        _format="WEBP",
+        transparency=True,
+        encoder_options={"_quality_value": _quality.get_webp_int_quality()},
+        crop_position=crop_position,
+    )
+
+
+def webp_thumbnail(
+    _x: int,
+    _y: int,
+    _quality: ImageQualityEnum,
+    border: ImageBorderShapeEnum,
+    content: IO[bytes],
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create WebP thumbnail with the given quality
+    \f
+    :param border: which type of border to be used
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param _quality: quality to convert the image to
+    :param content: image raw bytes
+    :param crop_position: where should the image zoom when cropped
+    :return: compressed image raw bytes
+    """
+    img: Image.Image = parse_to_valid_image(
+        content=content,
+        requested_x=_x,
+        requested_y=_y,
+    )
+    return webp_thumbnail_from_image(
+        img=img,
+        _x=_x,
+        _y=_y,
+        _quality=_quality,
+        border=border,
+        crop_position=crop_position,
+    )
+
+
+def webp_thumbnail_from_image(
+    img: "Image.Image",
+    _x: int,
+    _y: int,
+    _quality: ImageQualityEnum,
+    border: ImageBorderShapeEnum,
+    crop_position: VerticalCropPositionEnum = VerticalCropPositionEnum.CENTER,
+) -> io.BytesIO:
+    """
+    Create WebP thumbnail with the given quality from an already parsed image.
+    Unlike JPEG, WebP keeps the transparent corners of the rounded thumbnails.
+    \f
+    :param img: parsed image, it is not modified
+    :param border: which type of border to be used
+    :param _x: width to resize the image to
+    :param _y: height to resize the image to
+    :param _quality: quality to convert the image to
+    :param crop_position: where should the image zoom when cropped
+    :return: compressed image raw bytes
+    """
+    return lossy_thumbnail_from_image(
+        img=img,
+        _x=_x,
+        _y=_y,
+        border=border,
+        _quality=_quality,
+        _format="WEBP",
+        transparency=True,
+        encoder_options={"_quality_value": _quality.get_webp_int_quality()},
+        crop_position=crop_position,
+    )
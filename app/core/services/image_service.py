@@ -2,33 +2,50 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import functools
 import io
-from typing import Any, Callable
+from typing import IO, Any, Callable, Dict, List, Union
 
 from fastapi import HTTPException, status
 from fastapi.responses import Response as FastApiResp
-from httpx import Response as RequestResp
-from returns.maybe import Maybe
+from PIL import Image
 
 from app.core.resources.constants import message
-from app.core.resources.data_validator import check_for_storage_response_error
 from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
 from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
 from app.core.resources.schemas.preview_image_metadata import PreviewImageMetadata
 from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
-from app.core.services import storage_communication
+from app.core.services import batch_service, storage_communication, task_executor
 from app.core.services.image_manipulation.gif_manipulation import (
     gif_preview,
     gif_thumbnail,
 )
+from app.core.services.image_manipulation.image_manipulation import (
+    is_valid_intermediate,
+    parse_to_valid_image,
+    reduce_to_requested_size,
+)
 from app.core.services.image_manipulation.jpeg_manipulation import (
     jpeg_preview,
+    jpeg_preview_from_image,
     jpeg_thumbnail,
+    jpeg_thumbnail_from_image,
 )
 from app.core.services.image_manipulation.png_manipulation import (
     png_preview,
+    png_preview_from_image,
     png_thumbnail,
+    png_thumbnail_from_image,
+)
+from app.core.services.image_manipulation.webp_manipulation import (
+    webp_preview,
+    webp_preview_from_image,
+    webp_thumbnail,
+    webp_thumbnail_from_image,
 )
+from app.core.services.metrics import STAGE_TRANSFORM, observe_stage
+
+ImageRenditionMetadata = Union[ThumbnailImageMetadata, PreviewImageMetadata]
 
 
 async def retrieve_image_and_create_thumbnail(
@@ -47,16 +64,16 @@ async def retrieve_image_and_create_thumbnail(
     :param service_type: service that owns the resource
     :return response: a Response with metadata or error message.
     """
-    response_data: Maybe[RequestResp] = await storage_communication.retrieve_data(
-        file_id=image_id,
-        version=version,
-        service_type=service_type,
-    )
     try:
-        return _process_response_data(
-            response_data=response_data,
-            img_metadata=img_metadata,
-            func=_select_thumbnail_module,
+        return await storage_communication.retrieve_and_process(
+            file_id=image_id,
+            version=version,
+            service_type=service_type,
+            process=functools.partial(
+                _process_content,
+                img_metadata=img_metadata,
+                func=_select_thumbnail_module,
+            ),
         )
     except ValueError as e:
         raise HTTPException(
@@ -81,16 +98,16 @@ async def retrieve_image_and_create_preview(
     :param service_type: service that owns the resource
     :return response: a Response with metadata or error message.
     """
-    response_data: Maybe[RequestResp] = await storage_communication.retrieve_data(
-        file_id=image_id,
-        version=version,
-        service_type=service_type,
-    )
     try:
-        return _process_response_data(
-            response_data=response_data,
-            img_metadata=img_metadata,
-            func=_select_preview_module,
+        return await storage_communication.retrieve_and_process(
+            file_id=image_id,
+            version=version,
+            service_type=service_type,
+            process=functools.partial(
+                _process_content,
+                img_metadata=img_metadata,
+                func=_select_preview_module,
+            ),
         )
     except ValueError as e:
         raise HTTPException(
@@ -99,7 +116,38 @@ async def retrieve_image_and_create_preview(
         ) from None
 
 
-def process_raw_thumbnail(
+async def retrieve_image_and_create_renditions(
+    image_id: str,
+    version: int,
+    renditions: List[ImageRenditionMetadata],
+    service_type: ServiceTypeEnum,
+) -> FastApiResp:
+    """
+    Contact storage and retrieves the image with the file id requested
+    and creates every requested rendition decoding the image only once.
+    If the file id is not found returns Generic error specifying the error code
+    :param image_id: UUID of the image
+    :param version: version of the file
+    :param renditions: Instances of ThumbnailImageMetadata or PreviewImageMetadata
+    :param service_type: service that owns the resource
+    :return response: a multipart Response with a part for each rendition,
+     in the same order, or the error message.
+    """
+    try:
+        return await storage_communication.retrieve_and_process(
+            file_id=image_id,
+            version=version,
+            service_type=service_type,
+            process=functools.partial(_process_renditions, renditions=renditions),
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        ) from None
+
+
+async def process_raw_thumbnail(
     raw_content: io.BytesIO,
     img_metadata: ThumbnailImageMetadata,
 ) -> io.BytesIO:
@@ -109,7 +157,11 @@ def process_raw_thumbnail(
     :param img_metadata: Instance of ThumbnailImageMetadata class
     """
     try:
-        return _select_thumbnail_module(img_metadata=img_metadata, content=raw_content)
+        return await task_executor.run_cpu_bound(
+            _select_thumbnail_module,
+            img_metadata=img_metadata,
+            content=raw_content,
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -117,7 +169,7 @@ def process_raw_thumbnail(
         ) from None
 
 
-def process_raw_preview(
+async def process_raw_preview(
     raw_content: io.BytesIO,
     img_metadata: PreviewImageMetadata,
 ) -> io.BytesIO:
@@ -127,7 +179,11 @@ def process_raw_preview(
     :param img_metadata: Instance of PreviewImageMetadata class
     """
     try:
-        return _select_preview_module(img_metadata=img_metadata, content=raw_content)
+        return await task_executor.run_cpu_bound(
+            _select_preview_module,
+            img_metadata=img_metadata,
+            content=raw_content,
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -135,41 +191,221 @@ def process_raw_preview(
         ) from e
 
 
-def _process_response_data(
-    response_data: Maybe[RequestResp],
+def render_from_image(
+    img_metadata: ImageRenditionMetadata,
+    img: Image.Image,
+) -> io.BytesIO:
+    """
+    Based on the given type and format chooses the correct module to call
+    :param img_metadata: Instance of ThumbnailImageMetadata or PreviewImageMetadata
+    :param img: parsed image
+    :return: Raw bytes of the converted image
+    :raises: ValueError if the format is not supported
+    """
+    _format = img_metadata.format
+    if isinstance(img_metadata, ThumbnailImageMetadata):
+        if _format == ImageTypeEnum.JPEG:
+            return jpeg_thumbnail_from_image(
+                img=img,
+                _x=img_metadata.width,
+                _y=img_metadata.height,
+                _quality=img_metadata.quality,
+                border=img_metadata.shape,
+                crop_position=img_metadata.crop_position,
+            )
+        if _format == ImageTypeEnum.PNG:
+            return png_thumbnail_from_image(
+                img=img,
+                _x=img_metadata.width,
+                _y=img_metadata.height,
+                border=img_metadata.shape,
+                crop_position=img_metadata.crop_position,
+            )
+        if _format == ImageTypeEnum.WEBP:
+            return webp_thumbnail_from_image(
+                img=img,
+                _x=img_metadata.width,
+                _y=img_metadata.height,
+                _quality=img_metadata.quality,
+                border=img_metadata.shape,
+                crop_position=img_metadata.crop_position,
+            )
+    else:
+        if _format == ImageTypeEnum.JPEG:
+            return jpeg_preview_from_image(
+                img=img,
+                _x=img_metadata.width,
+                _y=img_metadata.height,
+                _quality=img_metadata.quality,
+                _crop=img_metadata.crop,
+                crop_position=img_metadata.crop_position,
+            )
+        if _format == ImageTypeEnum.PNG:
+            return png_preview_from_image(
+                img=img,
+                _x=img_metadata.width,
+                _y=img_metadata.height,
+                _crop=img_metadata.crop,
+                crop_position=img_metadata.crop_position,
+            )
+        if _format == ImageTypeEnum.WEBP:
+            return webp_preview_from_image(
+                img=img,
+                _x=img_metadata.width,
+                _y=img_metadata.height,
+                _quality=img_metadata.quality,
+                _crop=img_metadata.crop,
+                crop_position=img_metadata.crop_position,
+            )
+
+    raise ValueError(message.FORMAT_NOT_SUPPORTED_ERROR)
+
+
+async def _process_content(
+    content: IO[bytes],
     img_metadata: Any,
     func: Callable,
 ) -> FastApiResp:
     """
-    Validates response data and then process calling func passed.
-    If the storage is not available returns
-    Storage unavailable error and related error code
-    :param response_data:
+    Process the content downloaded from the storage calling func passed
+    in the configured executor.
+    :param content: content of the image
     :param img_metadata: object containing the image metadata fields.
-    :param func:
-    :return:
+    :param func: function that converts the image content
+    :return: a Response with the converted image
     """
-    response_error: Maybe[FastApiResp] = check_for_storage_response_error(
-        response_data=response_data,
+    processed_content: io.BytesIO = await task_executor.run_cpu_bound(
+        func,
+        img_metadata=img_metadata,
+        content=content,
     )
-    return response_error.value_or(
-        FastApiResp(
-            content=func(
-                img_metadata=img_metadata,
-                content=io.BytesIO(
-                    response_data.value_or(
-                        RequestResp(status_code=status.HTTP_200_OK),
-                    ).content,
+    return FastApiResp(
+        content=processed_content.read(),
+        media_type=f"image/{img_metadata.format.value}",
+    )
+
+
+async def _process_renditions(
+    content: IO[bytes],
+    renditions: List[ImageRenditionMetadata],
+) -> FastApiResp:
+    """
+    Creates the renditions of the content downloaded from the storage
+    in the configured executor.
+    :param content: content of the image
+    :param renditions: Instances of ThumbnailImageMetadata or PreviewImageMetadata
+    :return: a multipart Response with a part for each rendition
+    """
+    outputs: List[io.BytesIO] = await task_executor.run_cpu_bound(
+        _create_renditions,
+        renditions=renditions,
+        content=content,
+    )
+    return batch_service.create_multipart_response(
+        [
+            (
+                {"Content-ID": str(index)},
+                FastApiResp(
+                    content=output.read(),
+                    media_type=f"image/{img_metadata.format.value}",
+                ),
+            )
+            for index, (img_metadata, output) in enumerate(zip(renditions, outputs))
+        ],
+    )
+
+
+def _create_renditions(
+    renditions: List[ImageRenditionMetadata],
+    content: IO[bytes],
+) -> List[io.BytesIO]:
+    """
+    Creates every rendition decoding the image only once. Renditions are
+    created from the biggest to the smallest, each one resized from an
+    intermediate reduced from the smallest image already created that is
+    still big enough for it on both axes (a smaller but squarer rendition
+    does not cover a wider one), or from the decoded image. The renditions
+    keeping the original width or height are resized from the decoded image.
+    Gif renditions decode their frames while they are saved, so in that
+    case each rendition is created from the content as the single APIs do.
+    :param renditions: Instances of ThumbnailImageMetadata or PreviewImageMetadata
+    :param content: Raw bytes of the image
+    :return: Raw bytes of each rendition, in the same order
+    :raises: ValueError if a format is not supported
+    """
+    if any(r.format == ImageTypeEnum.GIF for r in renditions):
+        outputs = []
+        for img_metadata in renditions:
+            content.seek(0)
+            outputs.append(
+                (
+                    _select_thumbnail_module(img_metadata=img_metadata, content=content)
+                    if isinstance(img_metadata, ThumbnailImageMetadata)
+                    else _select_preview_module(
+                        img_metadata=img_metadata,
+                        content=content,
+                    )
                 ),
-            ).read(),
-            media_type=f"image/{img_metadata.format.value}",
+            )
+        return outputs
+
+    keeps_original_size = any(r.width == 0 or r.height == 0 for r in renditions)
+    img = parse_to_valid_image(
+        content=content,
+        requested_x=0 if keeps_original_size else max(r.width for r in renditions),
+        requested_y=0 if keeps_original_size else max(r.height for r in renditions),
+    )
+    rendered: Dict[int, io.BytesIO] = {}
+    intermediates: List[Image.Image] = [img]
+    for index in sorted(
+        range(len(renditions)),
+        key=lambda i: renditions[i].width * renditions[i].height,
+        reverse=True,
+    ):
+        img_metadata = renditions[index]
+        source = img
+        if img_metadata.width != 0 and img_metadata.height != 0:
+            with observe_stage(STAGE_TRANSFORM):
+                source = reduce_to_requested_size(
+                    img=_select_intermediate(intermediates, img_metadata),
+                    requested_x=img_metadata.width,
+                    requested_y=img_metadata.height,
+                )
+            intermediates.append(source)
+        rendered[index] = render_from_image(img_metadata=img_metadata, img=source)
+    return [rendered[index] for index in range(len(renditions))]
+
+
+def _select_intermediate(
+    intermediates: List[Image.Image],
+    img_metadata: ImageRenditionMetadata,
+) -> Image.Image:
+    """
+    \f
+    :param intermediates: decoded image followed by the intermediates
+     reduced from it
+    :param img_metadata: size of the rendition to create
+    :return: the smallest intermediate that is big enough for the rendition
+     on both axes, the decoded image if none of them is
+    """
+    return min(
+        (
+            intermediate
+            for intermediate in intermediates
+            if is_valid_intermediate(
+                img=intermediate,
+                requested_x=img_metadata.width,
+                requested_y=img_metadata.height,
+            )
         ),
+        key=lambda intermediate: intermediate.width * intermediate.height,
+        default=intermediates[0],
     )
 
 
 def _select_thumbnail_module(
     img_metadata: ThumbnailImageMetadata,
-    content: io.BytesIO,
+    content: IO[bytes],
 ) -> io.BytesIO:
     """
     Based on the given format chooses the correct module to call
@@ -196,6 +432,15 @@ def _select_thumbnail_module(
             content=content,
             crop_position=img_metadata.crop_position,
         )
+    if _format == ImageTypeEnum.WEBP:
+        return webp_thumbnail(
+            _x=img_metadata.width,
+            _y=img_metadata.height,
+            _quality=img_metadata.quality,
+            border=img_metadata.shape,
+            content=content,
+            crop_position=img_metadata.crop_position,
+        )
     if _format == ImageTypeEnum.GIF:
         return gif_thumbnail(
             _x=img_metadata.width,
@@ -211,7 +456,7 @@ def _select_thumbnail_module(
 
 def _select_preview_module(
     img_metadata: PreviewImageMetadata,
-    content: io.BytesIO,
+    content: IO[bytes],
 ) -> io.BytesIO:
     """
     Based on the given format chooses the correct module to call
@@ -238,6 +483,15 @@ def _select_preview_module(
             _crop=img_metadata.crop,
             crop_position=img_metadata.crop_position,
         )
+    if _format == ImageTypeEnum.WEBP:
+        return webp_preview(
+            _x=img_metadata.width,
+            _y=img_metadata.height,
+            _quality=img_metadata.quality,
+            content=content,
+            _crop=img_metadata.crop,
+            crop_position=img_metadata.crop_position,
+        )
     if _format == ImageTypeEnum.GIF:
         return gif_preview(
             _x=img_metadata.width,
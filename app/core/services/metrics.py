@@ -0,0 +1,311 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.resources.app_config import ENABLE_SERVER_TIMING, SERVICE_NAME
+from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
+
+# stages of the creation of a rendition
+STAGE_STORAGE_FETCH: str = "storage_fetch"
+STAGE_DOCS_EDITOR_CONVERSION: str = "docs_editor_conversion"
+STAGE_PDF_RENDER: str = "pdf_render"
+STAGE_DECODE: str = "decode"
+STAGE_TRANSFORM: str = "transform"
+STAGE_MASK: str = "mask"
+STAGE_ENCODE: str = "encode"
+STAGE_RESPONSE_WRITE: str = "response_write"
+
+# renditions not created by the request itself
+CACHE_HIT: str = "hit"
+CACHE_COALESCED: str = "coalesced"
+
+# the docs-editor conversions can take up to the docs timeout
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    float("inf"),
+)
+
+# used as label when the request has no such parameter
+NO_LABEL: str = "none"
+SERVICE_TYPE_VALUES: FrozenSet[str] = frozenset(
+    service_type.value for service_type in ServiceTypeEnum
+)
+
+REQUEST_LABELS: Tuple[str, ...] = ("route", "format", "service_type", "status")
+
+requests_total = Counter(
+    "preview_requests_total",
+    "Requests served, by route, output format, service type and status code",
+    REQUEST_LABELS,
+)
+request_duration = Histogram(
+    "preview_request_duration_seconds",
+    "Time spent serving the requests, until the response has been sent",
+    REQUEST_LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+stage_duration = Histogram(
+    "preview_stage_duration_seconds",
+    "Time spent in each stage of the creation of the renditions",
+    ("stage",),
+    buckets=LATENCY_BUCKETS,
+)
+
+# seconds spent in each stage by the current request, when they are collected
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "stage_timings",
+    default=None,
+)
+# renditions of the current request taken from the cache or from
+# an identical request, which have no stages, when they are collected
+_cache_statuses: ContextVar[Optional[List[str]]] = ContextVar(
+    "cache_statuses",
+    default=None,
+)
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    """
+    Measures the time spent in the block as the duration of the given stage,
+    even when the block raises. The duration is also added to the stage
+    timings of the current request, if they are being collected.
+    \f
+    :param stage: one of the STAGE_ constants
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage_duration(stage, time.perf_counter() - start)
+
+
+def observe_stage_duration(stage: str, duration: float) -> None:
+    """
+    Records the given duration of a stage, measured without observe_stage
+    because the stage does not run in a single block. The duration is also
+    added to the stage timings of the current request, if they are being collected.
+    \f
+    :param stage: one of the STAGE_ constants
+    :param duration: seconds spent in the stage
+    """
+    stage_duration.labels(stage=stage).observe(duration)
+    add_stage_timings({stage: duration})
+
+
+def start_stage_timings() -> Dict[str, float]:
+    """
+    Starts collecting the stage timings of the current context,
+    the tasks and threads started from it add their timings to the same dict
+    \f
+    :return: the seconds spent in each stage, filled while the stages run
+    """
+    timings: Dict[str, float] = {}
+    _stage_timings.set(timings)
+    return timings
+
+
+def add_stage_timings(timings: Dict[str, float]) -> None:
+    """
+    Adds the given durations to the stage timings of the current context,
+    if they are being collected
+    \f
+    :param timings: seconds spent in each stage, for example by a process pool
+    """
+    current = _stage_timings.get()
+    if current is None:
+        return
+    for stage, duration in timings.items():
+        current[stage] = current.get(stage, 0) + duration
+
+
+def start_cache_statuses() -> List[str]:
+    """
+    Starts collecting how the renditions of the current context were served
+    \f
+    :return: the cache statuses, filled when the renditions are served
+    """
+    statuses: List[str] = []
+    _cache_statuses.set(statuses)
+    return statuses
+
+
+def add_cache_status(cache_status: str) -> None:
+    """
+    Records that a rendition of the current context was not created by it,
+    if the cache statuses are being collected
+    \f
+    :param cache_status: CACHE_HIT or CACHE_COALESCED
+    """
+    current = _cache_statuses.get()
+    if current is not None:
+        current.append(cache_status)
+
+
+def is_multiprocess() -> bool:
+    """
+    \f
+    :return: True if the metrics are written by every gunicorn worker
+     (and process pool) in PROMETHEUS_MULTIPROC_DIR, False if they are
+     kept in the memory of the current process
+    """
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def export_metrics() -> Tuple[bytes, str]:
+    """
+    Exports the metrics in the Prometheus text format. In multiprocess mode
+    they are aggregated across all the processes, so that every worker
+    answering the scrape returns the same values.
+    \f
+    :return: the exported metrics and their content type
+    """
+    registry = REGISTRY
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _get_route_label(scope: Scope) -> str:
+    # the path template and not the path, which contains ids and sizes
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _get_service_type_label(scope: Scope) -> str:
+    for parameter in scope.get("query_string", b"").decode("latin-1").split("&"):
+        name, _, value = parameter.partition("=")
+        if name == "service_type" and value in SERVICE_TYPE_VALUES:
+            return value
+    return NO_LABEL
+
+
+def _has_server_timing(scope: Scope) -> bool:
+    # only the image, pdf and document routes, not the health and metrics ones
+    return _get_route_label(scope).startswith(f"/{SERVICE_NAME}/")
+
+
+def _format_server_timing(
+    timings: Dict[str, float],
+    cache_statuses: List[str],
+    total: float,
+) -> bytes:
+    return ", ".join(
+        [
+            *(f"cache;desc={status}" for status in dict.fromkeys(cache_statuses)),
+            *(
+                f"{stage};dur={duration * 1000:.1f}"
+                for stage, duration in [*timings.items(), ("total", total)]
+            ),
+        ],
+    ).encode("latin-1")
+
+
+def _get_format_label(message: Message) -> str:
+    # the subtype of the response media type: jpeg, png, gif, pdf, mixed...
+    for name, value in message.get("headers", []):
+        if name.lower() == b"content-type":
+            media_type = value.decode("latin-1").split(";")[0]
+            return media_type.rpartition("/")[2] or NO_LABEL
+    return NO_LABEL
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting the requests and measuring their duration
+    and the time spent writing the response. When ENABLE_SERVER_TIMING
+    is set it also adds the Server-Timing header to the renditions,
+    with the time spent in each stage and the total time. The renditions
+    taken from the cache or from an identical request have a cache entry
+    instead of the stages.
+    """
+
+    def __init__(self: "MetricsMiddleware", app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self: "MetricsMiddleware",
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        labels = {"format": NO_LABEL, "status": "500"}
+        write_start = start
+        timings = start_stage_timings() if ENABLE_SERVER_TIMING else None
+        cache_statuses = start_cache_statuses() if ENABLE_SERVER_TIMING else []
+
+        async def send_and_observe(message: Message) -> None:
+            nonlocal write_start
+            if message["type"] == "http.response.start":
+                labels["status"] = str(message["status"])
+                labels["format"] = _get_format_label(message)
+                write_start = time.perf_counter()
+                if timings is not None and _has_server_timing(scope):
+                    server_timing = _format_server_timing(
+                        timings,
+                        cache_statuses,
+                        write_start - start,
+                    )
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (b"server-timing", server_timing),
+                        ],
+                    }
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body",
+                False,
+            ):
+                stage_duration.labels(stage=STAGE_RESPONSE_WRITE).observe(
+                    time.perf_counter() - write_start,
+                )
+
+        try:
+            await self.app(scope, receive, send_and_observe)
+        finally:
+            request_labels = {
+                "route": _get_route_label(scope),
+                "service_type": _get_service_type_label(scope),
+                **labels,
+            }
+            requests_total.labels(**request_labels).inc()
+            request_duration.labels(**request_labels).observe(
+                time.perf_counter() - start,
+            )
@@ -1,20 +1,36 @@
 # SPDX-FileCopyrightText: 2022 Zextras <https://www.zextras.com
 #
 # SPDX-License-Identifier: AGPL-3.0-only
+import asyncio
+import functools
 import io
-from typing import TYPE_CHECKING
+import logging
+from typing import IO, Any, List, Tuple
 
-from fastapi import UploadFile, status
+from fastapi import HTTPException, UploadFile, status
 from fastapi.responses import Response as FastApiResp
-from httpx import Response as RequestResp
+from fastapi.responses import StreamingResponse
+from PIL import Image
 
-from app.core.resources.data_validator import check_for_storage_response_error
+from app.core.resources.app_config import (
+    PAGE_THUMBNAILS_MAX_FILE_SIZE,
+    PAGE_THUMBNAILS_MAX_PAGES,
+    STORAGE_SPOOL_SIZE,
+)
+from app.core.resources.constants import message
+from app.core.resources.constants.service import STREAMING_CHUNK_SIZE
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.page_thumbnails_layout_enum import (
+    PageThumbnailsLayoutEnum,
+)
 from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
+from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
+from app.core.services import batch_service, image_service, task_executor
 from app.core.services.document_manipulation import document_manipulation
-from app.core.services.storage_communication import retrieve_data
+from app.core.services.image_manipulation import image_manipulation
+from app.core.services.storage_communication import retrieve_and_process
 
-if TYPE_CHECKING:
-    from returns.maybe import Maybe
+logger = logging.getLogger(__name__)
 
 
 async def retrieve_pdf_and_create_preview(
@@ -35,100 +51,505 @@ async def retrieve_pdf_and_create_preview(
     :param service_type: service that owns the resource
     :return response: a Response with metadata or error message.
     """
-    response_data: Maybe[RequestResp] = await retrieve_data(
+
+    async def _split(content: IO[bytes]) -> FastApiResp:
+        if _is_full_range(first_page_number, last_page_number) and (
+            document_manipulation.has_pdf_header(content)
+        ):
+            return _create_unchanged_pdf_response(content)
+        split_content: io.BytesIO = await task_executor.run_cpu_bound(
+            document_manipulation.split_pdf,
+            first_page_number=first_page_number,
+            last_page_number=last_page_number,
+            content=content,
+        )
+        return FastApiResp(
+            content=split_content.read(),
+            media_type="application/pdf",
+        )
+
+    return await retrieve_and_process(
         file_id=file_id,
         version=version,
         service_type=service_type,
-    )
-
-    response_error: Maybe[FastApiResp] = check_for_storage_response_error(
-        response_data=response_data,
-    )
-    return response_error.value_or(
-        FastApiResp(
-            content=document_manipulation.split_pdf(
-                first_page_number=first_page_number,
-                last_page_number=last_page_number,
-                content=io.BytesIO(
-                    response_data.value_or(
-                        RequestResp(status_code=status.HTTP_200_OK),
-                    ).content,
-                ),
-            ).read(),
-            media_type="application/pdf",
-        ),
+        process=_split,
     )
 
 
-def create_preview_from_raw(
+async def create_preview_from_raw(
     file: UploadFile,
     first_page_number: int,
     last_page_number: int,
-) -> io.BytesIO:
+) -> IO[bytes]:
     """
-    Splits a given pdf of
+    Splits a given pdf of, if all the pages are requested
+    the uploaded pdf is returned unchanged
     :param file: uploaded pdf to split
     :param first_page_number: the first page of the pdf to return
     :param last_page_number: the last page of the pdf to return
     """
-    return document_manipulation.split_pdf(
+    if _is_full_range(first_page_number, last_page_number) and (
+        document_manipulation.has_pdf_header(file.file)
+    ):
+        return file.file
+    return await task_executor.run_cpu_bound(
+        document_manipulation.split_pdf,
         first_page_number=first_page_number,
         last_page_number=last_page_number,
-        content=io.BytesIO(file.file.read()),
+        content=file.file,
+    )
+
+
+def _is_full_range(first_page_number: int, last_page_number: int) -> bool:
+    return first_page_number == 1 and last_page_number == 0
+
+
+def _create_unchanged_pdf_response(content: IO[bytes]) -> FastApiResp:
+    """
+    Returns the pdf as it is, without opening it with PDFium.
+    A pdf kept in memory is returned as a plain response, so that it can be
+    cached, a pdf written on disk is streamed from the file
+    :param content: pdf to return, positioned at its start
+    :return: the response containing the pdf
+    """
+    size = content.seek(0, io.SEEK_END)
+    content.seek(0)
+    if size <= STORAGE_SPOOL_SIZE:
+        return FastApiResp(content=content.read(), media_type="application/pdf")
+    return StreamingResponse(
+        content=iter(functools.partial(content.read, STREAMING_CHUNK_SIZE), b""),
+        media_type="application/pdf",
+        headers={"Content-Length": str(size)},
     )
 
 
-def create_thumbnail_from_raw(file: UploadFile, output_format: str) -> io.BytesIO:
+async def create_thumbnail_from_raw(
+    file: UploadFile,
+    img_metadata: ThumbnailImageMetadata,
+) -> io.BytesIO:
     """
     Create image thumbnail of a given pdf
     :param file: uploaded pdf to convert
-    :param output_format: the image type that the thumbnail will have
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :return: Raw bytes of the thumbnail
     """
-    return document_manipulation.convert_pdf_to_image(
-        content=io.BytesIO(file.file.read()),
-        output_extension=output_format,
-        page_number=0,
-    )
+    return await create_thumbnail(content=file.file, img_metadata=img_metadata)
+
+
+async def create_thumbnail(
+    content: IO[bytes],
+    img_metadata: ThumbnailImageMetadata,
+) -> io.BytesIO:
+    """
+    Create image thumbnail of the first page of a given pdf
+    :param content: pdf to convert
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :return: Raw bytes of the thumbnail
+    :raises: HTTPException 400 if the pdf or the metadata are not valid
+    """
+    try:
+        return await task_executor.run_cpu_bound(
+            _create_thumbnail,
+            content=content,
+            img_metadata=img_metadata,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        ) from None
 
 
 async def retrieve_pdf_and_create_thumbnail(
     file_id: str,
     version: int,
-    output_format: str,
+    img_metadata: ThumbnailImageMetadata,
     service_type: ServiceTypeEnum,
 ) -> FastApiResp:
     """
     Contact storage and retrieves the PDF with the nodeid requested
-    and converts it to image.
+    and converts its first page to a thumbnail.
     If the nodeid is not found returns Generic error specifying the error code
     :param file_id: UUID of the pdf
     :param version: version of the file
-    :param output_format: format
+    :param img_metadata: Instance of ThumbnailImageMetadata class
     :param service_type: service that owns the resource
     :return response: a Response with metadata or error message.
     """
-    response_data: Maybe[RequestResp] = await retrieve_data(
+
+    async def _convert(content: IO[bytes]) -> FastApiResp:
+        image_content: io.BytesIO = await create_thumbnail(
+            content=content,
+            img_metadata=img_metadata,
+        )
+        return FastApiResp(
+            content=image_content.read(),
+            media_type=f"image/{img_metadata.format.value}",
+        )
+
+    return await retrieve_and_process(
+        file_id=file_id,
+        version=version,
+        service_type=service_type,
+        process=_convert,
+    )
+
+
+async def create_page_thumbnails_from_raw(
+    file: UploadFile,
+    first_page_number: int,
+    last_page_number: int,
+    img_metadata: ThumbnailImageMetadata,
+    layout: PageThumbnailsLayoutEnum,
+) -> FastApiResp:
+    """
+    Create the thumbnails of a range of pages of a given pdf
+    :param file: uploaded pdf to convert
+    :param first_page_number: first page to convert
+    :param last_page_number: last page to convert, 0 for the last of the pdf
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param layout: whether to return a thumbnail for each page or a contact sheet
+    :return: multipart response with a thumbnail for each page or the contact sheet
+    """
+    return await create_page_thumbnails(
+        content=file.file,
+        first_page_number=first_page_number,
+        last_page_number=last_page_number,
+        img_metadata=img_metadata,
+        layout=layout,
+    )
+
+
+async def retrieve_pdf_and_create_page_thumbnails(
+    file_id: str,
+    version: int,
+    first_page_number: int,
+    last_page_number: int,
+    img_metadata: ThumbnailImageMetadata,
+    layout: PageThumbnailsLayoutEnum,
+    service_type: ServiceTypeEnum,
+) -> FastApiResp:
+    """
+    Contact storage and retrieves the PDF with the nodeid requested
+    and converts a range of its pages to thumbnails.
+    If the nodeid is not found returns Generic error specifying the error code
+    :param file_id: UUID of the pdf
+    :param version: version of the file
+    :param first_page_number: first page to convert
+    :param last_page_number: last page to convert, 0 for the last of the pdf
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param layout: whether to return a thumbnail for each page or a contact sheet
+    :param service_type: service that owns the resource
+    :return response: a Response with the thumbnails or error message.
+    """
+    return await retrieve_and_process(
         file_id=file_id,
         version=version,
         service_type=service_type,
+        process=functools.partial(
+            create_page_thumbnails,
+            first_page_number=first_page_number,
+            last_page_number=last_page_number,
+            img_metadata=img_metadata,
+            layout=layout,
+        ),
+    )
+
+
+async def create_page_thumbnails(
+    content: IO[bytes],
+    first_page_number: int,
+    last_page_number: int,
+    img_metadata: ThumbnailImageMetadata,
+    layout: PageThumbnailsLayoutEnum,
+) -> FastApiResp:
+    """
+    Renders the thumbnails of a range of pages of the pdf. pdfium is not
+    thread safe, so the pages are rendered in the process pool: they are split
+    in a chunk for each process, so that they are spread across the CPU cores
+    and the pdf is sent once to each process instead of once for each page.
+    Only the rendering processes hold a full size page,
+    the response contains at most PAGE_THUMBNAILS_MAX_PAGES thumbnails.
+    The pdf is still copied in memory and in each rendering process,
+    so pdfs bigger than PAGE_THUMBNAILS_MAX_FILE_SIZE are refused before reading them.
+    :param content: pdf to convert
+    :param first_page_number: first page to convert
+    :param last_page_number: last page to convert, 0 for the last of the pdf
+    (at most PAGE_THUMBNAILS_MAX_PAGES pages after the first)
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param layout: whether to return a thumbnail for each page or a contact sheet
+    :return: multipart response with a part for each page, its Content-ID
+    is the page number, or the contact sheet image
+    :raises: HTTPException 400 if the pdf or the page range are not valid,
+    413 if the pdf is bigger than PAGE_THUMBNAILS_MAX_FILE_SIZE
+    """
+    size = content.seek(0, io.SEEK_END)
+    content.seek(0)
+    if size > PAGE_THUMBNAILS_MAX_FILE_SIZE:
+        logger.info(
+            f"Pdf of {size} bytes exceeds {PAGE_THUMBNAILS_MAX_FILE_SIZE} "
+            "for page thumbnails",
+        )
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=message.FILE_TOO_LARGE,
+        )
+    page_numbers = await _get_page_numbers(
+        content=content,
+        first_page_number=first_page_number,
+        last_page_number=last_page_number,
     )
+    if layout == PageThumbnailsLayoutEnum.CONTACT_SHEET and (
+        img_metadata.format == ImageTypeEnum.GIF
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=message.FORMAT_NOT_SUPPORTED_ERROR,
+        )
+    # the pdf is read once, counting its pages may have moved the file position
+    content.seek(0)
+    raw_pdf: io.BytesIO = await task_executor.to_picklable(content)
+    if layout == PageThumbnailsLayoutEnum.CONTACT_SHEET:
+        return await _create_contact_sheet_response(
+            raw_pdf=raw_pdf,
+            page_numbers=page_numbers,
+            img_metadata=img_metadata,
+        )
 
-    response_error: Maybe[FastApiResp] = check_for_storage_response_error(
-        response_data=response_data,
+    thumbnails = await _render_page_thumbnails(
+        raw_pdf=raw_pdf,
+        page_numbers=page_numbers,
+        img_metadata=img_metadata,
     )
-    return response_error.value_or(
-        FastApiResp(
-            content=(
-                document_manipulation.convert_pdf_to_image(
-                    content=io.BytesIO(
-                        response_data.value_or(
-                            RequestResp(status_code=status.HTTP_200_OK),
-                        ).content,
+    return batch_service.create_multipart_response(
+        [
+            (
+                {"Content-ID": str(page_number + 1)},
+                FastApiResp(
+                    content=thumbnail,
+                    status_code=status_code,
+                    media_type=(
+                        f"image/{img_metadata.format.value}"
+                        if status_code == status.HTTP_200_OK
+                        else None
                     ),
-                    output_extension=output_format,
-                    page_number=0,
-                )
-            ).read(),
-            media_type=f"image/{output_format}",
+                ),
+            )
+            for page_number, (status_code, thumbnail) in zip(page_numbers, thumbnails)
+        ],
+    )
+
+
+async def _get_page_numbers(
+    content: IO[bytes],
+    first_page_number: int,
+    last_page_number: int,
+) -> List[int]:
+    """
+    Checks the requested range against the number of pages of the pdf
+    :param content: pdf to convert, the file is opened in place when possible
+    :param first_page_number: first page to convert, starting from 1
+    :param last_page_number: last page to convert, 0 for the last of the pdf
+    :return: the indexes, starting from 0, of the pages to convert
+    :raises: HTTPException 400 if the pdf or the page range are not valid
+    """
+    number_of_pages: int = await task_executor.run_cpu_bound(
+        document_manipulation.count_pdf_pages,
+        content=content,
+    )
+    if first_page_number > number_of_pages:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=message.FIRST_PAGE_OUT_OF_RANGE,
+        )
+    if last_page_number == 0:
+        last_page_number = first_page_number + PAGE_THUMBNAILS_MAX_PAGES - 1
+    elif last_page_number - first_page_number >= PAGE_THUMBNAILS_MAX_PAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=message.TOO_MANY_PAGES,
+        )
+    return list(range(first_page_number - 1, min(last_page_number, number_of_pages)))
+
+
+async def _render_page_thumbnails(
+    raw_pdf: io.BytesIO,
+    page_numbers: List[int],
+    img_metadata: ThumbnailImageMetadata,
+) -> List[Tuple[int, Any]]:
+    """
+    Renders the thumbnails of the pages in the process pool, with a task
+    for each process rendering a chunk of the pages. The pages are
+    interleaved across the chunks, so that the slow pages of a section
+    of the pdf are not all rendered by the same process.
+    A failing page or chunk does not stop the others, its error
+    is returned in place of its thumbnail.
+    :param raw_pdf: pdf to convert
+    :param page_numbers: pages to convert, starting from 0
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :return: for each page, in the same order, 200 and the raw bytes
+    of the thumbnail, or the status code and detail of its error
+    """
+    chunks = min(len(page_numbers), task_executor.get_process_pool_size())
+    chunk_results = await asyncio.gather(
+        *(
+            task_executor.run_in_process(
+                _create_thumbnails,
+                content=raw_pdf,
+                img_metadata=img_metadata,
+                page_numbers=page_numbers[chunk::chunks],
+            )
+            for chunk in range(chunks)
+        ),
+        return_exceptions=True,
+    )
+    thumbnails: List[Tuple[int, Any]] = [(0, None)] * len(page_numbers)
+    for chunk, result in enumerate(chunk_results):
+        chunk_size = len(page_numbers[chunk::chunks])
+        if isinstance(result, HTTPException):
+            thumbnails[chunk::chunks] = [
+                (result.status_code, str(result.detail)),
+            ] * chunk_size
+        elif isinstance(result, BaseException):
+            logger.error("Unexpected error rendering the pages", exc_info=result)
+            thumbnails[chunk::chunks] = [
+                (status.HTTP_500_INTERNAL_SERVER_ERROR, message.RENDITION_FAILED),
+            ] * chunk_size
+        else:
+            thumbnails[chunk::chunks] = result
+    return thumbnails
+
+
+async def _create_contact_sheet_response(
+    raw_pdf: io.BytesIO,
+    page_numbers: List[int],
+    img_metadata: ThumbnailImageMetadata,
+) -> FastApiResp:
+    """
+    Renders the thumbnail of every page as a lossless PNG
+    and pastes them in a contact sheet of the requested format
+    :param raw_pdf: pdf to convert
+    :param page_numbers: pages to convert, starting from 0
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :return: response with the contact sheet
+    :raises: HTTPException with the error of the first page that failed
+    """
+    thumbnails = await _render_page_thumbnails(
+        raw_pdf=raw_pdf,
+        page_numbers=page_numbers,
+        img_metadata=img_metadata.model_copy(update={"format": ImageTypeEnum.PNG}),
+    )
+    for status_code, thumbnail in thumbnails:
+        if status_code != status.HTTP_200_OK:
+            raise HTTPException(status_code=status_code, detail=thumbnail)
+    sheet_content: io.BytesIO = await task_executor.run_cpu_bound(
+        _create_contact_sheet,
+        thumbnails=[io.BytesIO(thumbnail) for _, thumbnail in thumbnails],
+        img_metadata=img_metadata,
+    )
+    return FastApiResp(
+        content=sheet_content.read(),
+        media_type=f"image/{img_metadata.format.value}",
+    )
+
+
+def _create_contact_sheet(
+    thumbnails: List[io.BytesIO],
+    img_metadata: ThumbnailImageMetadata,
+) -> io.BytesIO:
+    """
+    Pastes the thumbnails in a contact sheet of the requested format
+    :param thumbnails: PNG thumbnails of the pages
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :return: Raw bytes of the contact sheet
+    """
+    sheet = image_manipulation.create_contact_sheet(
+        images=[Image.open(thumbnail) for thumbnail in thumbnails],
+        transparent=img_metadata.format != ImageTypeEnum.JPEG,
+    )
+    return image_manipulation.save_image_to_buffer(
+        img=sheet,
+        _format=img_metadata.format.value.upper(),
+        _optimize=False,
+        _quality_value=(
+            img_metadata.quality.get_webp_int_quality()
+            if img_metadata.format == ImageTypeEnum.WEBP
+            else img_metadata.quality.get_jpeg_int_quality()
         ),
+        _jpeg_profile=img_metadata.quality.get_jpeg_encoder_profile(),
+    )
+
+
+def _create_thumbnails(
+    content: IO[bytes],
+    img_metadata: ThumbnailImageMetadata,
+    page_numbers: List[int],
+) -> List[Tuple[int, Any]]:
+    """
+    Renders the thumbnails of a chunk of pages in a single task,
+    returning the error of a page in place of its thumbnail
+    :param content: pdf to convert
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param page_numbers: pages to convert, starting from 0
+    :return: for each page, 200 and the raw bytes of the thumbnail,
+    or the status code and detail of its error
+    """
+    return [
+        _create_thumbnail_or_error(
+            content=content,
+            img_metadata=img_metadata,
+            page_number=page_number,
+        )
+        for page_number in page_numbers
+    ]
+
+
+def _create_thumbnail_or_error(
+    content: IO[bytes],
+    img_metadata: ThumbnailImageMetadata,
+    page_number: int,
+) -> Tuple[int, Any]:
+    """
+    Renders the thumbnail of a page of the chunk, HTTPException cannot
+    be pickled so the error is returned as its status code and detail
+    :param content: pdf to convert
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param page_number: page to convert, starting from 0
+    :return: 200 and the raw bytes of the thumbnail,
+    or the status code and detail of its error
+    """
+    try:
+        thumbnail = _create_thumbnail(
+            content=content,
+            img_metadata=img_metadata,
+            page_number=page_number,
+        )
+    except HTTPException as e:
+        return e.status_code, str(e.detail)
+    except ValueError as e:
+        return status.HTTP_400_BAD_REQUEST, str(e)
+    return status.HTTP_200_OK, thumbnail.getvalue()
+
+
+def _create_thumbnail(
+    content: IO[bytes],
+    img_metadata: ThumbnailImageMetadata,
+    page_number: int = 0,
+) -> io.BytesIO:
+    """
+    Renders the page of the pdf at the scale needed by the thumbnail
+    and creates the thumbnail from the rendered page,
+    without encoding and decoding it in between
+    :param content: pdf to convert
+    :param img_metadata: Instance of ThumbnailImageMetadata class
+    :param page_number: page to convert, starting from 0
+    :return: Raw bytes of the thumbnail
+    :raises: ValueError if the format is not supported
+    """
+    page = document_manipulation.render_pdf_page(
+        content=content,
+        page_number=page_number,
+        requested_x=img_metadata.width,
+        requested_y=img_metadata.height,
     )
+    return image_service.render_from_image(img_metadata=img_metadata, img=page)
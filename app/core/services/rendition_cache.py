@@ -0,0 +1,344 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+from fastapi import status
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.resources.app_config import RENDITION_CACHE_MAX_SIZE, RENDITION_CACHE_TTL
+from app.core.resources.schemas.rendition_key import RenditionKey
+from app.core.services.metrics import CACHE_COALESCED, CACHE_HIT, add_cache_status
+
+logger = logging.getLogger(__name__)
+
+
+class CachedRendition(NamedTuple):
+    content: bytes
+    media_type: Optional[str]
+    expires_at: float
+
+
+class RenditionCache:
+    """
+    In memory LRU cache of rendered files, bounded by the total size
+    in bytes of the cached renditions. Every entry expires after ttl seconds.
+    It is not thread safe: it must only be used from the event loop.
+    """
+
+    def __init__(self: "RenditionCache", max_size: int, ttl: int) -> None:
+        """
+        \f
+        :param max_size: max total size in bytes of the cached renditions,
+         0 disables the cache
+        :param ttl: seconds after which a cached rendition expires
+        """
+        self.max_size: int = max_size
+        self.ttl: int = ttl
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: "OrderedDict[RenditionKey, CachedRendition]" = OrderedDict()
+
+    def get(self: "RenditionCache", key: RenditionKey) -> Optional[CachedRendition]:
+        """
+        Returns the rendition with the given key marking it as the most
+        recently used one, expired renditions are removed and not returned
+        \f
+        :param key: parameters identifying the rendition
+        :return: the cached rendition or None if it's missing or expired
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self: "RenditionCache",
+        key: RenditionKey,
+        content: bytes,
+        media_type: Optional[str],
+    ) -> None:
+        """
+        Caches the given rendition, evicting the least recently used ones
+        until the cache fits in max_size. Renditions bigger than max_size
+        are never cached.
+        \f
+        :param key: parameters identifying the rendition
+        :param content: raw bytes of the rendition
+        :param media_type: media type of the rendition
+        """
+        if len(content) > self.max_size:
+            return
+        if key in self._entries:
+            self._remove(key)
+        while self.size + len(content) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        self._entries[key] = CachedRendition(
+            content=content,
+            media_type=media_type,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self.size += len(content)
+
+    def clear(self: "RenditionCache") -> None:
+        """
+        Removes every rendition and resets the counters
+        """
+        self._entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self: "RenditionCache") -> Dict[str, int]:
+        """
+        \f
+        :return: hit, miss and eviction counters, number of entries and size in bytes
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_size,
+        }
+
+    def _remove(self: "RenditionCache", key: RenditionKey) -> None:
+        self.size -= len(self._entries.pop(key).content)
+
+
+rendition_cache = RenditionCache(
+    max_size=RENDITION_CACHE_MAX_SIZE,
+    ttl=RENDITION_CACHE_TTL,
+)
+
+# requests that waited for the rendition of an identical request
+# instead of fetching and rendering it again
+single_flight_stats: Dict[str, int] = {"coalesced_renders": 0}
+
+
+class _Flight:
+    """
+    Rendition being created for every request with the same key
+    """
+
+    def __init__(self: "_Flight", task: "asyncio.Future[Response]") -> None:
+        self.task: "asyncio.Future[Response]" = task
+        self.waiters: int = 0
+        self.claimed: bool = False
+
+
+_flights: Dict[RenditionKey, _Flight] = {}
+
+
+def compute_etag(key: RenditionKey) -> str:
+    """
+    Builds the ETag of a rendition from its parameters. A version of a file
+    never changes, so the same parameters always identify the same rendition.
+    It is a weak ETag: the renditions are equivalent but the encoders
+    do not guarantee that they are identical byte by byte.
+    \f
+    :param key: parameters identifying the rendition
+    :return: the quoted ETag
+    """
+    digest = hashlib.sha256(key.model_dump_json().encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def is_not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Compares the If-None-Match header with the ETag of the rendition,
+    using the weak comparison as required for GET requests.
+    The * wildcard is not a match: the file would have to be fetched
+    to know whether it exists.
+    \f
+    :param if_none_match: value of the If-None-Match header, if any
+    :param etag: the quoted ETag of the rendition
+    :return: True if the client already has the rendition
+    """
+    if if_none_match is None:
+        return False
+    tags = [_get_opaque_tag(tag.strip()) for tag in if_none_match.split(",")]
+    return _get_opaque_tag(etag) in tags
+
+
+def _get_opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _is_rendition(response: Response) -> bool:
+    # error responses and empty bodies must not be cached by the service nor
+    # by the clients, which would revalidate them forever with their ETag
+    if isinstance(response, StreamingResponse):
+        return response.status_code == status.HTTP_200_OK
+    return response.status_code == status.HTTP_200_OK and len(response.body) > 0
+
+
+def _add_cache_headers(
+    response: Response,
+    etag: str,
+    cache_control: str,
+    vary: str,
+) -> Response:
+    if _is_rendition(response) or response.status_code == status.HTTP_304_NOT_MODIFIED:
+        response.headers["ETag"] = etag
+        if cache_control:
+            response.headers["Cache-Control"] = cache_control
+        if vary:
+            response.headers["Vary"] = vary
+    return response
+
+
+async def get_or_render(
+    key: RenditionKey,
+    render: Callable[[], Awaitable[Response]],
+    if_none_match: Optional[str] = None,
+    cache_control: str = "",
+    vary: str = "",
+) -> Response:
+    """
+    Returns the cached rendition with the given key, if missing
+    it calls render and caches its response when successful.
+    Error and streamed responses are never cached.
+    Concurrent requests with the same key share a single call to render.
+    Successful responses have the ETag of the rendition and
+    the given Cache-Control header, when the client already has
+    the rendition a 304 is returned without rendering it.
+    \f
+    :param key: parameters identifying the rendition
+    :param render: coroutine function that creates the rendition response
+    :param if_none_match: value of the If-None-Match header, if any
+    :param cache_control: value of the Cache-Control header, empty to omit it
+    :param vary: value of the Vary header, empty to omit it
+    :return: the response containing the rendition
+    """
+    etag = compute_etag(key)
+    if is_not_modified(if_none_match, etag):
+        logger.debug(f"Rendition not modified for {key}")
+        return _add_cache_headers(
+            Response(status_code=status.HTTP_304_NOT_MODIFIED),
+            etag,
+            cache_control,
+            vary,
+        )
+
+    response = await _get_or_render(key, render)
+    return _add_cache_headers(response, etag, cache_control, vary)
+
+
+async def _get_or_render(
+    key: RenditionKey,
+    render: Callable[[], Awaitable[Response]],
+) -> Response:
+    """
+    Returns the cached rendition with the given key or the one
+    in flight for the same key, calling render if both are missing
+    \f
+    :param key: parameters identifying the rendition
+    :param render: coroutine function that creates the rendition response
+    :return: the response containing the rendition
+    """
+    if rendition_cache.max_size > 0:
+        cached = rendition_cache.get(key)
+        if cached is not None:
+            logger.debug(f"Rendition cache hit for {key}")
+            add_cache_status(CACHE_HIT)
+            return Response(content=cached.content, media_type=cached.media_type)
+
+    flight = _flights.get(key)
+    # a cancelled rendition cannot be joined, a new one is started
+    if flight is None or flight.task.cancelled():
+        flight = _start_flight(key, render)
+    else:
+        single_flight_stats["coalesced_renders"] += 1
+        add_cache_status(CACHE_COALESCED)
+        logger.debug(f"Waiting for the rendition in flight for {key}")
+
+    flight.waiters += 1
+    try:
+        # the shield keeps the rendition going when this request is cancelled
+        response = await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters == 1 and not flight.task.done():
+            # the task is cancelled only at its next step, the requests
+            # arriving in the meantime must not join it
+            _remove_flight(key, flight)
+            flight.task.cancel()
+        raise
+    finally:
+        flight.waiters -= 1
+
+    if isinstance(response, StreamingResponse):
+        # the body of a streamed response can be sent only once
+        if flight.claimed:
+            return await render()
+        flight.claimed = True
+        return response
+    return Response(
+        content=response.body,
+        status_code=response.status_code,
+        headers=dict(response.headers),
+        media_type=response.media_type,
+    )
+
+
+def _start_flight(
+    key: RenditionKey,
+    render: Callable[[], Awaitable[Response]],
+) -> _Flight:
+    """
+    Starts the rendition of the given key, that the requests
+    with the same key join until it completes
+    \f
+    :param key: parameters identifying the rendition
+    :param render: coroutine function that creates the rendition response
+    :return: the flight of the rendition
+    """
+    flight = _Flight(asyncio.ensure_future(_render_and_cache(key, render)))
+    _flights[key] = flight
+    flight.task.add_done_callback(lambda _: _remove_flight(key, flight))
+    return flight
+
+
+def _remove_flight(key: RenditionKey, flight: _Flight) -> None:
+    # a new flight could have replaced a cancelled one with the same key
+    if _flights.get(key) is flight:
+        del _flights[key]
+
+
+async def _render_and_cache(
+    key: RenditionKey,
+    render: Callable[[], Awaitable[Response]],
+) -> Response:
+    """
+    Calls render and caches its response when it is a rendition
+    \f
+    :param key: parameters identifying the rendition
+    :param render: coroutine function that creates the rendition response
+    :return: the response containing the rendition
+    """
+    response = await render()
+    # streamed responses are files too big to be read in memory
+    if (
+        rendition_cache.max_size > 0
+        and _is_rendition(response)
+        and not isinstance(response, StreamingResponse)
+    ):
+        rendition_cache.put(key, bytes(response.body), response.media_type)
+    return response
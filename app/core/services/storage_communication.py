@@ -1,44 +1,115 @@
 # SPDX-FileCopyrightText: 2022 Zextras <https://www.zextras.com
 #
 # SPDX-License-Identifier: AGPL-3.0-only
+import io
 import logging
+import tempfile
+from typing import IO, Awaitable, Callable, Dict
 
 import httpx
-from httpx import Response
+from fastapi import status
+from fastapi.responses import Response as FastApiResp
+from fastapi.responses import StreamingResponse
 from returns.maybe import Maybe, Nothing
+from starlette.background import BackgroundTask
 
-from app.core.resources.app_config import STORAGE_DOWNLOAD_API, STORAGE_FULL_ADDRESS
+from app.core.resources.app_config import (
+    STORAGE_DOWNLOAD_API,
+    STORAGE_FULL_ADDRESS,
+    STORAGE_MAX_FILE_SIZE,
+    STORAGE_SPOOL_SIZE,
+)
+from app.core.resources.data_validator import check_for_storage_response_error
 from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
+from app.core.resources.schemas.storage_file import StorageFile
+from app.core.services import http_clients
+from app.core.services.metrics import STAGE_STORAGE_FETCH, observe_stage
 
 logger = logging.getLogger(__name__)
 
+# work that is not done anymore because the storage returned an error
+error_path_stats: Dict[str, int] = {
+    "skipped_renders": 0,
+    "skipped_docs_editor_calls": 0,
+}
+
+
+class _SpooledFile(tempfile.SpooledTemporaryFile):
+    """
+    SpooledTemporaryFile implements readinto only from python 3.11,
+    pdfium needs it to read the file without copying it
+    """
+
+    def readinto(self: "_SpooledFile", buffer: bytearray) -> int:
+        return self._file.readinto(buffer)
+
+
+def _file_too_large(log: logging.Logger, req: str, size: int) -> Maybe[StorageFile]:
+    log.info(f"File of {size} bytes exceeds {STORAGE_MAX_FILE_SIZE} for request {req}")
+    return Maybe.from_value(
+        StorageFile(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content=io.BytesIO(),
+        ),
+    )
+
+
+async def _stream_to_file(
+    resp: httpx.Response,
+    req: str,
+    log: logging.Logger,
+) -> Maybe[StorageFile]:
+    """
+    Writes the body of the response in a spooled file, one chunk at a time
+    \f
+    :param resp: successful storage response, with the body not read yet
+    :param req: requested url, used for logging
+    :param log: logging used to keep track of errors and program flow
+    :return: the downloaded file, or a file with status 413 if it's too large
+    """
+    content_length = int(resp.headers.get("Content-Length", 0))
+    if content_length > STORAGE_MAX_FILE_SIZE:
+        return _file_too_large(log, req, content_length)
+
+    content: IO[bytes] = _SpooledFile(max_size=STORAGE_SPOOL_SIZE)
+    async for chunk in resp.aiter_bytes():
+        if content.tell() + len(chunk) > STORAGE_MAX_FILE_SIZE:
+            content.close()
+            return _file_too_large(log, req, resp.num_bytes_downloaded)
+        content.write(chunk)
+    content.seek(0)
+    log.info(f"[Requested: {req}, Response: {resp}]")
+    return Maybe.from_value(StorageFile(status_code=resp.status_code, content=content))
+
 
 async def retrieve_data(
     file_id: str,
     version: int = 1,
     service_type: ServiceTypeEnum = ServiceTypeEnum.FILES,
     log: logging.Logger = logger,
-) -> Maybe[Response]:
+) -> Maybe[StorageFile]:
     """
-    Retrieves given node and version from the config storage
+    Retrieves given node and version from the config storage.
+    The file is streamed in memory, or in a temporary file when it's bigger
+    than the configured spool size. If it's bigger than the maximum file size
+    the download is stopped and a file with status 413 is returned.
     :param file_id: Unique identifier (UUID4) of the file
     :param version: Version of the file (Default 1)
     :param log: logging used to keep track of errors and program flow
     :param service_type: service that owns the resource
-    :return: Maybe response,
+    :return: Maybe storage file,
     if there was a problem connecting with storage returns None,
-     otherwise returns storage response
+     otherwise returns the downloaded file
     """
     req = (
         f"{STORAGE_FULL_ADDRESS}/{STORAGE_DOWNLOAD_API}"
         + f"?node={file_id}&version={version}&type={service_type.value}"
     )
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(req)
-            resp.raise_for_status()
-            log.info(f"[Requested: {req}, Response: {resp}]")
-            return Maybe.from_value(resp)
+        with observe_stage(STAGE_STORAGE_FETCH):
+            async with http_clients.get_storage_client().stream("GET", req) as resp:
+                resp.raise_for_status()
+                return await _stream_to_file(resp, req, log)
     except httpx.HTTPStatusError as http_error:
         log.debug(f"Http Error: {http_error} for request {req}")
         return Nothing
@@ -53,3 +124,67 @@ async def retrieve_data(
     except Exception as crit_err:
         log.critical(f"Critical Error: {crit_err} for request {req}")
         return Nothing
+
+
+def get_content(response_data: Maybe[StorageFile]) -> IO[bytes]:
+    """
+    Returns the content of the downloaded file, or an empty file
+    if the download failed. It must be closed after use,
+    so it's meant to be used as a context manager.
+    \f
+    :param response_data: the result of retrieve_data
+    :return: the file handle positioned at the start of the file
+    """
+    return response_data.map(lambda storage_file: storage_file.content).value_or(
+        io.BytesIO(),
+    )
+
+
+async def retrieve_and_process(
+    file_id: str,
+    version: int,
+    service_type: ServiceTypeEnum,
+    process: Callable[[IO[bytes]], Awaitable[FastApiResp]],
+    calls_docs_editor: bool = False,
+) -> FastApiResp:
+    """
+    Retrieves the file from the storage, validates the storage response
+    and only if it's successful processes the file content.
+    If the storage returned an error, the error response is returned
+    without processing anything.
+    The content is closed when process returns, unless process returns
+    a StreamingResponse: its body is read from the content while it's sent,
+    so the content is closed after the response has been sent.
+    \f
+    :param file_id: Unique identifier (UUID4) of the file
+    :param version: Version of the file
+    :param service_type: service that owns the resource
+    :param process: coroutine function that creates the response from the content
+    :param calls_docs_editor: True if process sends the content to the docs-editor
+    :return: the processed response or the storage error response
+    """
+    response_data: Maybe[StorageFile] = await retrieve_data(
+        file_id=file_id,
+        version=version,
+        service_type=service_type,
+    )
+    response_error: Maybe[FastApiResp] = check_for_storage_response_error(
+        response_data=response_data,
+    )
+    if response_error != Nothing:
+        error_path_stats["skipped_renders"] += 1
+        if calls_docs_editor:
+            error_path_stats["skipped_docs_editor_calls"] += 1
+        return response_error.unwrap()
+
+    content = get_content(response_data)
+    try:
+        response = await process(content)
+    except BaseException:
+        content.close()
+        raise
+    if isinstance(response, StreamingResponse) and response.background is None:
+        response.background = BackgroundTask(content.close)
+    else:
+        content.close()
+    return response
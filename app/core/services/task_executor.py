@@ -0,0 +1,260 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import contextvars
+import functools
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException
+
+from app.core.resources.app_config import (
+    EXECUTOR_MODE,
+    EXECUTOR_POOL_SIZE,
+    EXECUTOR_PROCESS_POOL_SIZE,
+)
+from app.core.resources.schemas.enums.executor_mode_enum import ExecutorModeEnum
+from app.core.services import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_mode: ExecutorModeEnum = EXECUTOR_MODE
+_pool_size: int = EXECUTOR_POOL_SIZE
+_process_pool_size: int = EXECUTOR_PROCESS_POOL_SIZE
+_executor: Optional[Executor] = None
+_process_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def configure_executor(mode: ExecutorModeEnum, pool_size: int) -> None:
+    """
+    Changes the execution mode and the pool size, shutting down the current pool.
+    The new pool will be created lazily on the first submitted task.
+    \f
+    :param mode: where the CPU bound work will be executed
+    :param pool_size: number of threads or processes of the pool
+    """
+    global _mode, _pool_size  # noqa: PLW0603
+    shutdown_executor()
+    _mode = mode
+    _pool_size = pool_size
+
+
+def get_executor_mode() -> ExecutorModeEnum:
+    """
+    Returns the mode currently used to execute CPU bound work
+    \f
+    :return: the current execution mode
+    """
+    return _mode
+
+
+def get_process_pool_size() -> int:
+    """
+    Returns the number of processes of the pool used by run_in_process
+    \f
+    :return: the number of processes of the pool
+    """
+    return _pool_size if _mode == ExecutorModeEnum.PROCESS else _process_pool_size
+
+
+def _create_process_executor(pool_size: int) -> ProcessPoolExecutor:
+    # spawn avoids forking a process that is running the event loop
+    # and other threads, which could leave locks in an invalid state
+    return ProcessPoolExecutor(
+        max_workers=pool_size,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def _get_executor() -> Executor:
+    """
+    Returns the pool of the current worker, creating it if needed.
+    The pool is created lazily so that every gunicorn worker
+    owns its pool instead of sharing the one of the master process.
+    \f
+    :return: the thread or process pool executor
+    """
+    global _executor  # noqa: PLW0603
+    with _executor_lock:
+        if _executor is None:
+            if _mode == ExecutorModeEnum.PROCESS:
+                _executor = _create_process_executor(_pool_size)
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_pool_size,
+                    thread_name_prefix="preview-cpu",
+                )
+            logger.info(f"Created {_mode.value} pool with {_pool_size} workers")
+        return _executor
+
+
+def _get_process_executor() -> Executor:
+    """
+    Returns the process pool of the current worker, creating it if needed.
+    In process mode it is the pool used by run_cpu_bound, otherwise
+    it is a dedicated pool of EXECUTOR_PROCESS_POOL_SIZE processes.
+    \f
+    :return: the process pool executor
+    """
+    global _process_executor  # noqa: PLW0603
+    if _mode == ExecutorModeEnum.PROCESS:
+        return _get_executor()
+    with _executor_lock:
+        if _process_executor is None:
+            _process_executor = _create_process_executor(_process_pool_size)
+            logger.info(f"Created process pool with {_process_pool_size} workers")
+        return _process_executor
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """
+    Shuts down the pools of the current worker, if they were created
+    \f
+    :param wait: wait for the pending tasks to complete before returning
+    """
+    global _executor, _process_executor  # noqa: PLW0603
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+        if _process_executor is not None:
+            _process_executor.shutdown(wait=wait)
+            _process_executor = None
+
+
+def _call_capturing_http_errors(
+    func: Callable[..., T],
+    kwargs: Dict[str, Any],
+) -> Tuple[Optional[T], Optional[Tuple[int, Any]]]:
+    """
+    Calls func inside the pool. HTTPException cannot be pickled, so it is
+    returned as (status_code, detail) and raised again by the caller.
+    \f
+    :param func: function to call
+    :param kwargs: keyword arguments of func
+    :return: (result, None) on success, (None, (status_code, detail)) on HTTPException
+    """
+    try:
+        return func(**kwargs), None
+    except HTTPException as e:
+        return None, (e.status_code, e.detail)
+
+
+def _call_collecting_stage_timings(
+    func: Callable[..., T],
+    kwargs: Dict[str, Any],
+) -> Tuple[Tuple[Optional[T], Optional[Tuple[int, Any]]], Dict[str, float]]:
+    """
+    Calls func inside the process pool. The context of the caller is not
+    sent to the process, so the timings of its stages are returned
+    to be added to the ones of the request.
+    \f
+    :param func: function to call
+    :param kwargs: keyword arguments of func
+    :return: the value returned by _call_capturing_http_errors
+     and the seconds spent in each stage
+    """
+    timings = metrics.start_stage_timings()
+    return _call_capturing_http_errors(func, kwargs), timings
+
+
+async def to_picklable(value: Any) -> Any:
+    """
+    File handles (for example the temporary files of the storage downloads)
+    cannot be sent to another process, so their content is read in memory.
+    The file can be on disk, so it is read in the default thread pool
+    without blocking the event loop.
+    \f
+    :param value: argument to send to the process pool
+    :return: the value itself, or a BytesIO with its content if it's a file handle
+    """
+    if hasattr(value, "read") and not isinstance(value, io.BytesIO):
+        loop = asyncio.get_running_loop()
+        return io.BytesIO(await loop.run_in_executor(None, value.read))
+    return value
+
+
+async def _run_in_executor(
+    executor: Executor,
+    func: Callable[..., T],
+    kwargs: Dict[str, Any],
+) -> T:
+    """
+    Executes func in the given pool, raising again the HTTPException
+    it raised inside the pool
+    \f
+    :param executor: pool that executes func
+    :param func: function to execute
+    :param kwargs: keyword arguments to pass to func
+    :return: the value returned by func
+    :raises: any exception raised by func
+    """
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        kwargs = {name: await to_picklable(value) for name, value in kwargs.items()}
+        (result, http_error), timings = await loop.run_in_executor(
+            executor,
+            functools.partial(_call_collecting_stage_timings, func, kwargs),
+        )
+        metrics.add_stage_timings(timings)
+    else:
+        # run_in_executor does not copy the context to the thread,
+        # the stage timings of the request are collected through it
+        result, http_error = await loop.run_in_executor(
+            executor,
+            functools.partial(
+                contextvars.copy_context().run,
+                _call_capturing_http_errors,
+                func,
+                kwargs,
+            ),
+        )
+    if http_error is not None:
+        status_code, detail = http_error
+        raise HTTPException(status_code=status_code, detail=detail)
+    return result  # type: ignore[return-value]
+
+
+async def run_cpu_bound(func: Callable[..., T], **kwargs: Any) -> T:
+    """
+    Executes CPU bound work (decoding, resizing, encoding, pdf rendering)
+    according to the configured mode, so that the event loop
+    is free to serve other requests in the meantime.
+    In process mode func must be a module level function and
+    its arguments and result must be picklable.
+    \f
+    :param func: function to execute
+    :param kwargs: keyword arguments to pass to func
+    :return: the value returned by func
+    :raises: any exception raised by func
+    """
+    if _mode == ExecutorModeEnum.INLINE:
+        return func(**kwargs)
+    return await _run_in_executor(_get_executor(), func, kwargs)
+
+
+async def run_in_process(func: Callable[..., T], **kwargs: Any) -> T:
+    """
+    Executes CPU bound work in a process pool whatever the configured mode
+    is (except inline, used for debugging), so that work that cannot run
+    in parallel threads, like pdfium rendering, is spread across the CPU cores.
+    func must be a module level function and its arguments
+    and result must be picklable.
+    \f
+    :param func: function to execute
+    :param kwargs: keyword arguments to pass to func
+    :return: the value returned by func
+    :raises: any exception raised by func
+    """
+    if _mode == ExecutorModeEnum.INLINE:
+        return func(**kwargs)
+    return await _run_in_executor(_get_process_executor(), func, kwargs)
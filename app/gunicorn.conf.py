@@ -3,11 +3,16 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 import logging
 import multiprocessing
+import os
+import shutil
+import tempfile
 from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from pathlib import Path
 
 from app.core.resources import app_config
 
+METRICS_DIR_VARIABLE = "PROMETHEUS_MULTIPROC_DIR"
+
 #
 # Server socket
 #
@@ -244,7 +249,11 @@ proc_name = "carbonio-preview-manager"
 
 
 def child_exit(server, worker) -> None:
+    # imported only once the metrics directory is set, see on_starting
+    from prometheus_client import multiprocess
+
     server.log.info(f"Worker killed: {worker.pid}")
+    multiprocess.mark_process_dead(worker.pid)
 
 
 def post_worker_init(worker) -> None:
@@ -265,6 +274,15 @@ def worker_abort(worker) -> None:
 
 def on_starting(server) -> None:
     server.log.info("Starting server")
+    # Every worker writes its metrics in this directory, so that the /metrics API
+    # aggregates the ones of all the workers. It must be set before the workers
+    # import prometheus_client. This hook runs once in the master, not at every
+    # reload of this file, and a directory given in the environment is kept.
+    if METRICS_DIR_VARIABLE not in os.environ:
+        server.created_metrics_dir = tempfile.mkdtemp(
+            prefix="carbonio-preview-metrics-",
+        )
+        os.environ[METRICS_DIR_VARIABLE] = server.created_metrics_dir
 
 
 def on_reload(server) -> None:
@@ -273,3 +291,9 @@ def on_reload(server) -> None:
 
 def on_shutdown(server) -> None:
     server.log.info("Closing server")
+
+
+def on_exit(server) -> None:
+    created_metrics_dir = getattr(server, "created_metrics_dir", None)
+    if created_metrics_dir is not None:
+        shutil.rmtree(created_metrics_dir, ignore_errors=True)
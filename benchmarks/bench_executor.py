@@ -0,0 +1,107 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Compares the executor modes (inline, thread, process) running concurrent
+thumbnail requests, reporting throughput, latency percentiles and the
+event loop lag, which is what a concurrent /health/live/ request would wait.
+
+Usage: python -m benchmarks.bench_executor [--requests N] [--concurrency C]
+"""
+
+import argparse
+import asyncio
+import io
+import time
+from typing import Dict, List
+
+from app.core.resources.schemas.enums.executor_mode_enum import ExecutorModeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
+from app.core.services import image_service, task_executor
+from benchmarks.utils import create_image_buffer, percentile, write_results
+
+LOOP_PROBE_INTERVAL: float = 0.005
+
+
+async def _probe_event_loop(lags: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - LOOP_PROBE_INTERVAL)
+
+
+async def _run_mode(
+    mode: ExecutorModeEnum,
+    pool_size: int,
+    raw_image: bytes,
+    requests: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    task_executor.configure_executor(mode, pool_size)
+    metadata = ThumbnailImageMetadata(
+        width=80,
+        height=80,
+        quality=ImageQualityEnum.MEDIUM,
+        format=ImageTypeEnum.JPEG,
+    )
+    # warm up, so that the pool creation is not measured
+    await image_service.process_raw_thumbnail(io.BytesIO(raw_image), metadata)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def _single_request() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await image_service.process_raw_thumbnail(io.BytesIO(raw_image), metadata)
+            latencies.append(time.perf_counter() - start)
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_event_loop(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(_single_request() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    task_executor.shutdown_executor()
+
+    return {
+        "mode": mode.value,
+        "pool_size": pool_size,
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": requests / elapsed,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "loop_lag_p99_ms": percentile(lags, 99) * 1000,
+        "loop_lag_max_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    raw_image = create_image_buffer((args.width, args.height)).getvalue()
+    results = [
+        await _run_mode(
+            mode=mode,
+            pool_size=args.pool_size,
+            raw_image=raw_image,
+            requests=args.requests,
+            concurrency=args.concurrency,
+        )
+        for mode in ExecutorModeEnum
+    ]
+    write_results({"benchmark": "executor", "results": results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Measures gif_thumbnail and gif_preview on animations with many frames,
+reporting the time per call and how many times a GIF is opened (decoded)
+and saved (encoded), which should be once each regardless of the
+applied transformations.
+
+Usage: python -m benchmarks.bench_gif_pipeline [--frames N] [--repeat N]
+"""
+
+import argparse
+import io
+import time
+from typing import Callable, Dict, List
+from unittest.mock import patch
+
+from PIL import GifImagePlugin, Image
+
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.services.image_manipulation import gif_manipulation
+from benchmarks.utils import percentile, write_results
+
+
+def _create_gif_buffer(frames: int, size: int) -> io.BytesIO:
+    images = [
+        Image.effect_mandelbrot(
+            (size, size),
+            (-2 + i / frames, -1.5, 1, 1.5),
+            64,
+        ).convert("RGB")
+        for i in range(frames)
+    ]
+    buffer = io.BytesIO()
+    images[0].save(
+        buffer,
+        format="GIF",
+        save_all=True,
+        append_images=images[1:],
+        duration=40,
+        loop=0,
+    )
+    return buffer
+
+
+def _measure(
+    render: Callable[[io.BytesIO], io.BytesIO],
+    raw_gif: bytes,
+    repeat: int,
+) -> Dict[str, float]:
+    timings: List[float] = []
+    decodes = 0
+    encodes = 0
+    original_open = GifImagePlugin.GifImageFile._open  # noqa: SLF001
+    original_save = Image.SAVE_ALL["GIF"]
+
+    def _counting_open(img: Image.Image):  # noqa: ANN202
+        nonlocal decodes
+        decodes += 1
+        return original_open(img)
+
+    def _counting_save(*args, **kwargs):  # noqa: ANN002, ANN003, ANN202
+        nonlocal encodes
+        encodes += 1
+        return original_save(*args, **kwargs)
+
+    with patch.object(GifImagePlugin.GifImageFile, "_open", _counting_open), patch.dict(
+        Image.SAVE_ALL,
+        {"GIF": _counting_save},
+    ):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render(io.BytesIO(raw_gif))
+            timings.append(time.perf_counter() - start)
+
+    return {
+        "median_ms": percentile(timings, 50) * 1000,
+        "decodes_per_call": decodes / repeat,
+        "encodes_per_call": encodes / repeat,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    raw_gif = _create_gif_buffer(args.frames, args.size).getvalue()
+    renders: Dict[str, Callable[[io.BytesIO], io.BytesIO]] = {
+        "thumbnail_rounded": lambda content: gif_manipulation.gif_thumbnail(
+            _x=80,
+            _y=80,
+            border=ImageBorderShapeEnum.ROUNDED,
+            _quality=ImageQualityEnum.MEDIUM,
+            content=content,
+        ),
+        "preview_padded": lambda content: gif_manipulation.gif_preview(
+            _x=args.size // 2,
+            _y=args.size // 3,
+            _quality=ImageQualityEnum.MEDIUM,
+            _crop=False,
+            content=content,
+        ),
+    }
+    results = [
+        {
+            "render": name,
+            "frames": args.frames,
+            **_measure(render, raw_gif, args.repeat),
+        }
+        for name, render in renders.items()
+    ]
+    write_results({"benchmark": "gif_pipeline", "results": results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", type=int, default=320)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,129 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Compares a new http client for every storage download (how retrieve_data
+used to work) with the shared client of http_clients, downloading from a
+local stub storage with keep-alive, reporting requests per second,
+latency percentiles and the number of TCP connections opened.
+
+Usage: python -m benchmarks.bench_http_clients [--requests N] [--concurrency C]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List
+from unittest.mock import patch
+
+import httpx
+
+from app.core.services import http_clients, storage_communication
+from benchmarks.utils import percentile, write_results
+
+STUB_HOST: str = "127.0.0.1"
+
+
+class StubStorage:
+    """
+    Minimal HTTP/1.1 server answering every GET with the same body,
+    keeping the connections alive
+    """
+
+    def __init__(self: "StubStorage", body_size: int) -> None:
+        self.body: bytes = b"x" * body_size
+        self.connections: int = 0
+
+    async def handle(
+        self: "StubStorage",
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.connections += 1
+        header = (
+            f"HTTP/1.1 200 OK\r\nContent-Length: {len(self.body)}\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):
+                writer.write(header + self.body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _download_with_new_client(address: str) -> None:
+    async with httpx.AsyncClient() as client:
+        resp = await client.get(f"{address}/download?node=id&version=1&type=files")
+        resp.raise_for_status()
+
+
+async def _download_with_shared_client(_address: str) -> None:
+    await storage_communication.retrieve_data(file_id="id")
+
+
+async def _run(
+    name: str,
+    download: Callable[[str], Awaitable[None]],
+    body_size: int,
+    requests: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    stub = StubStorage(body_size)
+    server = await asyncio.start_server(stub.handle, STUB_HOST, 0)
+    address = f"http://{STUB_HOST}:{server.sockets[0].getsockname()[1]}"
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def _single_request() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await download(address)
+            latencies.append(time.perf_counter() - start)
+
+    with patch.object(storage_communication, "STORAGE_FULL_ADDRESS", address):
+        start = time.perf_counter()
+        await asyncio.gather(*(_single_request() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+        await http_clients.close_clients()
+    server.close()
+    await server.wait_closed()
+
+    return {
+        "client": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "body_size": body_size,
+        "throughput_rps": requests / elapsed,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "tcp_connections": stub.connections,
+    }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    results = [
+        await _run(
+            name=name,
+            download=download,
+            body_size=args.body_size,
+            requests=args.requests,
+            concurrency=args.concurrency,
+        )
+        for name, download in [
+            ("new_client_per_request", _download_with_new_client),
+            ("shared_client", _download_with_shared_client),
+        ]
+    ]
+    write_results({"benchmark": "http_clients", "results": results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--body-size", type=int, default=16 * 1024)
+    asyncio.run(_main(parser.parse_args()))
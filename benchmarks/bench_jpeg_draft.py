@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Compares the full JPEG decode with the reduced scale (draft) decode
+used by parse_to_valid_image when the requested size is much smaller
+than the original, reporting decode plus resize time and decoded size.
+
+Usage: python -m benchmarks.bench_jpeg_draft [--repeat N]
+"""
+
+import argparse
+import io
+import time
+from typing import Dict, List, Tuple
+
+from app.core.services.image_manipulation import image_manipulation
+from benchmarks.utils import create_image_buffer, percentile, write_results
+
+SOURCE_SIZES: List[Tuple[int, int]] = [(6000, 4000), (4000, 3000), (1920, 1080)]
+REQUESTED_SIZES: List[Tuple[int, int]] = [(80, 80), (320, 320), (1024, 768)]
+
+
+def _measure(
+    raw_image: bytes,
+    requested: Tuple[int, int],
+    draft: bool,
+    repeat: int,
+) -> Dict[str, float]:
+    timings: List[float] = []
+    decoded_size: Tuple[int, int] = (0, 0)
+    output_size: Tuple[int, int] = (0, 0)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        img = image_manipulation.parse_to_valid_image(
+            content=io.BytesIO(raw_image),
+            requested_x=requested[0] if draft else 0,
+            requested_y=requested[1] if draft else 0,
+        )
+        decoded_size = img.size
+        output_size = image_manipulation.resize_with_crop_and_paddings(
+            img=img,
+            requested_x=requested[0],
+            requested_y=requested[1],
+        ).size
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "median_ms": percentile(timings, 50) * 1000,
+        "decoded_megapixels": decoded_size[0] * decoded_size[1] / 1_000_000,
+        "output_size": list(output_size),
+    }
+
+
+def main(repeat: int) -> None:
+    results = []
+    for source in SOURCE_SIZES:
+        raw_image = create_image_buffer(source).getvalue()
+        for requested in REQUESTED_SIZES:
+            full = _measure(raw_image, requested, draft=False, repeat=repeat)
+            drafted = _measure(raw_image, requested, draft=True, repeat=repeat)
+            results.append(
+                {
+                    "source": list(source),
+                    "requested": list(requested),
+                    "full_decode": full,
+                    "draft_decode": drafted,
+                    "speed_up": full["median_ms"] / drafted["median_ms"],
+                },
+            )
+    write_results({"benchmark": "jpeg_draft", "results": results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args().repeat)
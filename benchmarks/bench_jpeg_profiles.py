@@ -0,0 +1,118 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Compares, for every quality tier, the JPEG encoder profile with the plain
+encoding at the same quality value (baseline, no Huffman optimisation,
+no ICC profile), reporting the encoded size and the CPU time of the encode.
+Chat avatars are small rounded thumbnails, gallery previews are big
+previews, so that the default tier of each one can be chosen separately.
+
+Usage: python -m benchmarks.bench_jpeg_profiles [--repeat N]
+"""
+
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageCms
+
+from app.core.resources.constants.image.quality import JpegEncoderProfile
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.services.image_manipulation.image_manipulation import (
+    add_circle_margins_to_image,
+    parse_to_valid_image,
+    resize_with_crop_and_paddings,
+    resize_with_paddings,
+    save_image_to_buffer,
+)
+from benchmarks.utils import create_image_buffer, percentile, write_results
+
+SOURCE_SIZE: Tuple[int, int] = (1920, 1080)
+AVATAR_AREA: Tuple[int, int] = (80, 80)
+GALLERY_PREVIEW_AREA: Tuple[int, int] = (1024, 768)
+
+
+def _create_renditions() -> Dict[str, Image.Image]:
+    """
+    \f
+    :return: the resized images to encode, with the sRGB ICC profile
+     that most photos carry
+    """
+    img = parse_to_valid_image(
+        content=create_image_buffer(SOURCE_SIZE),
+        requested_x=0,
+        requested_y=0,
+    )
+    avatar = resize_with_crop_and_paddings(
+        img=img,
+        requested_x=AVATAR_AREA[0],
+        requested_y=AVATAR_AREA[1],
+    )
+    renditions = {
+        "chat_avatar": add_circle_margins_to_image(avatar).convert("RGB"),
+        "gallery_preview": resize_with_paddings(
+            img=img,
+            requested_x=GALLERY_PREVIEW_AREA[0],
+            requested_y=GALLERY_PREVIEW_AREA[1],
+        ),
+    }
+    icc_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    for rendition in renditions.values():
+        rendition.info["icc_profile"] = icc_profile
+    return renditions
+
+
+def _measure(
+    img: Image.Image,
+    quality: ImageQualityEnum,
+    profile: Optional[JpegEncoderProfile],
+    repeat: int,
+) -> Dict[str, float]:
+    cpu_times: List[float] = []
+    output_size = 0
+    for _ in range(repeat):
+        start = time.process_time()
+        output = save_image_to_buffer(
+            img=img,
+            _format="JPEG",
+            _quality_value=quality.get_jpeg_int_quality(),
+            _jpeg_profile=profile,
+        )
+        cpu_times.append(time.process_time() - start)
+        output_size = len(output.getvalue())
+    return {"cpu_ms": percentile(cpu_times, 50) * 1000, "output_bytes": output_size}
+
+
+def main(repeat: int) -> None:
+    results = []
+    for rendition_name, img in _create_renditions().items():
+        for quality in ImageQualityEnum:
+            profile = quality.get_jpeg_encoder_profile()
+            plain = _measure(img, quality, None, repeat)
+            profiled = _measure(img, quality, profile, repeat)
+            results.append(
+                {
+                    "rendition": rendition_name,
+                    "quality": quality.value,
+                    "profile": profile._asdict(),
+                    "plain": plain,
+                    "profile_encoding": profiled,
+                    "size_ratio": profiled["output_bytes"] / plain["output_bytes"],
+                    "cpu_ratio": profiled["cpu_ms"] / max(plain["cpu_ms"], 1e-6),
+                },
+            )
+    write_results(
+        {
+            "benchmark": "jpeg_profiles",
+            "source": list(SOURCE_SIZE),
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args().repeat)
@@ -0,0 +1,242 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Measures wall time, CPU time and peak memory of the manipulation functions
+on a deterministic corpus: JPEG and PNG images of several resolutions
+and modes, GIFs with 10 to 500 frames and PDFs with 1 to 1000 pages.
+Every case runs in a new process, the peak memory is the increase of the
+resident memory high-water mark (Linux VmHWM), reset just before the case.
+
+Usage: python -m benchmarks.bench_manipulation [--repeat N] [--filter TEXT]
+"""
+
+import argparse
+import io
+import multiprocessing
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Any, Callable, Dict, List, Tuple
+
+import PIL
+import pypdfium2
+
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.services.document_manipulation.document_manipulation import (
+    convert_pdf_to_image,
+    split_pdf,
+)
+from app.core.services.image_manipulation.gif_manipulation import (
+    gif_preview,
+    gif_thumbnail,
+)
+from app.core.services.image_manipulation.jpeg_manipulation import (
+    jpeg_preview,
+    jpeg_thumbnail,
+)
+from app.core.services.image_manipulation.png_manipulation import (
+    png_preview,
+    png_thumbnail,
+)
+from benchmarks.utils import (
+    create_gif_buffer,
+    create_image_buffer,
+    create_pdf_buffer,
+    percentile,
+    read_memory_status,
+    reset_peak_memory,
+    write_results,
+)
+
+IMAGE_SIZES: List[Tuple[int, int]] = [(640, 480), (1920, 1080), (4000, 3000)]
+JPEG_MODES: List[str] = ["RGB", "L", "CMYK"]
+PNG_MODES: List[str] = ["RGB", "L", "RGBA"]
+GIF_SIZE: Tuple[int, int] = (320, 240)
+GIF_FRAMES: List[int] = [10, 100, 500]
+PDF_PAGES: List[int] = [1, 10, 100, 1000]
+
+THUMBNAIL_AREA: Tuple[int, int] = (80, 80)
+PREVIEW_AREA: Tuple[int, int] = (1024, 768)
+
+FUNCTIONS: Dict[str, Callable[[IO[bytes]], Any]] = {
+    "jpeg_thumbnail": lambda content: jpeg_thumbnail(
+        _x=THUMBNAIL_AREA[0],
+        _y=THUMBNAIL_AREA[1],
+        border=ImageBorderShapeEnum.RECTANGULAR,
+        _quality=ImageQualityEnum.MEDIUM,
+        content=content,
+    ),
+    "jpeg_preview": lambda content: jpeg_preview(
+        _x=PREVIEW_AREA[0],
+        _y=PREVIEW_AREA[1],
+        _quality=ImageQualityEnum.MEDIUM,
+        _crop=False,
+        content=content,
+    ),
+    "png_thumbnail": lambda content: png_thumbnail(
+        _x=THUMBNAIL_AREA[0],
+        _y=THUMBNAIL_AREA[1],
+        border=ImageBorderShapeEnum.RECTANGULAR,
+        content=content,
+    ),
+    "png_preview": lambda content: png_preview(
+        _x=PREVIEW_AREA[0],
+        _y=PREVIEW_AREA[1],
+        _crop=False,
+        content=content,
+    ),
+    "gif_thumbnail": lambda content: gif_thumbnail(
+        _x=THUMBNAIL_AREA[0],
+        _y=THUMBNAIL_AREA[1],
+        border=ImageBorderShapeEnum.RECTANGULAR,
+        _quality=ImageQualityEnum.MEDIUM,
+        content=content,
+    ),
+    "gif_preview": lambda content: gif_preview(
+        _x=PREVIEW_AREA[0],
+        _y=PREVIEW_AREA[1],
+        _quality=ImageQualityEnum.MEDIUM,
+        _crop=False,
+        content=content,
+    ),
+    "split_pdf": lambda content: split_pdf(
+        content=content,
+        first_page_number=1,
+        last_page_number=0,
+    ),
+    "convert_pdf_to_image": lambda content: convert_pdf_to_image(
+        content=content,
+        output_extension="JPEG",
+        page_number=0,
+    ),
+}
+
+
+def _create_corpus() -> Dict[str, Dict[str, Callable[[], io.BytesIO]]]:
+    """
+    \f
+    :return: for each kind of input, the name and the generator of every input
+    """
+    return {
+        "jpeg": {
+            f"{width}x{height}_{mode}": (
+                lambda size=(width, height), mode=mode: create_image_buffer(
+                    size,
+                    "JPEG",
+                    mode,
+                )
+            )
+            for width, height in IMAGE_SIZES
+            for mode in JPEG_MODES
+        },
+        "png": {
+            f"{width}x{height}_{mode}": (
+                lambda size=(width, height), mode=mode: create_image_buffer(
+                    size,
+                    "PNG",
+                    mode,
+                )
+            )
+            for width, height in IMAGE_SIZES
+            for mode in PNG_MODES
+        },
+        "gif": {
+            f"{GIF_SIZE[0]}x{GIF_SIZE[1]}_{frames}_frames": (
+                lambda frames=frames: create_gif_buffer(GIF_SIZE, frames)
+            )
+            for frames in GIF_FRAMES
+        },
+        "pdf": {
+            f"{pages}_pages": lambda pages=pages: create_pdf_buffer(pages)
+            for pages in PDF_PAGES
+        },
+    }
+
+
+def _input_kind(function_name: str) -> str:
+    return "pdf" if "pdf" in function_name else function_name.split("_")[0]
+
+
+def _run_case(function_name: str, raw_input: bytes, repeat: int) -> Dict[str, Any]:
+    """
+    Runs the case in the current process, it must be a new one
+    \f
+    :param function_name: name of the function to measure
+    :param raw_input: content passed to the function
+    :param repeat: number of times the function is called
+    :return: median wall and CPU time and peak memory increase
+    """
+    function = FUNCTIONS[function_name]
+    reset_peak_memory()
+    memory_before = read_memory_status()["VmRSS"]
+    wall_times: List[float] = []
+    cpu_times: List[float] = []
+    output_size = 0
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        output = function(io.BytesIO(raw_input))
+        wall_times.append(time.perf_counter() - wall_start)
+        cpu_times.append(time.process_time() - cpu_start)
+        output_size = len(output.getvalue())
+    peak_after = read_memory_status()["VmHWM"]
+
+    return {
+        "wall_ms": percentile(wall_times, 50) * 1000,
+        "cpu_ms": percentile(cpu_times, 50) * 1000,
+        "peak_memory_mb": (peak_after - memory_before) / 1024,
+        "output_bytes": output_size,
+    }
+
+
+def main(repeat: int, name_filter: str) -> None:
+    corpus = _create_corpus()
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for function_name in FUNCTIONS:
+        for input_name, create_input in corpus[_input_kind(function_name)].items():
+            if name_filter not in f"{function_name}/{input_name}":
+                continue
+            raw_input = create_input().getvalue()
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                measures = executor.submit(
+                    _run_case,
+                    function_name,
+                    raw_input,
+                    repeat,
+                ).result()
+            results.append(
+                {
+                    "function": function_name,
+                    "input": input_name,
+                    "input_bytes": len(raw_input),
+                    **measures,
+                },
+            )
+    write_results(
+        {
+            "benchmark": "manipulation",
+            "environment": {
+                "python": platform.python_version(),
+                "pillow": PIL.__version__,
+                "pypdfium2": pypdfium2.V_PYPDFIUM2,
+                "machine": platform.machine(),
+            },
+            "repeat": repeat,
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--filter",
+        default="",
+        help="only run the cases whose function/input name contains this text",
+    )
+    args = parser.parse_args()
+    main(args.repeat, args.filter)
@@ -0,0 +1,143 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Compares the output formats of the thumbnails (rectangular and rounded)
+and of the previews, reporting the encoded size and the time spent
+resizing and encoding the same decoded image at every quality.
+
+Usage: python -m benchmarks.bench_output_formats [--repeat N]
+"""
+
+import argparse
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from PIL import Image
+
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.services.image_manipulation.image_manipulation import (
+    parse_to_valid_image,
+)
+from app.core.services.image_manipulation.jpeg_manipulation import (
+    jpeg_preview_from_image,
+    jpeg_thumbnail_from_image,
+)
+from app.core.services.image_manipulation.png_manipulation import (
+    png_preview_from_image,
+    png_thumbnail_from_image,
+)
+from app.core.services.image_manipulation.webp_manipulation import (
+    webp_preview_from_image,
+    webp_thumbnail_from_image,
+)
+from benchmarks.utils import create_image_buffer, percentile, write_results
+
+SOURCE_SIZE: Tuple[int, int] = (1920, 1080)
+THUMBNAIL_AREA: Tuple[int, int] = (80, 80)
+PREVIEW_AREA: Tuple[int, int] = (1024, 768)
+
+Rendition = Callable[[Image.Image, ImageQualityEnum], Any]
+
+
+def _thumbnail(function: Callable[..., Any], shape: ImageBorderShapeEnum) -> Rendition:
+    def _create(img: Image.Image, quality: ImageQualityEnum) -> Any:
+        kwargs = {} if function is png_thumbnail_from_image else {"_quality": quality}
+        return function(
+            img=img,
+            _x=THUMBNAIL_AREA[0],
+            _y=THUMBNAIL_AREA[1],
+            border=shape,
+            **kwargs,
+        )
+
+    return _create
+
+
+def _preview(function: Callable[..., Any]) -> Rendition:
+    def _create(img: Image.Image, quality: ImageQualityEnum) -> Any:
+        kwargs = {} if function is png_preview_from_image else {"_quality": quality}
+        return function(
+            img=img,
+            _x=PREVIEW_AREA[0],
+            _y=PREVIEW_AREA[1],
+            _crop=False,
+            **kwargs,
+        )
+
+    return _create
+
+
+RENDITIONS: Dict[str, Dict[str, Rendition]] = {
+    f"thumbnail_{shape.value}": {
+        "jpeg": _thumbnail(jpeg_thumbnail_from_image, shape),
+        "png": _thumbnail(png_thumbnail_from_image, shape),
+        "webp": _thumbnail(webp_thumbnail_from_image, shape),
+    }
+    for shape in ImageBorderShapeEnum
+}
+RENDITIONS["preview"] = {
+    "jpeg": _preview(jpeg_preview_from_image),
+    "png": _preview(png_preview_from_image),
+    "webp": _preview(webp_preview_from_image),
+}
+
+
+def _measure(
+    rendition: Rendition,
+    img: Image.Image,
+    quality: ImageQualityEnum,
+    repeat: int,
+) -> Dict[str, float]:
+    timings: List[float] = []
+    output_size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output_size = len(rendition(img, quality).getvalue())
+        timings.append(time.perf_counter() - start)
+    return {"median_ms": percentile(timings, 50) * 1000, "output_bytes": output_size}
+
+
+def main(repeat: int) -> None:
+    img = parse_to_valid_image(
+        content=create_image_buffer(SOURCE_SIZE),
+        requested_x=0,
+        requested_y=0,
+    )
+    results = []
+    for rendition_name, formats in RENDITIONS.items():
+        for quality in ImageQualityEnum:
+            measures = {
+                output_format: _measure(rendition, img, quality, repeat)
+                for output_format, rendition in formats.items()
+            }
+            results.append(
+                {
+                    "rendition": rendition_name,
+                    "quality": quality.value,
+                    **measures,
+                    "webp_to_jpeg_size": (
+                        measures["webp"]["output_bytes"]
+                        / measures["jpeg"]["output_bytes"]
+                    ),
+                    "webp_to_png_size": (
+                        measures["webp"]["output_bytes"]
+                        / measures["png"]["output_bytes"]
+                    ),
+                },
+            )
+    write_results(
+        {
+            "benchmark": "output_formats",
+            "source": list(SOURCE_SIZE),
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args().repeat)
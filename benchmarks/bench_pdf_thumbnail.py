@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Compares how the pdf thumbnails used to be created, rendering the page
+at its own size, encoding it and decoding it again before the thumbnail
+is created, with rendering the page at the scale needed by the thumbnail
+and creating the thumbnail straight from the rendered page,
+on standard (A4) and large format (A0 poster) pages.
+
+Usage: python -m benchmarks.bench_pdf_thumbnail [--repeat N]
+"""
+
+import argparse
+import io
+import time
+from typing import Callable, Dict, List, Tuple
+
+from PIL import Image, ImageChops, ImageStat
+
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.vertical_crop_position_enum import (
+    VerticalCropPositionEnum,
+)
+from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
+from app.core.services import image_service, pdf_service
+from app.core.services.document_manipulation import document_manipulation
+from benchmarks.utils import (
+    A0_PAGE_SIZE,
+    A4_PAGE_SIZE,
+    create_pdf_buffer,
+    percentile,
+    write_results,
+)
+
+PAGE_SIZES: Dict[str, Tuple[int, int]] = {"A4": A4_PAGE_SIZE, "A0": A0_PAGE_SIZE}
+REQUESTED_SIZES: List[Tuple[int, int]] = [(80, 80), (320, 320), (1024, 768)]
+FORMATS: List[ImageTypeEnum] = [ImageTypeEnum.JPEG, ImageTypeEnum.PNG]
+
+
+def _full_size_render(raw_pdf: bytes, img_metadata: ThumbnailImageMetadata) -> bytes:
+    page = document_manipulation.convert_pdf_to_image(
+        content=io.BytesIO(raw_pdf),
+        output_extension=img_metadata.format.value,
+        page_number=0,
+    )
+    return image_service._select_thumbnail_module(  # noqa: SLF001
+        img_metadata=img_metadata,
+        content=page,
+    ).getvalue()
+
+
+def _target_scale_render(
+    raw_pdf: bytes,
+    img_metadata: ThumbnailImageMetadata,
+) -> bytes:
+    return pdf_service._create_thumbnail(  # noqa: SLF001
+        content=io.BytesIO(raw_pdf),
+        img_metadata=img_metadata,
+    ).getvalue()
+
+
+def _measure(
+    create: Callable[[bytes, ThumbnailImageMetadata], bytes],
+    raw_pdf: bytes,
+    img_metadata: ThumbnailImageMetadata,
+    repeat: int,
+) -> Tuple[float, bytes]:
+    timings: List[float] = []
+    output = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = create(raw_pdf, img_metadata)
+        timings.append(time.perf_counter() - start)
+    return percentile(timings, 50) * 1000, output
+
+
+def main(repeat: int) -> None:
+    results = []
+    for page_name, page_size in PAGE_SIZES.items():
+        raw_pdf = create_pdf_buffer(1, page_size).getvalue()
+        for requested_x, requested_y in REQUESTED_SIZES:
+            for output_format in FORMATS:
+                img_metadata = ThumbnailImageMetadata(
+                    width=requested_x,
+                    height=requested_y,
+                    format=output_format,
+                    crop_position=VerticalCropPositionEnum.TOP,
+                )
+                full_ms, full = _measure(
+                    _full_size_render,
+                    raw_pdf,
+                    img_metadata,
+                    repeat,
+                )
+                target_ms, target = _measure(
+                    _target_scale_render,
+                    raw_pdf,
+                    img_metadata,
+                    repeat,
+                )
+                full_img = Image.open(io.BytesIO(full)).convert("RGB")
+                target_img = Image.open(io.BytesIO(target)).convert("RGB")
+                results.append(
+                    {
+                        "page": page_name,
+                        "requested": [requested_x, requested_y],
+                        "format": output_format.value,
+                        "full_size_render_ms": full_ms,
+                        "target_scale_render_ms": target_ms,
+                        "speed_up": full_ms / target_ms,
+                        "same_output_size": full_img.size == target_img.size,
+                        "mean_pixel_difference": sum(
+                            ImageStat.Stat(
+                                ImageChops.difference(full_img, target_img),
+                            ).mean,
+                        )
+                        / 3,
+                    },
+                )
+    write_results({"benchmark": "pdf_thumbnail", "results": results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args().repeat)
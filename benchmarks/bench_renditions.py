@@ -0,0 +1,102 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Compares creating a set of renditions of the same image one at a time,
+as the single thumbnail and preview APIs do, with creating them all
+at once as the renditions API does, decoding the image only once.
+
+Usage: python -m benchmarks.bench_renditions [--repeat N]
+"""
+
+import argparse
+import io
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.preview_image_metadata import PreviewImageMetadata
+from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
+from app.core.services import image_service
+from benchmarks.utils import create_image_buffer, percentile, write_results
+
+SOURCE_SIZES: List[Tuple[int, int]] = [(6000, 4000), (4000, 3000), (1920, 1080)]
+RENDITION_SETS: Dict[str, List[image_service.ImageRenditionMetadata]] = {
+    "grid": [
+        ThumbnailImageMetadata(width=80, height=80),
+        ThumbnailImageMetadata(width=320, height=320),
+        PreviewImageMetadata(width=1024, height=768),
+    ],
+    "grid_png": [
+        ThumbnailImageMetadata(width=80, height=80, format=ImageTypeEnum.PNG),
+        ThumbnailImageMetadata(width=320, height=320, format=ImageTypeEnum.PNG),
+        PreviewImageMetadata(width=1024, height=768),
+    ],
+}
+
+
+def _one_at_a_time(
+    raw_image: bytes,
+    renditions: List[image_service.ImageRenditionMetadata],
+) -> None:
+    for img_metadata in renditions:
+        if isinstance(img_metadata, ThumbnailImageMetadata):
+            image_service._select_thumbnail_module(  # noqa: SLF001
+                img_metadata=img_metadata,
+                content=io.BytesIO(raw_image),
+            )
+        else:
+            image_service._select_preview_module(  # noqa: SLF001
+                img_metadata=img_metadata,
+                content=io.BytesIO(raw_image),
+            )
+
+
+def _all_at_once(
+    raw_image: bytes,
+    renditions: List[image_service.ImageRenditionMetadata],
+) -> None:
+    image_service._create_renditions(  # noqa: SLF001
+        renditions=renditions,
+        content=io.BytesIO(raw_image),
+    )
+
+
+def _measure(
+    create: Callable[[bytes, List[image_service.ImageRenditionMetadata]], None],
+    raw_image: bytes,
+    renditions: List[image_service.ImageRenditionMetadata],
+    repeat: int,
+) -> float:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        create(raw_image, renditions)
+        timings.append(time.perf_counter() - start)
+    return percentile(timings, 50) * 1000
+
+
+def main(repeat: int) -> None:
+    results = []
+    for source in SOURCE_SIZES:
+        raw_image = create_image_buffer(source).getvalue()
+        for name, renditions in RENDITION_SETS.items():
+            separate = _measure(_one_at_a_time, raw_image, renditions, repeat)
+            together = _measure(_all_at_once, raw_image, renditions, repeat)
+            results.append(
+                {
+                    "source": list(source),
+                    "renditions": name,
+                    "one_at_a_time_median_ms": separate,
+                    "all_at_once_median_ms": together,
+                    "speed_up": separate / together,
+                },
+            )
+    write_results({"benchmark": "renditions", "results": results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args().repeat)
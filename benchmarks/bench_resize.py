@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Measures the resize of large images and GIFs to tiny thumbnails with the
+resample filter of every quality tier, comparing the single resample of the
+whole image with the integer reduction followed by the final resample.
+The previous behaviour is the single resample with the bicubic filter.
+
+Usage: python -m benchmarks.bench_resize [--repeat N]
+"""
+
+import argparse
+import io
+import time
+from typing import Callable, Dict, List, Tuple
+
+from PIL import Image
+
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.services.image_manipulation.gif_utility_functions import (
+    parse_to_valid_gif,
+)
+from app.core.services.image_manipulation.image_manipulation import (
+    parse_to_valid_image,
+    resize_with_crop_and_paddings,
+)
+from benchmarks.utils import (
+    create_gif_buffer,
+    create_image_buffer,
+    percentile,
+    write_results,
+)
+
+# PNG sources, so that the JPEG draft does not reduce them while decoding
+IMAGE_SIZES: Tuple[Tuple[int, int], ...] = ((6000, 4000), (3000, 2000))
+GIF_SIZE: Tuple[int, int] = (1200, 900)
+GIF_FRAMES: int = 10
+THUMBNAIL_AREAS: Tuple[Tuple[int, int], ...] = ((80, 80), (320, 320))
+
+
+def _measure(resize: Callable[[], None], repeat: int) -> Dict[str, float]:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resize()
+        timings.append(time.perf_counter() - start)
+    return {"median_ms": percentile(timings, 50) * 1000}
+
+
+def _single_resample(
+    img: Image.Image,
+    area: Tuple[int, int],
+    resample: Image.Resampling,
+) -> Callable[[], None]:
+    # same output size of resize_with_crop_and_paddings, without the reduction
+    scale = max(area[0] / img.width, area[1] / img.height)
+    size = (round(img.width * scale), round(img.height * scale))
+    return lambda: img.resize(size, resample=resample).crop((0, 0, *area))
+
+
+def _reduced_resample(
+    img: Image.Image,
+    area: Tuple[int, int],
+    resample: Image.Resampling,
+) -> Callable[[], None]:
+    return lambda: resize_with_crop_and_paddings(
+        img=img,
+        requested_x=area[0],
+        requested_y=area[1],
+        resample=resample,
+    )
+
+
+def _gif_resample(
+    content: bytes,
+    area: Tuple[int, int],
+    resample: Image.Resampling,
+) -> Callable[[], None]:
+    def _resize() -> None:
+        gif = parse_to_valid_gif(io.BytesIO(content))
+        pipeline = resize_with_crop_and_paddings(
+            img=gif,
+            requested_x=area[0],
+            requested_y=area[1],
+            resample=resample,
+        )
+        for _ in pipeline.frames():
+            pass
+
+    return _resize
+
+
+def main(repeat: int) -> None:
+    results = []
+    for source_size in IMAGE_SIZES:
+        img = parse_to_valid_image(content=create_image_buffer(source_size, "PNG"))
+        for area in THUMBNAIL_AREAS:
+            baseline = _measure(
+                _single_resample(img, area, Image.Resampling.BICUBIC),
+                repeat,
+            )
+            for quality in ImageQualityEnum:
+                resample = quality.get_resample_filter()
+                single = _measure(_single_resample(img, area, resample), repeat)
+                reduced = _measure(_reduced_resample(img, area, resample), repeat)
+                results.append(
+                    {
+                        "source": list(source_size),
+                        "area": list(area),
+                        "quality": quality.value,
+                        "filter": resample.name,
+                        "previous_bicubic": baseline,
+                        "single_resample": single,
+                        "reduced_resample": reduced,
+                        "speedup": baseline["median_ms"] / reduced["median_ms"],
+                    },
+                )
+    gif_content = create_gif_buffer(GIF_SIZE, GIF_FRAMES).getvalue()
+    for area in THUMBNAIL_AREAS:
+        for quality in ImageQualityEnum:
+            resample = quality.get_resample_filter()
+            results.append(
+                {
+                    "source": [*GIF_SIZE, GIF_FRAMES],
+                    "area": list(area),
+                    "quality": quality.value,
+                    "filter": resample.name,
+                    "gif_decode_and_resize": _measure(
+                        _gif_resample(gif_content, area, resample),
+                        repeat,
+                    ),
+                },
+            )
+    write_results({"benchmark": "resize", "results": results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args().repeat)
@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Measures the memory needed by split_pdf to extract the first pages
+of a big PDF (500 MB by default), when the PDF is read in memory first
+and when it is passed as the file on disk it already is (a download
+or an upload bigger than the spool size).
+Every case runs in a new process, the peak memory is the increase of the
+resident memory high-water mark (Linux VmHWM), reset just before the case.
+
+Usage: python -m benchmarks.bench_split_pdf_memory [--size-mb N] [--last-page N]
+"""
+
+import argparse
+import io
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Tuple
+
+from app.core.services.document_manipulation.document_manipulation import split_pdf
+from benchmarks.utils import (
+    create_pdf_file,
+    read_memory_status,
+    reset_peak_memory,
+    write_results,
+)
+
+# every page has an uncompressed image of about 5 MB
+PAGE_IMAGE_SIZE: Tuple[int, int] = (1300, 1300)
+
+OPENERS: Dict[str, Callable[[Path], IO[bytes]]] = {
+    "in_memory": lambda path: io.BytesIO(path.read_bytes()),
+    "on_disk": lambda path: path.open("rb"),
+}
+
+
+def _run_case(opener_name: str, path: Path, last_page: int) -> Dict[str, Any]:
+    """
+    Runs the case in the current process, it must be a new one
+    \f
+    :param opener_name: name of the function opening the PDF
+    :param path: PDF to split
+    :param last_page: last page to extract, starting from the first
+    :return: wall time, peak memory increase and size of the split PDF
+    """
+    reset_peak_memory()
+    memory_before = read_memory_status()["VmRSS"]
+    start = time.perf_counter()
+    with OPENERS[opener_name](path) as content:
+        output = split_pdf(
+            content=content,
+            first_page_number=1,
+            last_page_number=last_page,
+        )
+    wall_time = time.perf_counter() - start
+    peak_after = read_memory_status()["VmHWM"]
+    return {
+        "wall_ms": wall_time * 1000,
+        "peak_memory_mb": (peak_after - memory_before) / 1024,
+        "output_bytes": len(output.getvalue()),
+    }
+
+
+def main(size_mb: int, last_page: int) -> None:
+    page_bytes = 3 * PAGE_IMAGE_SIZE[0] * PAGE_IMAGE_SIZE[1]
+    pages = max(last_page, size_mb * 1024 * 1024 // page_bytes)
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "big.pdf"
+        create_pdf_file(path, pages, PAGE_IMAGE_SIZE)
+        for opener_name in OPENERS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                measures = executor.submit(
+                    _run_case,
+                    opener_name,
+                    path,
+                    last_page,
+                ).result()
+            results.append({"input": opener_name, **measures})
+        input_bytes = path.stat().st_size
+    write_results(
+        {
+            "benchmark": "split_pdf_memory",
+            "input_bytes": input_bytes,
+            "pages": pages,
+            "requested_pages": [1, last_page],
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=500)
+    parser.add_argument("--last-page", type=int, default=3)
+    args = parser.parse_args()
+    main(args.size_mb, args.last_page)
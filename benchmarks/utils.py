@@ -0,0 +1,262 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+import json
+import random
+import sys
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+# sizes in points (1/72 inch) of PDF pages
+A4_PAGE_SIZE: Tuple[int, int] = (595, 842)
+A0_PAGE_SIZE: Tuple[int, int] = (2384, 3370)
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of the given values
+    \f
+    :param values: values to analyze
+    :param percent: percentile to compute, from 0 to 100
+    :return: the percentile, 0 if there are no values
+    """
+    if not values:
+        return 0.0
+    ordered: List[float] = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def create_image_buffer(
+    size: Sequence[int],
+    image_format: str = "JPEG",
+    mode: str = "RGB",
+) -> io.BytesIO:
+    """
+    Creates a deterministic, non uniform image, so that the encoders
+    cannot take shortcuts on flat colors
+    \f
+    :param size: width and height of the image
+    :param image_format: Pillow format to save the image with
+    :param mode: Pillow mode of the image
+    :return: buffer containing the encoded image
+    """
+    buffer = io.BytesIO()
+    _create_image(size).convert(mode).save(buffer, format=image_format)
+    buffer.seek(0)
+    return buffer
+
+
+def create_gif_buffer(size: Sequence[int], frames: int) -> io.BytesIO:
+    """
+    Creates a deterministic animated GIF, with a different shape on every frame
+    \f
+    :param size: width and height of the frames
+    :param frames: number of frames
+    :return: buffer containing the encoded GIF
+    """
+    width, height = size
+    background = _create_image(size).quantize(colors=64)
+    images: List[Image.Image] = []
+    for index in range(frames):
+        frame = background.copy()
+        left = index * 7 % width
+        ImageDraw.Draw(frame).ellipse(
+            (left, height // 4, left + width // 4, height * 3 // 4),
+            fill=index % 64,
+        )
+        images.append(frame)
+    buffer = io.BytesIO()
+    images[0].save(
+        buffer,
+        format="GIF",
+        save_all=True,
+        append_images=images[1:],
+        duration=40,
+        loop=0,
+    )
+    buffer.seek(0)
+    return buffer
+
+
+def create_pdf_buffer(
+    pages: int,
+    page_size: Tuple[int, int] = A4_PAGE_SIZE,
+) -> io.BytesIO:
+    """
+    Creates a deterministic PDF, each page containing text and vector shapes
+    laid out on an A4 page and scaled to the page size
+    \f
+    :param pages: number of pages
+    :param page_size: width and height of the pages in points
+    :return: buffer containing the PDF
+    """
+    buffer = io.BytesIO()
+    _write_pdf(buffer, pages, page_size)
+    buffer.seek(0)
+    return buffer
+
+
+def create_pdf_file(
+    path: Path,
+    pages: int,
+    image_size: Tuple[int, int],
+    page_size: Tuple[int, int] = A4_PAGE_SIZE,
+) -> None:
+    """
+    Writes a deterministic PDF to disk one object at a time, like
+    create_pdf_buffer but with an uncompressed noise image of the given size
+    in the background of every page, to create big files without keeping
+    them in memory (each page is 3 * width * height bytes)
+    \f
+    :param path: where to write the PDF
+    :param pages: number of pages
+    :param image_size: width and height in pixels of the image of each page
+    :param page_size: width and height of the pages in points
+    """
+    with path.open("wb") as out:
+        _write_pdf(out, pages, page_size, image_size)
+
+
+def _write_pdf(
+    out: IO[bytes],
+    pages: int,
+    page_size: Tuple[int, int],
+    image_size: Optional[Tuple[int, int]] = None,
+) -> None:
+    objects_per_page = 2 if image_size is None else 3
+    page_ids = [4 + objects_per_page * index for index in range(pages)]
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    image = (
+        b"" if image_size is None else _create_noise(3 * image_size[0] * image_size[1])
+    )
+    offsets: List[int] = []
+
+    def _write_object(pdf_object: bytes) -> None:
+        offsets.append(out.tell())
+        out.write(f"{len(offsets)} 0 obj\n".encode() + pdf_object + b"\nendobj\n")
+
+    out.write(b"%PDF-1.4\n")
+    _write_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+    _write_object(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    _write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for index, page_id in enumerate(page_ids):
+        stream = _create_pdf_page_content(index, page_size)
+        resources = "/Font << /F1 3 0 R >>"
+        if image_size is not None:
+            resources += f" /XObject << /Im1 {page_id + 2} 0 R >>"
+            stream = (
+                f"q {page_size[0]} 0 0 {page_size[1]} 0 0 cm /Im1 Do Q\n".encode()
+                + stream
+            )
+        _write_object(
+            (
+                "<< /Type /Page /Parent 2 0 R"
+                f" /MediaBox [0 0 {page_size[0]} {page_size[1]}]"
+                f" /Resources << {resources} >>"
+                f" /Contents {page_id + 1} 0 R >>"
+            ).encode(),
+        )
+        _write_object(
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream",
+        )
+        if image_size is not None:
+            _write_object(
+                (
+                    "<< /Type /XObject /Subtype /Image"
+                    f" /Width {image_size[0]} /Height {image_size[1]}"
+                    " /ColorSpace /DeviceRGB /BitsPerComponent 8"
+                    f" /Length {len(image)} >>\nstream\n"
+                ).encode()
+                + image
+                + b"\nendstream",
+            )
+
+    xref_offset = out.tell()
+    out.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(
+        (
+            f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n"
+        ).encode(),
+    )
+
+
+def _create_noise(size: int) -> bytes:
+    return random.Random(size).getrandbits(8 * size).to_bytes(size, "little")
+
+
+def _create_image(size: Sequence[int]) -> Image.Image:
+    width, height = size
+    gradient = Image.linear_gradient("L").resize((width, height))
+    # seeded noise, generated at a lower resolution to look like a texture
+    noise_size = (max(1, width // 4), max(1, height // 4))
+    noise = Image.frombytes(
+        "L",
+        noise_size,
+        random.Random(width * height)
+        .getrandbits(8 * noise_size[0] * noise_size[1])
+        .to_bytes(noise_size[0] * noise_size[1], "little"),
+    ).resize((width, height))
+    return Image.merge(
+        "RGB",
+        (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)),
+    )
+
+
+def _create_pdf_page_content(index: int, page_size: Tuple[int, int]) -> bytes:
+    scale_x = page_size[0] / A4_PAGE_SIZE[0]
+    scale_y = page_size[1] / A4_PAGE_SIZE[1]
+    lines = [
+        f"{scale_x:.4f} 0 0 {scale_y:.4f} 0 0 cm",
+        f"BT /F1 24 Tf 72 780 Td (Page {index + 1}) Tj ET",
+    ]
+    lines.extend(
+        f"BT /F1 10 Tf 72 {750 - row * 14} Td"
+        f" (Lorem ipsum dolor sit amet, line {row} of page {index + 1}) Tj ET"
+        for row in range(40)
+    )
+    lines.extend(
+        f"{column / 10:.1f} 0.4 0.8 rg {72 + column * 45} 60 40"
+        f" {20 + (index + column) % 60} re f"
+        for column in range(10)
+    )
+    return "\n".join(lines).encode()
+
+
+def read_memory_status() -> Dict[str, int]:
+    """
+    \f
+    :return: current (VmRSS) and peak (VmHWM) resident memory of the process in kB
+    """
+    with Path("/proc/self/status").open() as status:
+        return {
+            name: int(value.split()[0])
+            for name, value in (line.split(":", 1) for line in status)
+            if name in ("VmRSS", "VmHWM")
+        }
+
+
+def reset_peak_memory() -> None:
+    """
+    Resets the peak resident memory (VmHWM) of the process to the current one
+    """
+    with Path("/proc/self/clear_refs").open("w") as clear_refs:
+        clear_refs.write("5")
+
+
+def write_results(results: Any) -> None:
+    """
+    Writes the benchmark results as json on the standard output,
+    so that runs can be compared with each other
+    \f
+    :param results: json serializable results
+    """
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
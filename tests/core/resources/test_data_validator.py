@@ -2,16 +2,27 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import io
 import unittest
+from unittest.mock import patch
 
-from fastapi import status
+from fastapi import HTTPException, status
 from httpx import Response
 from returns.maybe import Maybe, Nothing
 
+from app.core.resources import data_validator
 from app.core.resources.constants import message
 from app.core.resources.data_validator import (
     check_for_storage_response_error,
+    create_image_metadata_dict,
+    negotiate_output_format,
 )
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.vertical_crop_position_enum import (
+    VerticalCropPositionEnum,
+)
+from app.core.resources.schemas.storage_file import StorageFile
 
 
 class TestDataValidator(unittest.TestCase):
@@ -55,10 +66,70 @@ class TestDataValidator(unittest.TestCase):
             result = check_for_storage_response_error(
                 response_data=Maybe.from_value(test_response),
             )
+            if i == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE:
+                expected_message = message.FILE_TOO_LARGE
+            elif i >= 500:
+                expected_message = message.STORAGE_UNAVAILABLE_STRING
+            else:
+                expected_message = message.GENERIC_ERROR_WITH_STORAGE
             self.assertEqual(
                 result.value_or(Response(status_code=200)).body.decode("utf-8"),
-                message.STORAGE_UNAVAILABLE_STRING
-                if i >= 500
-                else message.GENERIC_ERROR_WITH_STORAGE,
+                expected_message,
             )
             self.assertEqual(result.value_or(Response(status_code=200)).status_code, i)
+
+    def test_check_for_response_error_file_too_large(self):
+        result = check_for_storage_response_error(
+            response_data=Maybe.from_value(
+                StorageFile(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content=io.BytesIO(),
+                ),
+            ),
+        )
+        self.assertEqual(
+            result.value_or(Response(status_code=200)).body.decode("utf-8"),
+            message.FILE_TOO_LARGE,
+        )
+
+    def test_negotiate_output_format_keeps_the_requested_format(self):
+        with patch.object(data_validator, "NEGOTIATE_OUTPUT_FORMAT", True):
+            result = negotiate_output_format(ImageTypeEnum.PNG, "image/webp")
+
+        self.assertEqual((ImageTypeEnum.PNG, ""), result)
+
+    def test_negotiate_output_format_chooses_webp_when_accepted(self):
+        with patch.object(data_validator, "NEGOTIATE_OUTPUT_FORMAT", True):
+            accepted = negotiate_output_format(
+                None,
+                "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+            )
+            refused = negotiate_output_format(None, "image/webp;q=0, image/*")
+
+        self.assertEqual((ImageTypeEnum.WEBP, "Accept"), accepted)
+        self.assertEqual((ImageTypeEnum.JPEG, "Accept"), refused)
+
+    def test_negotiate_output_format_is_jpeg_when_disabled(self):
+        with patch.object(data_validator, "NEGOTIATE_OUTPUT_FORMAT", False):
+            result = negotiate_output_format(None, "image/webp")
+
+        self.assertEqual((ImageTypeEnum.JPEG, ""), result)
+
+    def test_create_image_metadata_dict_rejects_a_too_large_area(self):
+        with self.assertRaises(HTTPException) as error:
+            create_image_metadata_dict(
+                quality=ImageQualityEnum.MEDIUM,
+                output_format=ImageTypeEnum.JPEG,
+                crop_position=VerticalCropPositionEnum.CENTER,
+                area="99999x99999",
+            )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, error.exception.status_code)
+        self.assertEqual(message.AREA_TOO_LARGE_ERROR, error.exception.detail)
+        # the original size is checked when it is known
+        create_image_metadata_dict(
+            quality=ImageQualityEnum.MEDIUM,
+            output_format=ImageTypeEnum.JPEG,
+            crop_position=VerticalCropPositionEnum.CENTER,
+            area="99999x0",
+        )
@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+import unittest
+from unittest.mock import patch
+
+import respx
+from fastapi import status
+from fastapi.testclient import TestClient
+from httpx import Response
+from pypdfium2 import PdfDocument
+
+from app.controller import app
+from app.core.resources import data_validator
+from app.core.resources.app_config import (
+    DOC_NAME,
+    DOCUMENT_CONVERSION_FULL_CONVERT_ADDRESS,
+    SERVICE_NAME,
+    STORAGE_DOWNLOAD_API,
+    STORAGE_FULL_ADDRESS,
+)
+from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
+from app.core.services import conversion_cache, rendition_cache
+from app.core.services.rendition_cache import RenditionCache
+
+FILE_ID = "da2dcce7-cd87-423c-a6c9-38c527ab6e6a"
+STORAGE_URL = (
+    f"{STORAGE_FULL_ADDRESS}/{STORAGE_DOWNLOAD_API}"
+    f"?node={FILE_ID}&version=1&type={ServiceTypeEnum.FILES.value}"
+)
+PREVIEW_URL = f"/{SERVICE_NAME}/{DOC_NAME}/{FILE_ID}/1/?service_type=files"
+
+
+def _create_pdf() -> bytes:
+    pdf = PdfDocument.new()
+    pdf.new_page(595, 842)
+    content = io.BytesIO()
+    pdf.save(content)
+    return content.getvalue()
+
+
+class TestGetPreview(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.patches = [
+            patch.object(data_validator, "ENABLE_DOCUMENT_PREVIEW", True),
+            patch.object(
+                rendition_cache,
+                "rendition_cache",
+                RenditionCache(max_size=1024 * 1024, ttl=60),
+            ),
+            patch.object(conversion_cache.conversion_cache, "max_size", 0),
+        ]
+        for started_patch in self.patches:
+            started_patch.start()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        for started_patch in self.patches:
+            started_patch.stop()
+
+    def test_failed_conversion_is_not_cached(self):
+        with respx.mock(assert_all_mocked=False) as mock, TestClient(app) as client:
+            mock.get(STORAGE_URL).mock(return_value=Response(200, content=b"doc"))
+            docs_editor = mock.post(f"{DOCUMENT_CONVERSION_FULL_CONVERT_ADDRESS}/pdf")
+            docs_editor.side_effect = [
+                Response(status.HTTP_500_INTERNAL_SERVER_ERROR),
+                Response(status.HTTP_200_OK, content=_create_pdf()),
+            ]
+            failed = client.get(PREVIEW_URL)
+            recovered = client.get(PREVIEW_URL)
+
+        self.assertEqual(status.HTTP_502_BAD_GATEWAY, failed.status_code)
+        self.assertEqual(status.HTTP_200_OK, recovered.status_code)
+        self.assertEqual(1, len(PdfDocument(recovered.content)))
+        self.assertEqual(2, docs_editor.call_count)
+
+    def test_failed_conversion_has_no_etag_nor_cache_control(self):
+        with respx.mock(assert_all_mocked=False) as mock, TestClient(app) as client:
+            mock.get(STORAGE_URL).mock(return_value=Response(200, content=b"doc"))
+            mock.post(f"{DOCUMENT_CONVERSION_FULL_CONVERT_ADDRESS}/pdf").mock(
+                return_value=Response(status.HTTP_500_INTERNAL_SERVER_ERROR),
+            )
+            response = client.get(PREVIEW_URL)
+
+        self.assertEqual(status.HTTP_502_BAD_GATEWAY, response.status_code)
+        self.assertNotIn("etag", response.headers)
+        self.assertNotIn("cache-control", response.headers)
@@ -0,0 +1,42 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import unittest
+from unittest.mock import patch
+
+import respx
+from fastapi import status
+from fastapi.testclient import TestClient
+from httpx import Response
+
+from app.controller import app
+from app.core.resources.app_config import DOCUMENT_CONVERSION_FULL_SERVICE_ADDRESS
+from app.core.resources.constants import message
+from app.core.routers import health
+
+
+class TestHealthReady(unittest.TestCase):
+    def test_ready_when_the_docs_editor_is_up(self):
+        with patch.object(health, "ARE_DOCS_ENABLED", True), respx.mock(
+            assert_all_mocked=False,
+        ) as mock, TestClient(app) as client:
+            docs_editor = mock.get(DOCUMENT_CONVERSION_FULL_SERVICE_ADDRESS).mock(
+                return_value=Response(status.HTTP_200_OK),
+            )
+            response = client.get("/health/ready/")
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(docs_editor.called)
+
+    def test_not_ready_when_the_docs_editor_is_down(self):
+        with patch.object(health, "ARE_DOCS_ENABLED", True), respx.mock(
+            assert_all_mocked=False,
+        ) as mock, TestClient(app) as client:
+            mock.get(DOCUMENT_CONVERSION_FULL_SERVICE_ADDRESS).mock(
+                return_value=Response(status.HTTP_503_SERVICE_UNAVAILABLE),
+            )
+            response = client.get("/health/ready/")
+
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+        self.assertEqual(message.DOCS_EDITOR_UNAVAILABLE_STRING, response.text)
@@ -3,8 +3,10 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import io
+import tempfile
 
 import pytest
+from fastapi import HTTPException, status
 from pypdfium2 import PdfDocument
 from returns.maybe import Maybe
 
@@ -82,3 +84,105 @@ def test_sanitize_libre_extension(expect, in_out_extensions_tuple):
 
     # Then
     assert result is output_format
+
+
+@pytest.mark.parametrize(
+    "requested_x, requested_y, expected_scale",
+    [(0, 80, 1), (80, 0, 1), (1000, 1000, 1), (80, 80, 160 / 1000)],
+)
+def test_get_render_scale(requested_x, requested_y, expected_scale):
+    # When
+    result = document_manipulation._get_render_scale(
+        (1000, 2000),
+        requested_x,
+        requested_y,
+    )
+
+    # Then
+    assert result == pytest.approx(expected_scale)
+
+
+def test_render_pdf_page_large_page_rendered_at_requested_scale():
+    # Given
+    pdf = PdfDocument.new()
+    pdf.new_page(2384, 3370)
+    content = io.BytesIO()
+    pdf.save(content)
+    content.seek(0)
+
+    # When
+    result = document_manipulation.render_pdf_page(content, 0, 80, 80)
+
+    # Then
+    assert result.size == (160, 227)
+
+
+def test_render_pdf_page_invalid_pdf():
+    # When
+    with pytest.raises(HTTPException) as exception:
+        document_manipulation.render_pdf_page(io.BytesIO(b"not a pdf"), 0)
+
+    # Then
+    assert exception.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def _create_pdf(pages: int) -> bytes:
+    pdf = PdfDocument.new()
+    for _ in range(pages):
+        pdf.new_page(595, 842)
+    content = io.BytesIO()
+    pdf.save(content)
+    return content.getvalue()
+
+
+def test_split_pdf_file_on_disk():
+    # Given
+    with tempfile.SpooledTemporaryFile(max_size=1) as content:
+        content.write(_create_pdf(5))
+        content.seek(0)
+
+        # When
+        result = document_manipulation.split_pdf(content, 2, 3)
+
+    # Then
+    assert len(PdfDocument(result)) == 2
+
+
+def test_split_pdf_spooled_file_in_memory_is_not_written_to_disk():
+    # Given
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as content:
+        content.write(_create_pdf(5))
+        content.seek(0)
+
+        # When
+        result = document_manipulation.split_pdf(content, 1, 1)
+
+        # Then
+        assert not content._rolled
+    assert len(PdfDocument(result)) == 1
+
+
+def test_get_file_descriptor():
+    with tempfile.TemporaryFile() as file_on_disk:
+        assert (
+            document_manipulation._get_file_descriptor(file_on_disk)
+            == file_on_disk.fileno()
+        )
+    assert document_manipulation._get_file_descriptor(io.BytesIO(b"pdf")) is None
+
+
+@pytest.mark.parametrize(
+    "head, expected_result",
+    [(b"%PDF-1.7\n", True), (b"\x00" * 100 + b"%PDF-1.4", True), (b"<html>", False)],
+)
+def test_has_pdf_header(head, expected_result):
+    # Given
+    content = io.BytesIO(head + b"content")
+    content.seek(3)
+
+    # When
+    result = document_manipulation.has_pdf_header(content)
+
+    # Then
+    assert result == expected_result
+    assert content.tell() == 0
@@ -2,12 +2,14 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 import io
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import pytest
-from PIL import Image
+from fastapi import HTTPException, status
+from PIL import Image, ImageSequence
 
-from app.core.services.image_manipulation import gif_utility_functions
+from app.core.services import metrics
+from app.core.services.image_manipulation import gif_utility_functions, image_probe
 
 
 def test_is_img_a_gif_not_a_valid_img_should_return_false():
@@ -34,3 +36,133 @@ def test_parse_to_gif_with_invalid_image_content():
         content: io.BytesIO = io.BytesIO()
         Image.new("RGB", (80, 80)).save(content)
         gif_utility_functions.parse_to_valid_gif(content)
+
+
+def _create_gif_buffer(size=(64, 48), n_frames=5) -> io.BytesIO:
+    frames = [
+        Image.new("RGB", size, (i * 40 % 256, 255 - i * 40 % 256, 0))
+        for i in range(n_frames)
+    ]
+    buffer = io.BytesIO()
+    frames[0].save(
+        buffer,
+        format="GIF",
+        save_all=True,
+        append_images=frames[1:],
+        duration=70,
+        loop=0,
+    )
+    buffer.seek(0)
+    return buffer
+
+
+def test_gif_operations_are_not_applied_until_saved():
+    gif = gif_utility_functions.parse_to_valid_gif(_create_gif_buffer())
+
+    pipeline = gif_utility_functions.crop_gif(
+        gif_utility_functions.resize_gif(gif, (32, 24)),
+        (4, 0, 28, 24),
+    )
+
+    assert isinstance(pipeline, gif_utility_functions.GifFramePipeline)
+    assert gif_utility_functions.is_img_a_gif(pipeline) is True
+    assert pipeline.size == (24, 24)
+    assert len(pipeline.operations) == 2
+    assert pipeline.source is gif
+
+
+def test_save_gif_pipeline_applies_every_operation_in_a_single_encode():
+    gif = gif_utility_functions.parse_to_valid_gif(_create_gif_buffer())
+    pipeline = gif_utility_functions.add_circle_margins_to_gif(
+        gif_utility_functions.resize_gif(gif, (32, 24)),
+    )
+
+    result = Image.open(
+        gif_utility_functions.save_gif_to_buffer(pipeline, io.BytesIO(), quality=60),
+    )
+
+    assert result.size == (32, 24)
+    assert result.n_frames == 5
+    assert result.info["duration"] == 70
+
+
+def test_save_gif_pipeline_observes_each_stage_once_for_all_the_frames():
+    gif = gif_utility_functions.parse_to_valid_gif(_create_gif_buffer())
+    pipeline = gif_utility_functions.add_circle_margins_to_gif(
+        gif_utility_functions.resize_gif(gif, (32, 24)),
+    )
+
+    with patch.object(
+        gif_utility_functions,
+        "observe_stage_duration",
+        wraps=metrics.observe_stage_duration,
+    ) as observe_stage_duration:
+        gif_utility_functions.save_gif_to_buffer(pipeline, io.BytesIO(), quality=60)
+
+    observed_stages = [call.args[0] for call in observe_stage_duration.call_args_list]
+    assert sorted(observed_stages) == sorted(
+        [
+            metrics.STAGE_DECODE,
+            metrics.STAGE_TRANSFORM,
+            metrics.STAGE_MASK,
+            metrics.STAGE_ENCODE,
+        ],
+    )
+    for call in observe_stage_duration.call_args_list:
+        assert call.args[1] > 0
+
+
+def test_paste_gif_pads_every_frame_on_the_background():
+    gif = gif_utility_functions.parse_to_valid_gif(_create_gif_buffer())
+    background = Image.new("RGB", (96, 48))
+
+    pipeline = gif_utility_functions.paste_gif(background, gif, (16, 0))
+    frames = list(pipeline.frames())
+
+    assert len(frames) == 5
+    for frame in frames:
+        assert frame.size == (96, 48)
+        assert frame.getpixel((0, 0)) == (0, 0, 0)
+        assert frame.getpixel((48, 24)) != (0, 0, 0)
+    # the background given is used as a base, but it is never modified
+    assert background.getpixel((48, 24)) == (0, 0, 0)
+
+
+def test_gif_pipeline_frames_match_source_frames():
+    buffer = _create_gif_buffer()
+    expected = [
+        frame.resize((16, 12)).tobytes()
+        for frame in ImageSequence.Iterator(Image.open(io.BytesIO(buffer.getvalue())))
+    ]
+    gif = gif_utility_functions.parse_to_valid_gif(buffer)
+
+    frames = gif_utility_functions.resize_gif(gif, (16, 12)).frames()
+
+    assert [frame.tobytes() for frame in frames] == expected
+
+
+def test_resize_gif_resamples_every_frame_with_the_given_filter():
+    buffer = _create_gif_buffer()
+    expected = [
+        frame.resize((16, 12), Image.Resampling.BOX, reducing_gap=2.0).tobytes()
+        for frame in ImageSequence.Iterator(Image.open(io.BytesIO(buffer.getvalue())))
+    ]
+    gif = gif_utility_functions.parse_to_valid_gif(buffer)
+
+    frames = gif_utility_functions.resize_gif(
+        gif,
+        (16, 12),
+        resample=Image.Resampling.BOX,
+    ).frames()
+
+    assert [frame.tobytes() for frame in frames] == expected
+
+
+def test_parse_to_valid_gif_rejects_too_many_pixels_in_all_frames():
+    buffer = _create_gif_buffer(size=(64, 48), n_frames=5)
+
+    with patch.object(image_probe, "IMAGE_MAX_ANIMATION_PIXELS", 64 * 48 * 4):
+        with pytest.raises(HTTPException) as error:
+            gif_utility_functions.parse_to_valid_gif(buffer)
+
+    assert error.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
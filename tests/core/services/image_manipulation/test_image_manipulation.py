@@ -4,12 +4,16 @@
 import io
 from unittest.mock import MagicMock, patch
 
-from PIL import Image, ImageOps
+import pytest
+from fastapi import HTTPException, status
+from PIL import Image, ImageChops, ImageCms, ImageOps, ImageStat, JpegImagePlugin
 
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
 from app.core.resources.schemas.enums.vertical_crop_position_enum import (
     VerticalCropPositionEnum,
 )
 from app.core.services.image_manipulation import image_manipulation
+from tests.core.services.image_manipulation.test_image_probe import create_png_header
 
 
 def truncate(f, n):
@@ -24,13 +28,59 @@ def truncate(f, n):
 def test_save_image_to_buffer():
     img_to_save = MagicMock()
     img_to_save.save = MagicMock()
-    ImageOps.exif_transpose = MagicMock(return_value=img_to_save)
-    buffer = image_manipulation.save_image_to_buffer(img_to_save)
+    with patch.object(ImageOps, "exif_transpose", return_value=img_to_save):
+        buffer = image_manipulation.save_image_to_buffer(img_to_save)
 
     assert img_to_save.save.call_count == 1
     assert [] == buffer.readlines()
 
 
+def test_save_image_to_buffer_lowest_jpeg_profile_is_baseline_without_icc():
+    img = Image.new("RGB", (64, 64), "red")
+    img.info["icc_profile"] = ImageCms.ImageCmsProfile(
+        ImageCms.createProfile("sRGB"),
+    ).tobytes()
+
+    buffer = image_manipulation.save_image_to_buffer(
+        img,
+        _jpeg_profile=ImageQualityEnum.LOWEST.get_jpeg_encoder_profile(),
+    )
+
+    result = Image.open(buffer)
+    assert not result.info.get("progressive")
+    assert result.info.get("icc_profile") is None
+    assert JpegImagePlugin.get_sampling(result) == 2
+
+
+def test_save_image_to_buffer_highest_jpeg_profile_keeps_color_and_icc():
+    img = Image.new("RGB", (64, 64), "red")
+    img.info["icc_profile"] = ImageCms.ImageCmsProfile(
+        ImageCms.createProfile("sRGB"),
+    ).tobytes()
+
+    buffer = image_manipulation.save_image_to_buffer(
+        img,
+        _jpeg_profile=ImageQualityEnum.HIGHEST.get_jpeg_encoder_profile(),
+    )
+
+    result = Image.open(buffer)
+    assert result.info.get("progressive")
+    assert result.info.get("icc_profile") == img.info["icc_profile"]
+    assert JpegImagePlugin.get_sampling(result) == 0
+
+
+def test_save_image_to_buffer_jpeg_profile_drops_icc_of_another_color_space():
+    img = Image.new("RGB", (64, 64), "red")
+    img.info["icc_profile"] = b"\0" * 16 + b"CMYK" + b"\0" * 108
+
+    buffer = image_manipulation.save_image_to_buffer(
+        img,
+        _jpeg_profile=ImageQualityEnum.HIGHEST.get_jpeg_encoder_profile(),
+    )
+
+    assert Image.open(buffer).info.get("icc_profile") is None
+
+
 def test_find_scaled_dimension_higher_than_original_square_result():
     orig_x, orig_y = 346, 826
     result = image_manipulation._find_greater_scaled_dimensions(
@@ -502,3 +552,279 @@ def test_get_crop_coordinates_center_not_enough_space():
 def test_parse_to_valid_image_invalid_image():
     result = image_manipulation.parse_to_valid_image(content=io.BytesIO(b""))
     assert result.size == (40, 40)
+
+
+def _create_image_buffer(size, image_format):
+    content = io.BytesIO()
+    Image.linear_gradient("L").resize(size).convert("RGB").save(
+        content,
+        format=image_format,
+    )
+    content.seek(0)
+    return content
+
+
+def test_parse_to_valid_image_jpeg_is_drafted_to_requested_size():
+    content = _create_image_buffer((2400, 1600), "JPEG")
+
+    result = image_manipulation.parse_to_valid_image(
+        content=content,
+        requested_x=80,
+        requested_y=80,
+    )
+
+    assert result.size < (2400, 1600)
+    assert min(result.size) >= 160
+
+
+def test_parse_to_valid_image_jpeg_original_size_requested_is_not_drafted():
+    content = _create_image_buffer((2400, 1600), "JPEG")
+
+    result = image_manipulation.parse_to_valid_image(
+        content=content,
+        requested_x=0,
+        requested_y=80,
+    )
+
+    assert result.size == (2400, 1600)
+
+
+def test_parse_to_valid_image_png_is_not_drafted():
+    content = _create_image_buffer((2400, 1600), "PNG")
+
+    result = image_manipulation.parse_to_valid_image(
+        content=content,
+        requested_x=80,
+        requested_y=80,
+    )
+
+    assert result.size == (2400, 1600)
+
+
+def test_drafted_jpeg_keeps_the_output_size():
+    for requested_x, requested_y in [(80, 80), (320, 100), (100, 500)]:
+        drafted = image_manipulation.parse_to_valid_image(
+            content=_create_image_buffer((4000, 3000), "JPEG"),
+            requested_x=requested_x,
+            requested_y=requested_y,
+        )
+        full = image_manipulation.parse_to_valid_image(
+            content=_create_image_buffer((4000, 3000), "JPEG"),
+        )
+
+        assert (
+            image_manipulation.resize_with_crop_and_paddings(
+                img=drafted,
+                requested_x=requested_x,
+                requested_y=requested_y,
+            ).size
+            == image_manipulation.resize_with_crop_and_paddings(
+                img=full,
+                requested_x=requested_x,
+                requested_y=requested_y,
+            ).size
+        )
+        assert (
+            image_manipulation.resize_with_paddings(
+                img=drafted,
+                requested_x=requested_x,
+                requested_y=requested_y,
+            ).size
+            == image_manipulation.resize_with_paddings(
+                img=full,
+                requested_x=requested_x,
+                requested_y=requested_y,
+            ).size
+        )
+
+
+def test_reduce_to_requested_size_keeps_the_reducing_gap():
+    img = Image.new("RGB", (4000, 3000))
+
+    result = image_manipulation.reduce_to_requested_size(
+        img=img,
+        requested_x=320,
+        requested_y=320,
+    )
+
+    assert result.size == (1000, 750)
+    assert min(result.size) >= 640
+
+
+def test_reduce_to_requested_size_original_size_requested_is_not_reduced():
+    img = Image.new("RGB", (4000, 3000))
+
+    result = image_manipulation.reduce_to_requested_size(
+        img=img,
+        requested_x=0,
+        requested_y=320,
+    )
+
+    assert result is img
+
+
+def test_reduce_to_requested_size_palette_image_is_not_reduced():
+    img = Image.new("P", (4000, 3000))
+
+    result = image_manipulation.reduce_to_requested_size(
+        img=img,
+        requested_x=80,
+        requested_y=80,
+    )
+
+    assert result is img
+
+
+def test_reduced_image_keeps_the_output_size():
+    full = image_manipulation.parse_to_valid_image(
+        content=_create_image_buffer((4000, 3000), "PNG"),
+    )
+    for requested_x, requested_y in [(80, 80), (320, 100), (100, 500)]:
+        reduced = image_manipulation.reduce_to_requested_size(
+            img=full,
+            requested_x=requested_x,
+            requested_y=requested_y,
+        )
+
+        assert reduced.size < full.size
+        assert (
+            image_manipulation.resize_with_crop_and_paddings(
+                img=reduced,
+                requested_x=requested_x,
+                requested_y=requested_y,
+            ).size
+            == image_manipulation.resize_with_crop_and_paddings(
+                img=full,
+                requested_x=requested_x,
+                requested_y=requested_y,
+            ).size
+        )
+        assert (
+            image_manipulation.resize_with_paddings(
+                img=reduced,
+                requested_x=requested_x,
+                requested_y=requested_y,
+            ).size
+            == image_manipulation.resize_with_paddings(
+                img=full,
+                requested_x=requested_x,
+                requested_y=requested_y,
+            ).size
+        )
+
+
+def test_resize_uses_the_resample_filter_of_the_quality():
+    img = Image.effect_noise((3000, 2000), 64).convert("RGB")
+
+    lowest = image_manipulation.resize_with_paddings(
+        img=img,
+        requested_x=80,
+        requested_y=80,
+        resample=ImageQualityEnum.LOWEST.get_resample_filter(),
+    )
+    highest = image_manipulation.resize_with_paddings(
+        img=img,
+        requested_x=80,
+        requested_y=80,
+        resample=ImageQualityEnum.HIGHEST.get_resample_filter(),
+    )
+
+    assert lowest.size == highest.size == (80, 80)
+    assert lowest.tobytes() != highest.tobytes()
+
+
+def test_resize_reduces_before_resampling_without_visible_loss():
+    img = Image.linear_gradient("L").resize((3000, 2000)).convert("RGB")
+
+    resized = image_manipulation.resize_with_crop_and_paddings(
+        img=img,
+        requested_x=80,
+        requested_y=80,
+        resample=Image.Resampling.LANCZOS,
+    )
+    expected = img.resize((120, 80), Image.Resampling.LANCZOS).crop((20, 0, 100, 80))
+
+    assert resized.size == (80, 80)
+    assert max(ImageStat.Stat(ImageChops.difference(resized, expected)).extrema)[1] <= 2
+
+
+def test_resize_16_bit_image_keeps_the_pillow_filter():
+    img = Image.new("I;16", (400, 300))
+
+    resized = image_manipulation.resize_with_paddings(
+        img=img,
+        requested_x=80,
+        requested_y=80,
+        resample=ImageQualityEnum.HIGHEST.get_resample_filter(),
+    )
+
+    assert resized.size == (80, 80)
+
+
+def test_parse_to_valid_image_rejects_too_many_pixels_before_decoding():
+    # beyond the limit, and beyond the decompression bomb check of Pillow
+    for width, height in [(10000, 9500), (30000, 30000)]:
+        with pytest.raises(HTTPException) as error:
+            image_manipulation.parse_to_valid_image(
+                content=create_png_header(width, height),
+                requested_x=80,
+                requested_y=80,
+            )
+
+        assert error.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+def test_resize_rejects_a_too_large_original_size_before_padding():
+    img = Image.new("RGB", (1000, 1000))
+
+    with pytest.raises(HTTPException) as error:
+        image_manipulation.resize_with_paddings(
+            img=img,
+            requested_x=99999,
+            requested_y=0,
+        )
+
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_create_contact_sheet_pastes_images_in_a_grid():
+    # Given
+    images = [Image.new("RGB", (80, 100), "black") for _ in range(5)]
+    images.append(Image.new("RGB", (40, 100), "black"))
+
+    # When
+    sheet = image_manipulation.create_contact_sheet(images, transparent=False)
+
+    # Then
+    assert sheet.mode == "RGB"
+    assert sheet.size == (240, 200)
+    # the smaller image is centered in the last cell
+    assert sheet.getpixel((170, 150)) == (255, 255, 255)
+    assert sheet.getpixel((200, 150)) == (0, 0, 0)
+
+
+def test_create_contact_sheet_rejects_too_many_pixels_before_allocating():
+    images = [Image.new("RGB", (100, 100)) for _ in range(50)]
+
+    with patch.object(
+        image_manipulation,
+        "IMAGE_MAX_OUTPUT_PIXELS",
+        100 * 100 * 49,
+    ), patch.object(Image, "new") as new, pytest.raises(HTTPException) as error:
+        image_manipulation.create_contact_sheet(images, transparent=False)
+
+    assert error.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    new.assert_not_called()
+
+
+def test_create_contact_sheet_transparent_background():
+    # Given
+    images = [Image.new("RGB", (80, 80), "black") for _ in range(2)]
+
+    # When
+    sheet = image_manipulation.create_contact_sheet(images, transparent=True)
+
+    # Then
+    assert sheet.mode == "RGBA"
+    assert sheet.size == (160, 80)
+    assert sheet.getpixel((40, 40)) == (0, 0, 0, 255)
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+import io
+import struct
+import zlib
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException, status
+from PIL import Image
+
+from app.core.resources.constants import message
+from app.core.services.image_manipulation import image_probe
+from app.core.services.image_manipulation.image_probe import ImageProbe
+
+
+def create_png_header(width: int, height: int) -> io.BytesIO:
+    """
+    Creates a PNG declaring the given size in its header, with no pixels:
+    a crafted file that would allocate the whole image if it were decoded
+    """
+    content = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(content, format="PNG")
+    png = bytearray(content.getvalue())
+    # the IHDR chunk starts after the 8 bytes of the signature
+    png[16:24] = struct.pack(">II", width, height)
+    png[29:33] = struct.pack(">I", zlib.crc32(bytes(png[12:29])))
+    return io.BytesIO(bytes(png))
+
+
+def test_probe_image_reads_the_header_without_decoding():
+    img = Image.open(create_png_header(9000, 8000))
+
+    probe = image_probe.probe_image(img)
+
+    assert probe == ImageProbe(width=9000, height=8000, mode="RGB", n_frames=1)
+    assert img.im is None
+
+
+def test_probe_image_counts_the_frames_only_of_animations():
+    frames = [Image.new("RGB", (20, 10), (color * 60, 0, 0)) for color in range(4)]
+    content = io.BytesIO()
+    frames[0].save(content, format="GIF", save_all=True, append_images=frames[1:])
+    gif = Image.open(content)
+
+    assert image_probe.probe_image(gif).n_frames == 1
+    assert image_probe.probe_image(gif, animated=True).n_frames == 4
+    assert gif.tell() == 0
+
+
+def test_check_image_limits_rejects_too_many_pixels():
+    with patch.object(image_probe, "IMAGE_MAX_SOURCE_PIXELS", 100), pytest.raises(
+        HTTPException,
+    ) as error:
+        image_probe.check_image_limits(ImageProbe(20, 10, "RGB", 1))
+
+    assert error.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert error.value.detail == message.IMAGE_TOO_LARGE
+
+
+def test_check_image_limits_rejects_too_many_frames():
+    image_probe.check_image_limits(ImageProbe(20, 10, "RGB", 1))
+    with patch.object(image_probe, "IMAGE_MAX_ANIMATION_PIXELS", 1000), pytest.raises(
+        HTTPException,
+    ):
+        image_probe.check_image_limits(ImageProbe(20, 10, "RGB", 6))
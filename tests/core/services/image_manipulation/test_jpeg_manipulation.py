@@ -5,11 +5,15 @@ import io
 
 from PIL import Image
 
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
 from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
 from app.core.resources.schemas.enums.vertical_crop_position_enum import (
     VerticalCropPositionEnum,
 )
-from app.core.services.image_manipulation import jpeg_manipulation
+from app.core.services.image_manipulation import (
+    jpeg_manipulation,
+    lossy_manipulation,
+)
 
 
 def test_jpeg_compression_rgb_success_with_crop(expect):
@@ -22,22 +26,24 @@ def test_jpeg_compression_rgb_success_with_crop(expect):
     parse_img: Image.Image = Image.new("RGB", img_size)
     content_data: io.BytesIO = io.BytesIO()
 
-    expect(jpeg_manipulation, times=1).parse_to_valid_image(content_data).thenReturn(
-        parse_img,
-    )
+    expect(jpeg_manipulation, times=1).parse_to_valid_image(
+        content=content_data,
+        requested_x=x,
+        requested_y=y,
+    ).thenReturn(parse_img)
 
-    expect(jpeg_manipulation, times=1).resize_with_crop_and_paddings(
+    expect(lossy_manipulation, times=1).resize_with_crop_and_paddings(
         img=parse_img,
         requested_x=x,
         requested_y=y,
         crop_position=crop_position,
+        resample=quality.get_resample_filter(),
     ).thenReturn(parse_img)
 
-    expect(jpeg_manipulation, times=1).save_image_to_buffer(
+    expect(lossy_manipulation, times=1).save_image_to_buffer(
         img=parse_img,
         _format="JPEG",
-        _optimize=False,
-        _quality_value=quality.get_jpeg_int_quality(),
+        _jpeg_profile=quality.get_jpeg_encoder_profile(),
     ).thenReturn(None)
 
     # When
@@ -62,21 +68,23 @@ def test_jpeg_compression_rgb_success_without_crop(expect):
     parse_img: Image.Image = Image.new("RGB", img_size)
     content_data: io.BytesIO = io.BytesIO()
 
-    expect(jpeg_manipulation, times=1).parse_to_valid_image(content_data).thenReturn(
-        parse_img,
-    )
+    expect(jpeg_manipulation, times=1).parse_to_valid_image(
+        content=content_data,
+        requested_x=x,
+        requested_y=y,
+    ).thenReturn(parse_img)
 
-    expect(jpeg_manipulation, times=1).resize_with_paddings(
+    expect(lossy_manipulation, times=1).resize_with_paddings(
         img=parse_img,
         requested_x=x,
         requested_y=y,
+        resample=quality.get_resample_filter(),
     ).thenReturn(parse_img)
 
-    expect(jpeg_manipulation, times=1).save_image_to_buffer(
+    expect(lossy_manipulation, times=1).save_image_to_buffer(
         img=parse_img,
         _format="JPEG",
-        _optimize=False,
-        _quality_value=quality.get_jpeg_int_quality(),
+        _jpeg_profile=quality.get_jpeg_encoder_profile(),
     ).thenReturn(None)
 
     # When
@@ -101,22 +109,24 @@ def test_jpeg_compression_rgba_success_with_crop(expect):
     parse_img: Image.Image = Image.new("RGBA", img_size)
     content_data: io.BytesIO = io.BytesIO()
 
-    expect(jpeg_manipulation, times=1).parse_to_valid_image(content_data).thenReturn(
-        parse_img,
-    )
+    expect(jpeg_manipulation, times=1).parse_to_valid_image(
+        content=content_data,
+        requested_x=x,
+        requested_y=y,
+    ).thenReturn(parse_img)
 
-    expect(jpeg_manipulation, times=1).resize_with_crop_and_paddings(
+    expect(lossy_manipulation, times=1).resize_with_crop_and_paddings(
         img=parse_img,
         requested_x=x,
         requested_y=y,
         crop_position=VerticalCropPositionEnum.CENTER,
+        resample=quality.get_resample_filter(),
     ).thenReturn(parse_img)
 
-    expect(jpeg_manipulation, times=1).save_image_to_buffer(
+    expect(lossy_manipulation, times=1).save_image_to_buffer(
         img=parse_img.convert("RGB"),
         _format="JPEG",
-        _optimize=False,
-        _quality_value=quality.get_jpeg_int_quality(),
+        _jpeg_profile=quality.get_jpeg_encoder_profile(),
     ).thenReturn(None)
 
     # When
@@ -141,21 +151,23 @@ def test_jpeg_compression_rgba_success_without_crop(expect):
     parse_img: Image.Image = Image.new("RGBA", img_size)
     content_data: io.BytesIO = io.BytesIO()
 
-    expect(jpeg_manipulation, times=1).parse_to_valid_image(content_data).thenReturn(
-        parse_img,
-    )
+    expect(jpeg_manipulation, times=1).parse_to_valid_image(
+        content=content_data,
+        requested_x=x,
+        requested_y=y,
+    ).thenReturn(parse_img)
 
-    expect(jpeg_manipulation, times=1).resize_with_paddings(
+    expect(lossy_manipulation, times=1).resize_with_paddings(
         img=parse_img,
         requested_x=x,
         requested_y=y,
+        resample=quality.get_resample_filter(),
     ).thenReturn(parse_img)
 
-    expect(jpeg_manipulation, times=1).save_image_to_buffer(
+    expect(lossy_manipulation, times=1).save_image_to_buffer(
         img=parse_img.convert("RGB"),
         _format="JPEG",
-        _optimize=False,
-        _quality_value=quality.get_jpeg_int_quality(),
+        _jpeg_profile=quality.get_jpeg_encoder_profile(),
     ).thenReturn(None)
 
     # When
@@ -169,3 +181,20 @@ def test_jpeg_compression_rgba_success_without_crop(expect):
 
     # Then
     assert result is None
+
+
+def test_jpeg_rectangular_thumbnail_of_rgba_and_palette_sources():
+    for mode in ("RGBA", "P"):
+        img = Image.new(mode, (400, 300))
+
+        result = jpeg_manipulation.jpeg_thumbnail_from_image(
+            img=img,
+            _x=100,
+            _y=100,
+            border=ImageBorderShapeEnum.RECTANGULAR,
+            _quality=ImageQualityEnum.MEDIUM,
+        )
+
+        thumbnail = Image.open(result)
+        assert thumbnail.format == "JPEG"
+        assert thumbnail.size == (100, 100)
@@ -18,9 +18,11 @@ def test_png_compression_rgb_success_with_crop(expect):
     parse_img: Image.Image = Image.new("RGB", (20, 20))
     crop_position = VerticalCropPositionEnum.CENTER
     content_data: io.BytesIO = io.BytesIO()
-    expect(png_manipulation, times=1).parse_to_valid_image(content_data).thenReturn(
-        parse_img,
-    )
+    expect(png_manipulation, times=1).parse_to_valid_image(
+        content=content_data,
+        requested_x=x,
+        requested_y=y,
+    ).thenReturn(parse_img)
     expect(png_manipulation, times=1).resize_with_crop_and_paddings(
         img=parse_img,
         requested_x=x,
@@ -46,9 +48,11 @@ def test_png_compression_rgb_success_without_crop(expect):
     y = 0
     parse_img: Image.Image = Image.new("RGB", (20, 20))
     content_data: io.BytesIO = io.BytesIO()
-    expect(png_manipulation, times=1).parse_to_valid_image(content_data).thenReturn(
-        parse_img,
-    )
+    expect(png_manipulation, times=1).parse_to_valid_image(
+        content=content_data,
+        requested_x=x,
+        requested_y=y,
+    ).thenReturn(parse_img)
     expect(png_manipulation, times=1).resize_with_paddings(
         img=parse_img,
         requested_x=x,
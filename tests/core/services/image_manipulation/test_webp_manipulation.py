@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+import io
+
+from PIL import Image
+
+from app.core.resources.schemas.enums.image_border_form_enum import ImageBorderShapeEnum
+from app.core.resources.schemas.enums.image_quality_enum import ImageQualityEnum
+from app.core.resources.schemas.enums.vertical_crop_position_enum import (
+    VerticalCropPositionEnum,
+)
+from app.core.services.image_manipulation import (
+    lossy_manipulation,
+    webp_manipulation,
+)
+
+
+def test_webp_preview_without_crop_saves_with_the_webp_quality(expect):
+    # Given
+    x = 0
+    y = 0
+    parse_img: Image.Image = Image.new("RGB", (20, 20))
+    content_data: io.BytesIO = io.BytesIO()
+    expect(webp_manipulation, times=1).parse_to_valid_image(
+        content=content_data,
+        requested_x=x,
+        requested_y=y,
+    ).thenReturn(parse_img)
+    expect(lossy_manipulation, times=1).resize_with_paddings(
+        img=parse_img,
+        requested_x=x,
+        requested_y=y,
+        resample=ImageQualityEnum.HIGH.get_resample_filter(),
+    ).thenReturn(parse_img)
+    expect(lossy_manipulation, times=1).save_image_to_buffer(
+        img=parse_img,
+        _format="WEBP",
+        _quality_value=ImageQualityEnum.HIGH.get_webp_int_quality(),
+    ).thenReturn(None)
+
+    # When
+    result = webp_manipulation.webp_preview(
+        _x=0,
+        _y=0,
+        _quality=ImageQualityEnum.HIGH,
+        content=content_data,
+        _crop=False,
+        crop_position=VerticalCropPositionEnum.CENTER,
+    )
+
+    # Then
+    assert result is None
+
+
+def test_webp_rounded_thumbnail_has_transparent_corners():
+    # Given
+    content_data: io.BytesIO = io.BytesIO()
+    Image.new("RGB", (200, 100), "red").save(content_data, "PNG")
+    content_data.seek(0)
+
+    # When
+    result = webp_manipulation.webp_thumbnail(
+        _x=80,
+        _y=80,
+        _quality=ImageQualityEnum.MEDIUM,
+        border=ImageBorderShapeEnum.ROUNDED,
+        content=content_data,
+    )
+
+    # Then
+    thumbnail = Image.open(result)
+    assert thumbnail.format == "WEBP"
+    assert thumbnail.size == (80, 80)
+    assert thumbnail.convert("RGBA").getpixel((0, 0))[3] == 0
+    assert thumbnail.convert("RGBA").getpixel((40, 40))[3] == 255
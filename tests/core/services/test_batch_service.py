@@ -0,0 +1,98 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import unittest
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+
+from app.core.resources.constants import message
+from app.core.services import batch_service
+
+
+class TestRenderAll(unittest.IsolatedAsyncioTestCase):
+    async def test_responses_keep_the_order_of_the_renders(self):
+        async def _render(delay: float, content: bytes) -> Response:
+            await asyncio.sleep(delay)
+            return Response(content=content)
+
+        responses = await batch_service.render_all(
+            renders=[
+                lambda: _render(0.02, b"first"),
+                lambda: _render(0, b"second"),
+            ],
+            max_concurrency=2,
+        )
+
+        self.assertEqual([b"first", b"second"], [r.body for r in responses])
+
+    async def test_renders_are_bounded_by_max_concurrency(self):
+        running = 0
+        max_running = 0
+
+        async def _render() -> Response:
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return Response(content=b"image")
+
+        await batch_service.render_all(renders=[_render] * 10, max_concurrency=3)
+
+        self.assertEqual(3, max_running)
+
+    async def test_errors_are_returned_for_each_item(self):
+        async def _bad_request() -> Response:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="bad")
+
+        async def _crash() -> Response:
+            raise RuntimeError
+
+        async def _success() -> Response:
+            return Response(content=b"image")
+
+        responses = await batch_service.render_all(
+            renders=[_bad_request, _crash, _success],
+            max_concurrency=1,
+        )
+
+        self.assertEqual(
+            [
+                status.HTTP_400_BAD_REQUEST,
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+                status.HTTP_200_OK,
+            ],
+            [r.status_code for r in responses],
+        )
+        self.assertEqual(b"bad", responses[0].body)
+        self.assertEqual(message.RENDITION_FAILED.encode(), responses[1].body)
+
+
+def test_create_multipart_response():
+    response = batch_service.create_multipart_response(
+        [
+            ({"Content-ID": "0"}, Response(content=b"image", media_type="image/png")),
+            (
+                {"Content-ID": "1"},
+                Response(content="missing", status_code=status.HTTP_404_NOT_FOUND),
+            ),
+        ],
+    )
+
+    media_type, boundary = response.media_type.split("; boundary=")
+    assert media_type == "multipart/mixed"
+    assert (
+        response.body
+        == (
+            f"--{boundary}\r\n"
+            "Content-Type: image/png\r\nX-Status-Code: 200\r\nContent-ID: 0\r\n"
+            "\r\nimage\r\n"
+            f"--{boundary}\r\n"
+            "Content-Type: text/plain\r\nX-Status-Code: 404\r\nContent-ID: 1\r\n"
+            "\r\nmissing\r\n"
+            f"--{boundary}--\r\n"
+        ).encode()
+    )
@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.core.services import conversion_cache
+from app.core.services.conversion_cache import ConversionCache
+
+
+class TestConversionCache(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_conversions_are_keyed_by_digest_and_extension(self):
+        cache = ConversionCache(path=self.directory.name, max_size=100)
+        cache.put("digest", "pdf", b"converted")
+
+        self.assertEqual(b"converted", cache.get("digest", "pdf"))
+        self.assertIsNone(cache.get("digest", "png"))
+        self.assertIsNone(cache.get("other", "pdf"))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def test_cache_is_shared_by_instances_with_the_same_path(self):
+        ConversionCache(path=self.directory.name, max_size=100).put(
+            "digest",
+            "pdf",
+            b"converted",
+        )
+
+        cache = ConversionCache(path=self.directory.name, max_size=100)
+
+        self.assertEqual(b"converted", cache.get("digest", "pdf"))
+
+    def test_least_recently_used_is_evicted_when_full(self):
+        cache = ConversionCache(path=self.directory.name, max_size=10)
+        cache.put("1", "pdf", b"1234")
+        cache.put("2", "pdf", b"1234")
+        os.utime(os.path.join(self.directory.name, "1.pdf"), (1, 1))
+        os.utime(os.path.join(self.directory.name, "2.pdf"), (2, 2))
+        cache.get("1", "pdf")
+
+        cache.put("3", "pdf", b"1234")
+
+        self.assertIsNotNone(cache.get("1", "pdf"))
+        self.assertIsNone(cache.get("2", "pdf"))
+        self.assertIsNotNone(cache.get("3", "pdf"))
+        self.assertEqual(1, cache.evictions)
+        self.assertEqual(8, cache.stats()["size"])
+
+    def test_conversion_bigger_than_cache_is_not_cached(self):
+        cache = ConversionCache(path=self.directory.name, max_size=3)
+
+        cache.put("digest", "pdf", b"1234")
+
+        self.assertIsNone(cache.get("digest", "pdf"))
+        self.assertEqual(0, cache.stats()["entries"])
+
+    def test_missing_directory_is_created_on_first_write(self):
+        path = os.path.join(self.directory.name, "conversions")
+        cache = ConversionCache(path=path, max_size=100)
+
+        self.assertEqual(0, cache.stats()["entries"])
+        cache.put("digest", "pdf", b"converted")
+
+        self.assertEqual(b"converted", cache.get("digest", "pdf"))
+
+    def test_compute_digest_rewinds_the_file(self):
+        content = io.BytesIO(b"document")
+        content.read(3)
+
+        digest = conversion_cache.compute_digest(content)
+
+        self.assertEqual(hashlib.sha256(b"document").hexdigest(), digest)
+        self.assertEqual(0, content.tell())
+
+
+class TestGetOrConvert(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        cache_patcher = patch.object(
+            conversion_cache,
+            "conversion_cache",
+            ConversionCache(path=self.directory.name, max_size=100),
+        )
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.directory.cleanup()
+
+    async def test_same_file_is_converted_once(self):
+        convert = AsyncMock(return_value=io.BytesIO(b"converted"))
+
+        for _ in range(2):
+            converted = await conversion_cache.get_or_convert(
+                content=io.BytesIO(b"document"),
+                output_extension="pdf",
+                convert=convert,
+            )
+            self.assertEqual(b"converted", converted.read())
+
+        convert.assert_awaited_once()
+
+    async def test_failed_conversion_is_not_cached(self):
+        convert = AsyncMock(return_value=io.BytesIO())
+
+        for _ in range(2):
+            await conversion_cache.get_or_convert(
+                content=io.BytesIO(b"document"),
+                output_extension="pdf",
+                convert=convert,
+            )
+
+        self.assertEqual(2, convert.await_count)
+
+    async def test_disabled_cache_always_converts(self):
+        conversion_cache.conversion_cache.max_size = 0
+        convert = AsyncMock(return_value=io.BytesIO(b"converted"))
+
+        for _ in range(2):
+            await conversion_cache.get_or_convert(
+                content=io.BytesIO(b"document"),
+                output_extension="pdf",
+                convert=convert,
+            )
+
+        self.assertEqual(2, convert.await_count)
+        self.assertEqual(0, conversion_cache.conversion_cache.stats()["entries"])
@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import unittest
+
+from fastapi import HTTPException, status
+
+from app.core.resources.constants import message
+from app.core.services.conversion_limiter import ConversionLimiter
+
+
+class TestConversionLimiter(unittest.IsolatedAsyncioTestCase):
+    async def _hold_slot(
+        self: "TestConversionLimiter",
+        limiter: ConversionLimiter,
+        release: asyncio.Event,
+    ) -> None:
+        async with limiter.limit():
+            await release.wait()
+
+    async def test_conversions_over_the_limit_wait_for_a_free_slot(self):
+        limiter = ConversionLimiter(max_concurrency=1, max_queue_size=1, retry_after=5)
+        release = asyncio.Event()
+        running = asyncio.ensure_future(self._hold_slot(limiter, release))
+        waiting = asyncio.ensure_future(self._hold_slot(limiter, release))
+        await asyncio.sleep(0)
+
+        self.assertEqual(1, limiter.in_flight)
+        self.assertEqual(1, limiter.queued)
+
+        release.set()
+        await asyncio.gather(running, waiting)
+
+        self.assertEqual(0, limiter.in_flight)
+        self.assertEqual(0, limiter.queued)
+        self.assertEqual(2, limiter.stats()["accepted"])
+        self.assertEqual(1, limiter.stats()["max_queued"])
+
+    async def test_conversions_over_the_queue_size_are_rejected(self):
+        limiter = ConversionLimiter(max_concurrency=1, max_queue_size=1, retry_after=5)
+        release = asyncio.Event()
+        holders = [
+            asyncio.ensure_future(self._hold_slot(limiter, release)) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(HTTPException) as context:
+            async with limiter.limit():
+                pass
+
+        self.assertEqual(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            context.exception.status_code,
+        )
+        self.assertEqual(message.DOCS_EDITOR_BUSY, context.exception.detail)
+        self.assertEqual("5", context.exception.headers["Retry-After"])
+        self.assertEqual(1, limiter.rejected)
+        release.set()
+        await asyncio.gather(*holders)
+
+    async def test_slot_is_released_when_the_conversion_fails(self):
+        limiter = ConversionLimiter(max_concurrency=1, max_queue_size=0, retry_after=5)
+
+        with self.assertRaises(ValueError):
+            async with limiter.limit():
+                raise ValueError
+
+        async with limiter.limit():
+            self.assertEqual(1, limiter.in_flight)
+        self.assertEqual(0, limiter.in_flight)
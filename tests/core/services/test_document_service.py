@@ -0,0 +1,83 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from PIL import Image
+from pypdfium2 import PdfDocument
+
+from app.core.resources.app_config import EXECUTOR_MODE, EXECUTOR_POOL_SIZE
+from app.core.resources.schemas.enums.executor_mode_enum import ExecutorModeEnum
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
+from app.core.services import document_service, task_executor
+from app.core.services.document_manipulation import document_manipulation
+
+
+def _create_pdf() -> io.BytesIO:
+    pdf = PdfDocument.new()
+    pdf.new_page(595, 842)
+    content = io.BytesIO()
+    pdf.save(content)
+    content.seek(0)
+    return content
+
+
+def _create_png() -> io.BytesIO:
+    content = io.BytesIO()
+    Image.new("RGB", (595, 842), "white").save(content, "png")
+    content.seek(0)
+    return content
+
+
+class TestCreateThumbnail(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        task_executor.configure_executor(ExecutorModeEnum.INLINE, 1)
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        task_executor.configure_executor(EXECUTOR_MODE, EXECUTOR_POOL_SIZE)
+
+    async def test_thumbnail_from_pdf_renders_the_pdf_conversion(self):
+        convert = AsyncMock(return_value=_create_pdf())
+
+        with patch.object(
+            document_service,
+            "DOCUMENT_THUMBNAIL_FROM_PDF",
+            True,
+        ), patch.object(document_manipulation, "convert_file_to", convert):
+            thumbnail = await document_service._convert_and_create_thumbnail(
+                content=io.BytesIO(b"document"),
+                img_metadata=ThumbnailImageMetadata(
+                    width=80,
+                    height=80,
+                    format=ImageTypeEnum.PNG,
+                ),
+            )
+
+        self.assertEqual("pdf", convert.await_args.kwargs["output_extension"])
+        self.assertEqual((80, 80), Image.open(thumbnail).size)
+
+    async def test_thumbnail_from_image_resizes_the_image_conversion(self):
+        convert = AsyncMock(return_value=_create_png())
+
+        with patch.object(
+            document_service,
+            "DOCUMENT_THUMBNAIL_FROM_PDF",
+            False,
+        ), patch.object(document_manipulation, "convert_file_to", convert):
+            thumbnail = await document_service._convert_and_create_thumbnail(
+                content=io.BytesIO(b"document"),
+                img_metadata=ThumbnailImageMetadata(
+                    width=80,
+                    height=80,
+                    format=ImageTypeEnum.PNG,
+                ),
+            )
+
+        self.assertEqual("png", convert.await_args.kwargs["output_extension"])
+        self.assertEqual((80, 80), Image.open(thumbnail).size)
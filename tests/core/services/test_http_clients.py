@@ -0,0 +1,41 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import unittest
+
+from app.core.resources.app_config import DOCS_TIMEOUT, STORAGE_MAX_CONNECTIONS
+from app.core.services import http_clients
+
+
+class TestHttpClients(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self) -> None:
+        await http_clients.close_clients()
+        await super().asyncTearDown()
+
+    async def test_same_client_is_reused(self):
+        client = http_clients.get_storage_client()
+
+        self.assertIs(client, http_clients.get_storage_client())
+        self.assertIsNot(client, http_clients.get_docs_editor_client())
+
+    async def test_clients_use_upstream_settings(self):
+        http_clients.open_clients()
+
+        storage_client = http_clients.get_storage_client()
+        docs_editor_client = http_clients.get_docs_editor_client()
+
+        self.assertEqual(
+            STORAGE_MAX_CONNECTIONS,
+            storage_client._transport._pool._max_connections,
+        )
+        self.assertEqual(DOCS_TIMEOUT, docs_editor_client.timeout.read)
+
+    async def test_closed_clients_are_created_again(self):
+        client = http_clients.get_storage_client()
+
+        await http_clients.close_clients()
+
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(client, http_clients.get_storage_client())
+        self.assertFalse(http_clients.get_storage_client().is_closed)
@@ -9,12 +9,15 @@ from unittest.mock import MagicMock, patch
 
 from fastapi import status
 from httpx import Response
+from PIL import Image, ImageChops, ImageStat
 from returns.maybe import Maybe, Nothing
 
 from app.core.resources.constants import message
 from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
 from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
 from app.core.resources.schemas.preview_image_metadata import PreviewImageMetadata
+from app.core.resources.schemas.storage_file import StorageFile
+from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
 from app.core.services import image_service
 
 
@@ -27,7 +30,7 @@ class TestImageService(unittest.IsolatedAsyncioTestCase):
             height=100,
             width=100,
         )
-        self.fake_response = Response(status_code=200)
+        self.fake_response = StorageFile(status_code=200, content=io.BytesIO())
 
     def tearDown(self) -> None:
         super().tearDown()
@@ -37,7 +40,10 @@ class TestImageService(unittest.IsolatedAsyncioTestCase):
         return_value=io.BytesIO(),
     )
     async def test_create_preview_success(self, mock_selection: MagicMock):
-        self.fake_response.status_code = status.HTTP_200_OK
+        self.fake_response = StorageFile(
+            status_code=status.HTTP_200_OK,
+            content=io.BytesIO(),
+        )
         with mock.patch(
             "app.core.services." "image_service." "storage_communication.retrieve_data",
         ) as retrieve_data_mock:
@@ -63,7 +69,10 @@ class TestImageService(unittest.IsolatedAsyncioTestCase):
         return_value=io.BytesIO(),
     )
     async def test_create_preview_failure_retrieving(self, mock_selection: MagicMock):
-        self.fake_response.status_code = status.HTTP_404_NOT_FOUND
+        self.fake_response = StorageFile(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content=io.BytesIO(),
+        )
         with mock.patch(
             "app.core.services." "image_service." "storage_communication.retrieve_data",
         ) as retrieve_data_mock:
@@ -76,7 +85,7 @@ class TestImageService(unittest.IsolatedAsyncioTestCase):
                     service_type=ServiceTypeEnum.FILES,
                 )
             )
-            self.assertEqual(1, mock_selection.call_count)
+            self.assertEqual(0, mock_selection.call_count)
             self.assertEqual(1, retrieve_data_mock.call_count)
             self.assertEqual(
                 self.fake_response.status_code,
@@ -108,7 +117,7 @@ class TestImageService(unittest.IsolatedAsyncioTestCase):
                     service_type=ServiceTypeEnum.FILES,
                 )
             )
-            self.assertEqual(1, mock_selection.call_count)
+            self.assertEqual(0, mock_selection.call_count)
             self.assertEqual(1, retrieve_data_mock.call_count)
             self.assertEqual(status.HTTP_502_BAD_GATEWAY, stream_response.status_code)
             self.assertEqual(None, stream_response.media_type)
@@ -149,3 +158,82 @@ class TestImageService(unittest.IsolatedAsyncioTestCase):
             self.img_metadata,
             b"",
         )
+
+    def test_create_renditions_decodes_the_image_once(self):
+        content = io.BytesIO()
+        Image.linear_gradient("L").resize((2400, 1600)).convert("RGB").save(
+            content,
+            format="JPEG",
+        )
+        content.seek(0)
+        renditions = [
+            ThumbnailImageMetadata(height=80, width=80),
+            PreviewImageMetadata(height=0, width=1024, format=ImageTypeEnum.PNG),
+            ThumbnailImageMetadata(height=320, width=320),
+        ]
+
+        with mock.patch(
+            "app.core.services.image_service.parse_to_valid_image",
+            wraps=image_service.parse_to_valid_image,
+        ) as parse_mock:
+            result = image_service._create_renditions(
+                renditions=renditions,
+                content=content,
+            )
+
+        self.assertEqual(1, parse_mock.call_count)
+        self.assertEqual(
+            [(80, 80), (1024, 1600), (320, 320)],
+            [Image.open(output).size for output in result],
+        )
+
+    def test_create_renditions_match_the_single_renditions_of_other_ratios(self):
+        # black and white stripes 5 pixels wide, lost when upscaled from too small
+        stripes = bytes(([0] * 5 + [255] * 5) * 400)
+        content = io.BytesIO()
+        Image.frombytes("L", (4000, 1), stripes).resize(
+            (4000, 4000),
+            Image.Resampling.NEAREST,
+        ).convert("RGB").save(content, format="PNG")
+        renditions = [
+            # the squarer rendition is the biggest, but it is narrower
+            ThumbnailImageMetadata(height=300, width=300, format=ImageTypeEnum.PNG),
+            ThumbnailImageMetadata(height=40, width=1000, format=ImageTypeEnum.PNG),
+        ]
+
+        content.seek(0)
+        result = image_service._create_renditions(
+            renditions=renditions,
+            content=content,
+        )
+
+        for img_metadata, output in zip(renditions, result):
+            content.seek(0)
+            single = Image.open(
+                image_service.render_from_image(
+                    img_metadata=img_metadata,
+                    img=image_service.parse_to_valid_image(content=content),
+                ),
+            )
+            difference = ImageChops.difference(
+                Image.open(output).convert("RGB"),
+                single.convert("RGB"),
+            )
+            self.assertLess(max(ImageStat.Stat(difference).mean), 1)
+
+    def test_create_renditions_gif_creates_each_rendition_from_content(self):
+        renditions = [
+            ThumbnailImageMetadata(height=80, width=80, format=ImageTypeEnum.GIF),
+            PreviewImageMetadata(height=100, width=100),
+        ]
+        with mock.patch(
+            "app.core.services.image_service._select_thumbnail_module",
+        ) as thumbnail_mock, mock.patch(
+            "app.core.services.image_service._select_preview_module",
+        ) as preview_mock:
+            result = image_service._create_renditions(
+                renditions=renditions,
+                content=io.BytesIO(),
+            )
+
+        self.assertEqual([thumbnail_mock(), preview_mock()], result)
@@ -0,0 +1,137 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from PIL import Image
+from prometheus_client import REGISTRY
+
+from app.controller import app
+from app.core.services import metrics
+
+_INCREMENT_COUNTER = (
+    "from app.core.services import metrics;"
+    "metrics.requests_total.labels("
+    "route='/test/', format='jpeg', service_type='files', status='200'"
+    ").inc()"
+)
+_EXPORT_METRICS = (
+    "import sys;"
+    "from app.core.services import metrics;"
+    "sys.stdout.write(metrics.export_metrics()[0].decode())"
+)
+
+
+def _create_png() -> bytes:
+    content = io.BytesIO()
+    Image.new("RGB", (100, 100), "white").save(content, "png")
+    return content.getvalue()
+
+
+def _get_sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.TestCase):
+    def test_observe_stage_measures_the_block_even_when_it_raises(self):
+        before = _get_sample("preview_stage_duration_seconds_count", stage="decode")
+
+        with self.assertRaises(ValueError), metrics.observe_stage(
+            metrics.STAGE_DECODE,
+        ):
+            raise ValueError
+
+        self.assertEqual(
+            before + 1,
+            _get_sample("preview_stage_duration_seconds_count", stage="decode"),
+        )
+
+    def test_requests_are_counted_by_route_template(self):
+        labels = {
+            "route": "/health/live/",
+            "format": "none",
+            "service_type": "none",
+            "status": "200",
+        }
+        before = _get_sample("preview_requests_total", **labels)
+
+        with TestClient(app) as client:
+            client.get("/health/live/")
+            response = client.get("/metrics/")
+
+        self.assertEqual(before + 1, _get_sample("preview_requests_total", **labels))
+        self.assertIn(b"preview_request_duration_seconds_bucket", response.content)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+
+    def test_metrics_are_aggregated_across_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                "PROMETHEUS_MULTIPROC_DIR": directory,
+                "PYTHONPATH": str(Path.cwd()),
+            }
+            for _ in range(2):
+                subprocess.run(
+                    [sys.executable, "-c", _INCREMENT_COUNTER],
+                    env=env,
+                    check=True,
+                )
+            exported = subprocess.run(
+                [sys.executable, "-c", _EXPORT_METRICS],
+                env=env,
+                check=True,
+                capture_output=True,
+            ).stdout
+
+        self.assertIn(
+            b'preview_requests_total{format="jpeg",route="/test/",'
+            b'service_type="files",status="200"} 2.0',
+            exported,
+        )
+
+    def test_server_timing_lists_the_stages_of_the_renditions(self):
+        with patch.object(metrics, "ENABLE_SERVER_TIMING", True), TestClient(
+            app,
+        ) as client:
+            health = client.get("/health/live/")
+            response = client.post(
+                "/preview/image/0x0/thumbnail/",
+                files={"file": ("image.png", _create_png(), "image/png")},
+            )
+
+        self.assertNotIn("server-timing", health.headers)
+        server_timing = response.headers["server-timing"]
+        for stage in ("decode", "transform", "encode", "total"):
+            self.assertIn(f"{stage};dur=", server_timing)
+
+    def test_server_timing_of_renditions_not_created_by_the_request(self):
+        server_timing = metrics._format_server_timing(
+            {},
+            [metrics.CACHE_HIT, metrics.CACHE_COALESCED, metrics.CACHE_HIT],
+            0.002,
+        )
+
+        self.assertEqual(
+            b"cache;desc=hit, cache;desc=coalesced, total;dur=2.0",
+            server_timing,
+        )
+
+    def test_server_timing_is_disabled_by_default(self):
+        with patch.object(metrics, "ENABLE_SERVER_TIMING", False), TestClient(
+            app,
+        ) as client:
+            response = client.post(
+                "/preview/image/0x0/thumbnail/",
+                files={"file": ("image.png", _create_png(), "image/png")},
+            )
+
+        self.assertNotIn("server-timing", response.headers)
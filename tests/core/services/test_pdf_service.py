@@ -0,0 +1,237 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import StreamingResponse
+from PIL import Image
+from pypdfium2 import PdfDocument
+
+from app.core.resources.app_config import (
+    EXECUTOR_MODE,
+    EXECUTOR_POOL_SIZE,
+    PAGE_THUMBNAILS_MAX_PAGES,
+)
+from app.core.resources.constants import message
+from app.core.resources.schemas.enums.executor_mode_enum import ExecutorModeEnum
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.page_thumbnails_layout_enum import (
+    PageThumbnailsLayoutEnum,
+)
+from app.core.resources.schemas.thumbnail_image_metadata import ThumbnailImageMetadata
+from app.core.services import pdf_service, task_executor
+
+
+def _create_pdf(pages: int) -> io.BytesIO:
+    pdf = PdfDocument.new()
+    for _ in range(pages):
+        pdf.new_page(595, 842)
+    content = io.BytesIO()
+    pdf.save(content)
+    content.seek(0)
+    return content
+
+
+class TestCreatePageThumbnails(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        task_executor.configure_executor(ExecutorModeEnum.INLINE, 1)
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        task_executor.configure_executor(EXECUTOR_MODE, EXECUTOR_POOL_SIZE)
+
+    async def test_separate_returns_a_part_for_each_page(self):
+        response = await pdf_service.create_page_thumbnails(
+            content=_create_pdf(5),
+            first_page_number=2,
+            last_page_number=4,
+            img_metadata=ThumbnailImageMetadata(width=80, height=80),
+            layout=PageThumbnailsLayoutEnum.SEPARATE,
+        )
+
+        self.assertTrue(response.media_type.startswith("multipart/mixed"))
+        self.assertEqual(3, response.body.count(b"X-Status-Code: 200"))
+        for page in (b"2", b"3", b"4"):
+            self.assertIn(b"Content-ID: " + page + b"\r\n", response.body)
+
+    async def test_contact_sheet_returns_a_single_image(self):
+        response = await pdf_service.create_page_thumbnails(
+            content=_create_pdf(5),
+            first_page_number=1,
+            last_page_number=0,
+            img_metadata=ThumbnailImageMetadata(
+                width=80,
+                height=100,
+                format=ImageTypeEnum.PNG,
+            ),
+            layout=PageThumbnailsLayoutEnum.CONTACT_SHEET,
+        )
+
+        self.assertEqual("image/png", response.media_type)
+        self.assertEqual((240, 200), Image.open(io.BytesIO(response.body)).size)
+
+    async def test_pages_are_rendered_in_a_task_for_each_process(self):
+        content = _create_pdf(5)
+        with patch.object(
+            task_executor,
+            "get_process_pool_size",
+            return_value=2,
+        ), patch.object(
+            task_executor,
+            "run_in_process",
+            wraps=task_executor.run_in_process,
+        ) as run_in_process:
+            response = await pdf_service.create_page_thumbnails(
+                content=content,
+                first_page_number=1,
+                last_page_number=5,
+                img_metadata=ThumbnailImageMetadata(width=80, height=80),
+                layout=PageThumbnailsLayoutEnum.SEPARATE,
+            )
+
+        self.assertEqual(2, run_in_process.await_count)
+        sent_contents = [
+            call.kwargs["content"] for call in run_in_process.call_args_list
+        ]
+        self.assertIs(sent_contents[0], sent_contents[1])
+        self.assertEqual(
+            [[0, 2, 4], [1, 3]],
+            [call.kwargs["page_numbers"] for call in run_in_process.call_args_list],
+        )
+        content_ids = [
+            int(line.split(b": ")[1])
+            for line in response.body.split(b"\r\n")
+            if line.startswith(b"Content-ID")
+        ]
+        self.assertEqual([1, 2, 3, 4, 5], content_ids)
+
+    async def test_failing_page_does_not_fail_the_others(self):
+        create_thumbnail = pdf_service._create_thumbnail
+
+        def _fail_second_page(content, img_metadata, page_number):
+            if page_number == 1:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+            return create_thumbnail(content, img_metadata, page_number)
+
+        with patch.object(
+            pdf_service,
+            "_create_thumbnail",
+            side_effect=_fail_second_page,
+        ):
+            response = await pdf_service.create_page_thumbnails(
+                content=_create_pdf(3),
+                first_page_number=1,
+                last_page_number=3,
+                img_metadata=ThumbnailImageMetadata(width=80, height=80),
+                layout=PageThumbnailsLayoutEnum.SEPARATE,
+            )
+
+        self.assertEqual(2, response.body.count(b"X-Status-Code: 200"))
+        self.assertIn(
+            b"X-Status-Code: 400\r\nContent-ID: 2\r\n",
+            response.body,
+        )
+
+    async def test_last_page_after_the_end_of_the_pdf_is_the_last_page(self):
+        response = await pdf_service.create_page_thumbnails(
+            content=_create_pdf(2),
+            first_page_number=1,
+            last_page_number=10,
+            img_metadata=ThumbnailImageMetadata(width=80, height=80),
+            layout=PageThumbnailsLayoutEnum.SEPARATE,
+        )
+
+        self.assertEqual(2, response.body.count(b"X-Status-Code: 200"))
+
+    async def test_first_page_after_the_end_of_the_pdf(self):
+        with self.assertRaises(HTTPException) as context:
+            await pdf_service.create_page_thumbnails(
+                content=_create_pdf(2),
+                first_page_number=3,
+                last_page_number=0,
+                img_metadata=ThumbnailImageMetadata(width=80, height=80),
+                layout=PageThumbnailsLayoutEnum.SEPARATE,
+            )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, context.exception.status_code)
+        self.assertEqual(message.FIRST_PAGE_OUT_OF_RANGE, context.exception.detail)
+
+    async def test_too_many_pages(self):
+        with self.assertRaises(HTTPException) as context:
+            await pdf_service.create_page_thumbnails(
+                content=_create_pdf(2),
+                first_page_number=1,
+                last_page_number=PAGE_THUMBNAILS_MAX_PAGES + 1,
+                img_metadata=ThumbnailImageMetadata(width=80, height=80),
+                layout=PageThumbnailsLayoutEnum.SEPARATE,
+            )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, context.exception.status_code)
+        self.assertEqual(message.TOO_MANY_PAGES, context.exception.detail)
+
+    async def test_pdf_too_large_is_refused_before_reading_it(self):
+        content = _create_pdf(2)
+        with patch.object(
+            pdf_service,
+            "PAGE_THUMBNAILS_MAX_FILE_SIZE",
+            len(content.getvalue()) - 1,
+        ), patch.object(task_executor, "to_picklable") as to_picklable:
+            with self.assertRaises(HTTPException) as context:
+                await pdf_service.create_page_thumbnails(
+                    content=content,
+                    first_page_number=1,
+                    last_page_number=2,
+                    img_metadata=ThumbnailImageMetadata(width=80, height=80),
+                    layout=PageThumbnailsLayoutEnum.SEPARATE,
+                )
+
+        to_picklable.assert_not_called()
+        self.assertEqual(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            context.exception.status_code,
+        )
+        self.assertEqual(message.FILE_TOO_LARGE, context.exception.detail)
+
+
+class TestCreatePreview(unittest.IsolatedAsyncioTestCase):
+    async def test_full_range_returns_the_uploaded_pdf_unchanged(self):
+        file = UploadFile(file=io.BytesIO(b"%PDF-1.7 original bytes"))
+
+        result = await pdf_service.create_preview_from_raw(
+            file=file,
+            first_page_number=1,
+            last_page_number=0,
+        )
+
+        self.assertEqual(b"%PDF-1.7 original bytes", result.read())
+
+    async def test_sub_range_is_split(self):
+        file = UploadFile(file=_create_pdf(3))
+
+        result = await pdf_service.create_preview_from_raw(
+            file=file,
+            first_page_number=1,
+            last_page_number=2,
+        )
+
+        self.assertEqual(2, len(PdfDocument(result)))
+
+    def test_unchanged_pdf_bigger_than_spool_size_is_streamed(self):
+        with patch.object(pdf_service, "STORAGE_SPOOL_SIZE", 1):
+            response = pdf_service._create_unchanged_pdf_response(
+                io.BytesIO(b"%PDF-1.7"),
+            )
+
+        self.assertIsInstance(response, StreamingResponse)
+        self.assertEqual("8", response.headers["Content-Length"])
+
+    def test_unchanged_pdf_in_memory_is_not_streamed(self):
+        response = pdf_service._create_unchanged_pdf_response(io.BytesIO(b"%PDF-1.7"))
+
+        self.assertNotIsInstance(response, StreamingResponse)
+        self.assertEqual(b"%PDF-1.7", response.body)
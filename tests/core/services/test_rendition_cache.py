@@ -0,0 +1,336 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import status
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.resources.schemas.enums.image_type_enum import ImageTypeEnum
+from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
+from app.core.resources.schemas.rendition_key import RenditionKey
+from app.core.services import metrics, rendition_cache
+from app.core.services.rendition_cache import RenditionCache
+
+
+def _create_key(version: int = 1, **kwargs) -> RenditionKey:
+    return RenditionKey(
+        route="image/thumbnail",
+        service_type=ServiceTypeEnum.FILES,
+        id="da2dcce7-cd87-423c-a6c9-38c527ab6e6a",
+        version=version,
+        **kwargs,
+    )
+
+
+class TestRenditionCache(unittest.TestCase):
+    def test_keys_with_same_parameters_are_equal(self):
+        cache = RenditionCache(max_size=100, ttl=60)
+        cache.put(_create_key(area="80x80"), b"content", "image/jpeg")
+
+        self.assertEqual(b"content", cache.get(_create_key(area="80x80")).content)
+        self.assertIsNone(
+            cache.get(_create_key(area="80x80", format=ImageTypeEnum.PNG))
+        )
+
+    def test_least_recently_used_is_evicted_when_full(self):
+        cache = RenditionCache(max_size=10, ttl=60)
+        cache.put(_create_key(version=1), b"1234", "image/jpeg")
+        cache.put(_create_key(version=2), b"1234", "image/jpeg")
+        cache.get(_create_key(version=1))
+
+        cache.put(_create_key(version=3), b"1234", "image/jpeg")
+
+        self.assertIsNotNone(cache.get(_create_key(version=1)))
+        self.assertIsNone(cache.get(_create_key(version=2)))
+        self.assertIsNotNone(cache.get(_create_key(version=3)))
+        self.assertEqual(1, cache.evictions)
+        self.assertEqual(8, cache.size)
+
+    def test_rendition_bigger_than_cache_is_not_cached(self):
+        cache = RenditionCache(max_size=3, ttl=60)
+
+        cache.put(_create_key(), b"1234", "image/jpeg")
+
+        self.assertIsNone(cache.get(_create_key()))
+        self.assertEqual(0, cache.size)
+
+    def test_expired_rendition_is_removed(self):
+        cache = RenditionCache(max_size=100, ttl=60)
+        with patch("app.core.services.rendition_cache.time.monotonic", return_value=0):
+            cache.put(_create_key(), b"1234", "image/jpeg")
+
+        with patch("app.core.services.rendition_cache.time.monotonic", return_value=60):
+            self.assertIsNone(cache.get(_create_key()))
+        self.assertEqual(0, cache.size)
+        self.assertEqual(1, cache.misses)
+
+
+class TestGetOrRender(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.cache = RenditionCache(max_size=100, ttl=60)
+        self.cache_patch = patch.object(rendition_cache, "rendition_cache", self.cache)
+        self.cache_patch.start()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.cache_patch.stop()
+
+    async def test_successful_rendition_is_rendered_once(self):
+        render = AsyncMock(
+            return_value=Response(content=b"image", media_type="image/jpeg"),
+        )
+
+        await rendition_cache.get_or_render(_create_key(), render)
+        response = await rendition_cache.get_or_render(_create_key(), render)
+
+        self.assertEqual(1, render.call_count)
+        self.assertEqual(b"image", response.body)
+        self.assertEqual("image/jpeg", response.media_type)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    async def test_error_response_is_not_cached(self):
+        render = AsyncMock(
+            return_value=Response(status_code=status.HTTP_502_BAD_GATEWAY),
+        )
+
+        await rendition_cache.get_or_render(_create_key(), render)
+        response = await rendition_cache.get_or_render(_create_key(), render)
+
+        self.assertEqual(2, render.call_count)
+        self.assertEqual(status.HTTP_502_BAD_GATEWAY, response.status_code)
+
+    async def test_streamed_response_is_not_cached(self):
+        render = AsyncMock(return_value=StreamingResponse(content=iter([b"pdf"])))
+
+        await rendition_cache.get_or_render(_create_key(), render)
+        await rendition_cache.get_or_render(_create_key(), render)
+
+        self.assertEqual(2, render.call_count)
+        self.assertEqual(0, self.cache.stats()["entries"])
+
+    async def test_disabled_cache_always_renders(self):
+        self.cache.max_size = 0
+        render = AsyncMock(return_value=Response(content=b"image"))
+
+        await rendition_cache.get_or_render(_create_key(), render)
+        await rendition_cache.get_or_render(_create_key(), render)
+
+        self.assertEqual(2, render.call_count)
+        self.assertEqual(0, self.cache.misses)
+
+    async def test_concurrent_identical_requests_are_rendered_once(self):
+        release = asyncio.Event()
+
+        async def render() -> Response:
+            await release.wait()
+            return Response(content=b"image", media_type="image/jpeg")
+
+        render_mock = AsyncMock(side_effect=render)
+        waiters = [
+            asyncio.ensure_future(
+                rendition_cache.get_or_render(_create_key(), render_mock),
+            )
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        responses = await asyncio.gather(*waiters)
+
+        self.assertEqual(1, render_mock.call_count)
+        for response in responses:
+            self.assertEqual(b"image", response.body)
+            self.assertEqual("image/jpeg", response.media_type)
+
+    async def test_cancelled_waiter_does_not_cancel_the_shared_rendition(self):
+        release = asyncio.Event()
+
+        async def render() -> Response:
+            await release.wait()
+            return Response(content=b"image")
+
+        first = asyncio.ensure_future(
+            rendition_cache.get_or_render(_create_key(), render)
+        )
+        second = asyncio.ensure_future(
+            rendition_cache.get_or_render(_create_key(), render),
+        )
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(b"image", (await second).body)
+        self.assertTrue(first.cancelled())
+
+    async def test_rendition_is_cancelled_when_every_waiter_is_cancelled(self):
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def render() -> Response:
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return Response()
+
+        waiter = asyncio.ensure_future(
+            rendition_cache.get_or_render(_create_key(), render),
+        )
+        await started.wait()
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+        self.assertTrue(cancelled.is_set())
+
+    async def test_request_after_every_waiter_is_cancelled_renders_again(self):
+        started = asyncio.Event()
+
+        async def never_ending_render() -> Response:
+            started.set()
+            await asyncio.Event().wait()
+            return Response()
+
+        waiter = asyncio.ensure_future(
+            rendition_cache.get_or_render(_create_key(), never_ending_render),
+        )
+        await started.wait()
+        waiter.cancel()
+        # the waiter has cancelled the rendition, that has not stopped yet
+        await asyncio.sleep(0)
+        render = AsyncMock(return_value=Response(content=b"image"))
+
+        response = await rendition_cache.get_or_render(_create_key(), render)
+
+        self.assertTrue(waiter.cancelled())
+        self.assertEqual(1, render.call_count)
+        self.assertEqual(b"image", response.body)
+        self.assertEqual({}, rendition_cache._flights)
+
+    async def test_cached_and_coalesced_renditions_are_recorded(self):
+        release = asyncio.Event()
+
+        async def render() -> Response:
+            await release.wait()
+            return Response(content=b"image")
+
+        async def get_or_render_recording_cache_statuses():
+            cache_statuses = metrics.start_cache_statuses()
+            await rendition_cache.get_or_render(_create_key(), render)
+            return cache_statuses
+
+        first = asyncio.ensure_future(get_or_render_recording_cache_statuses())
+        coalesced = asyncio.ensure_future(get_or_render_recording_cache_statuses())
+        await asyncio.sleep(0)
+        release.set()
+        rendered_statuses, coalesced_statuses = await asyncio.gather(first, coalesced)
+        cached_statuses = await get_or_render_recording_cache_statuses()
+
+        self.assertEqual([], rendered_statuses)
+        self.assertEqual([metrics.CACHE_COALESCED], coalesced_statuses)
+        self.assertEqual([metrics.CACHE_HIT], cached_statuses)
+
+    async def test_streamed_response_is_sent_to_a_single_waiter(self):
+        release = asyncio.Event()
+
+        async def render() -> Response:
+            await release.wait()
+            return StreamingResponse(content=iter([b"pdf"]))
+
+        render_mock = AsyncMock(side_effect=render)
+        waiters = [
+            asyncio.ensure_future(
+                rendition_cache.get_or_render(_create_key(), render_mock),
+            )
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        first, second = await asyncio.gather(*waiters)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(2, render_mock.call_count)
+
+    async def test_rendition_has_etag_and_cache_control(self):
+        render = AsyncMock(
+            return_value=Response(content=b"image", media_type="image/jpeg"),
+        )
+
+        response = await rendition_cache.get_or_render(
+            _create_key(),
+            render,
+            cache_control="private, max-age=60",
+        )
+
+        self.assertEqual(
+            rendition_cache.compute_etag(_create_key()),
+            response.headers["ETag"],
+        )
+        self.assertEqual("private, max-age=60", response.headers["Cache-Control"])
+        self.assertNotEqual(
+            rendition_cache.compute_etag(_create_key(version=2)),
+            response.headers["ETag"],
+        )
+
+    async def test_empty_rendition_is_not_cached_and_has_no_cache_headers(self):
+        render = AsyncMock(return_value=Response(content=b"", media_type="image/png"))
+
+        response = await rendition_cache.get_or_render(
+            _create_key(),
+            render,
+            cache_control="private, max-age=60",
+        )
+
+        self.assertNotIn("ETag", response.headers)
+        self.assertNotIn("Cache-Control", response.headers)
+        self.assertEqual(0, self.cache.stats()["entries"])
+
+    async def test_matching_etag_returns_not_modified_without_rendering(self):
+        render = AsyncMock()
+        etag = rendition_cache.compute_etag(_create_key())
+
+        response = await rendition_cache.get_or_render(
+            _create_key(),
+            render,
+            if_none_match=f'"other", {etag.replace("W/", "")}',
+        )
+
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(etag, response.headers["ETag"])
+        self.assertEqual(b"", response.body)
+        render.assert_not_called()
+
+    async def test_different_etag_renders_the_rendition(self):
+        render = AsyncMock(
+            return_value=Response(content=b"image", media_type="image/jpeg"),
+        )
+
+        response = await rendition_cache.get_or_render(
+            _create_key(),
+            render,
+            if_none_match=rendition_cache.compute_etag(_create_key(version=2)),
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, render.call_count)
+
+    async def test_error_response_has_no_cache_headers(self):
+        render = AsyncMock(
+            return_value=Response(status_code=status.HTTP_502_BAD_GATEWAY),
+        )
+
+        response = await rendition_cache.get_or_render(
+            _create_key(),
+            render,
+            cache_control="private, max-age=60",
+        )
+
+        self.assertNotIn("ETag", response.headers)
+        self.assertNotIn("Cache-Control", response.headers)
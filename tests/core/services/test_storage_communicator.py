@@ -4,17 +4,21 @@
 
 import logging
 import unittest
-from typing import Optional
-from unittest.mock import MagicMock
+from typing import IO, List, Optional
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import httpx
 import respx as respx
+from fastapi import status
+from fastapi.responses import Response as FastApiResp
+from fastapi.responses import StreamingResponse
 from httpx import Response
 from returns.maybe import Nothing
 
 import app.core.services.storage_communication as st_com
 from app.core.resources.app_config import STORAGE_DOWNLOAD_API, STORAGE_FULL_ADDRESS
 from app.core.resources.schemas.enums.service_type_enum import ServiceTypeEnum
+from app.core.resources.schemas.storage_file import StorageFile
 
 
 class TestStorageCommunicator(unittest.IsolatedAsyncioTestCase):
@@ -116,3 +120,128 @@ class TestStorageCommunicator(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(0, self.log_mock.error.call_count)
         self.assertEqual(0, self.log_mock.info.call_count)
         self.assertEqual(Nothing, response)
+
+    async def test_retrieve_data_small_file_is_kept_in_memory(self):
+        with respx.mock, patch.object(st_com, "STORAGE_SPOOL_SIZE", 10):
+            respx.get(self.req).mock(return_value=Response(200, content=b"pdf"))
+            response = await st_com.retrieve_data(
+                file_id=self.test_id,
+                version=self.version,
+                log=self.log_mock,
+            )
+        storage_file: StorageFile = response.unwrap()
+        self.assertEqual(200, storage_file.status_code)
+        self.assertFalse(storage_file.content._rolled)
+        self.assertEqual(b"pdf", storage_file.content.read())
+
+    async def test_retrieve_data_big_file_is_written_on_disk(self):
+        with respx.mock, patch.object(st_com, "STORAGE_SPOOL_SIZE", 10):
+            respx.get(self.req).mock(return_value=Response(200, content=b"x" * 20))
+            response = await st_com.retrieve_data(
+                file_id=self.test_id,
+                version=self.version,
+                log=self.log_mock,
+            )
+        storage_file: StorageFile = response.unwrap()
+        self.assertTrue(storage_file.content._rolled)
+        self.assertEqual(b"x" * 20, storage_file.content.read())
+
+    async def test_retrieve_data_content_length_too_large(self):
+        with respx.mock, patch.object(st_com, "STORAGE_MAX_FILE_SIZE", 10):
+            respx.get(self.req).mock(return_value=Response(200, content=b"x" * 20))
+            response = await st_com.retrieve_data(
+                file_id=self.test_id,
+                version=self.version,
+                log=self.log_mock,
+            )
+        self.assertEqual(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            response.unwrap().status_code,
+        )
+
+    async def test_retrieve_data_stream_too_large_is_stopped(self):
+        chunks_sent: List[bytes] = []
+
+        async def _chunks():
+            for _ in range(10):
+                chunks_sent.append(b"x" * 4)
+                yield b"x" * 4
+
+        with respx.mock, patch.object(st_com, "STORAGE_MAX_FILE_SIZE", 10):
+            respx.get(self.req).mock(return_value=Response(200, content=_chunks()))
+            response = await st_com.retrieve_data(
+                file_id=self.test_id,
+                version=self.version,
+                log=self.log_mock,
+            )
+        self.assertEqual(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            response.unwrap().status_code,
+        )
+        self.assertLess(len(chunks_sent), 10)
+
+    async def test_retrieve_and_process_success(self):
+        process = AsyncMock(return_value=FastApiResp(content=b"rendered"))
+        with respx.mock:
+            respx.get(self.req).mock(return_value=Response(200, content=b"pdf"))
+            response = await st_com.retrieve_and_process(
+                file_id=self.test_id,
+                version=self.version,
+                service_type=ServiceTypeEnum.FILES,
+                process=process,
+            )
+        self.assertEqual(b"rendered", response.body)
+        self.assertEqual(1, process.call_count)
+
+    async def test_retrieve_and_process_closes_content_after_processing(self):
+        contents: List[IO[bytes]] = []
+
+        async def _process(content: IO[bytes]) -> FastApiResp:
+            contents.append(content)
+            return FastApiResp(content=content.read())
+
+        with respx.mock:
+            respx.get(self.req).mock(return_value=Response(200, content=b"pdf"))
+            await st_com.retrieve_and_process(
+                file_id=self.test_id,
+                version=self.version,
+                service_type=ServiceTypeEnum.FILES,
+                process=_process,
+            )
+        self.assertTrue(contents[0].closed)
+
+    async def test_retrieve_and_process_streamed_content_is_closed_after_sending(self):
+        contents: List[IO[bytes]] = []
+
+        async def _process(content: IO[bytes]) -> FastApiResp:
+            contents.append(content)
+            return StreamingResponse(content=iter([content.read()]))
+
+        with respx.mock:
+            respx.get(self.req).mock(return_value=Response(200, content=b"pdf"))
+            response = await st_com.retrieve_and_process(
+                file_id=self.test_id,
+                version=self.version,
+                service_type=ServiceTypeEnum.FILES,
+                process=_process,
+            )
+        self.assertFalse(contents[0].closed)
+        await response.background()
+        self.assertTrue(contents[0].closed)
+
+    async def test_retrieve_and_process_does_not_process_on_storage_error(self):
+        process = AsyncMock()
+        stats = {"skipped_renders": 0, "skipped_docs_editor_calls": 0}
+        with respx.mock, patch.dict(st_com.error_path_stats, stats):
+            respx.get(self.req).mock(return_value=Response(404))
+            response = await st_com.retrieve_and_process(
+                file_id=self.test_id,
+                version=self.version,
+                service_type=ServiceTypeEnum.FILES,
+                process=process,
+                calls_docs_editor=True,
+            )
+            self.assertEqual(1, st_com.error_path_stats["skipped_renders"])
+            self.assertEqual(1, st_com.error_path_stats["skipped_docs_editor_calls"])
+        self.assertEqual(status.HTTP_502_BAD_GATEWAY, response.status_code)
+        self.assertEqual(0, process.call_count)
@@ -0,0 +1,152 @@
+# SPDX-FileCopyrightText: 2024 Zextras <https://www.zextras.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from fastapi import HTTPException, status
+
+from app.core.resources.app_config import EXECUTOR_MODE, EXECUTOR_POOL_SIZE
+from app.core.resources.schemas.enums.executor_mode_enum import ExecutorModeEnum
+from app.core.services import metrics, task_executor
+from app.core.services.document_manipulation import document_manipulation
+
+
+def _current_thread_name() -> str:
+    return threading.current_thread().name
+
+
+def _current_process_id() -> int:
+    return os.getpid()
+
+
+def _read_content(content: io.BytesIO) -> bytes:
+    return content.read()
+
+
+def _observe_decode() -> None:
+    with metrics.observe_stage(metrics.STAGE_DECODE):
+        pass
+
+
+def _raise_value_error() -> None:
+    raise ValueError
+
+
+def _raise_http_exception() -> None:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="test")
+
+
+class TestTaskExecutor(unittest.IsolatedAsyncioTestCase):
+    def tearDown(self) -> None:
+        super().tearDown()
+        task_executor.configure_executor(EXECUTOR_MODE, EXECUTOR_POOL_SIZE)
+
+    async def test_inline_runs_on_the_calling_thread(self):
+        task_executor.configure_executor(ExecutorModeEnum.INLINE, 1)
+
+        result = await task_executor.run_cpu_bound(_current_thread_name)
+
+        self.assertEqual(threading.current_thread().name, result)
+
+    async def test_thread_runs_on_the_pool(self):
+        task_executor.configure_executor(ExecutorModeEnum.THREAD, 1)
+
+        result = await task_executor.run_cpu_bound(_current_thread_name)
+
+        self.assertTrue(result.startswith("preview-cpu"))
+
+    async def test_thread_propagates_http_exception(self):
+        task_executor.configure_executor(ExecutorModeEnum.THREAD, 1)
+
+        with self.assertRaises(HTTPException) as context:
+            await task_executor.run_cpu_bound(_raise_http_exception)
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, context.exception.status_code)
+        self.assertEqual("test", context.exception.detail)
+
+    async def test_thread_propagates_value_error(self):
+        task_executor.configure_executor(ExecutorModeEnum.THREAD, 1)
+
+        with self.assertRaises(ValueError):
+            await task_executor.run_cpu_bound(_raise_value_error)
+
+    async def test_process_propagates_http_exception(self):
+        task_executor.configure_executor(ExecutorModeEnum.PROCESS, 1)
+
+        with self.assertRaises(HTTPException) as context:
+            await task_executor.run_cpu_bound(
+                document_manipulation.convert_pdf_to_image,
+                content=io.BytesIO(b""),
+                output_extension="png",
+                page_number=0,
+            )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, context.exception.status_code)
+
+    async def test_process_receives_file_handles_content(self):
+        task_executor.configure_executor(ExecutorModeEnum.PROCESS, 1)
+
+        with tempfile.SpooledTemporaryFile(max_size=1) as content:
+            content.write(b"content on disk")
+            content.seek(0)
+            result = await task_executor.run_cpu_bound(_read_content, content=content)
+
+        self.assertEqual(b"content on disk", result)
+
+    async def test_file_handles_are_read_outside_the_event_loop(self):
+        with tempfile.SpooledTemporaryFile(max_size=1) as content:
+            content.write(b"content on disk")
+            content.seek(0)
+            reading_threads = []
+            read = content.read
+
+            def _read() -> bytes:
+                reading_threads.append(threading.current_thread())
+                return read()
+
+            content.read = _read
+            result = await task_executor.to_picklable(content)
+
+        self.assertEqual(b"content on disk", result.getvalue())
+        self.assertNotIn(threading.main_thread(), reading_threads)
+        self.assertEqual(1, len(reading_threads))
+
+    async def test_configure_executor_changes_mode(self):
+        task_executor.configure_executor(ExecutorModeEnum.PROCESS, 1)
+
+        self.assertEqual(ExecutorModeEnum.PROCESS, task_executor.get_executor_mode())
+
+    async def test_run_in_process_uses_a_process_in_thread_mode(self):
+        task_executor.configure_executor(ExecutorModeEnum.THREAD, 1)
+
+        result = await task_executor.run_in_process(_current_process_id)
+
+        self.assertNotEqual(os.getpid(), result)
+
+    async def test_run_in_process_runs_on_the_calling_process_in_inline_mode(self):
+        task_executor.configure_executor(ExecutorModeEnum.INLINE, 1)
+
+        result = await task_executor.run_in_process(_current_process_id)
+
+        self.assertEqual(os.getpid(), result)
+
+    async def test_thread_stage_timings_are_added_to_the_request(self):
+        task_executor.configure_executor(ExecutorModeEnum.THREAD, 1)
+        timings = metrics.start_stage_timings()
+
+        await task_executor.run_cpu_bound(_observe_decode)
+
+        self.assertIn(metrics.STAGE_DECODE, timings)
+
+    async def test_process_stage_timings_are_added_to_the_request(self):
+        task_executor.configure_executor(ExecutorModeEnum.PROCESS, 1)
+        timings = metrics.start_stage_timings()
+
+        await task_executor.run_cpu_bound(_observe_decode)
+
+        self.assertIn(metrics.STAGE_DECODE, timings)